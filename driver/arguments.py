@@ -5,6 +5,7 @@ import sys
 
 from . import aliases
 from . import returncodes
+from . import sas_binary
 from . import util
 
 
@@ -43,6 +44,11 @@ suffixes s, m, h and K, M, G.
 By default, all limits are inactive. Only external limits (e.g. set with
 ulimit) are respected.
 
+Time limits bound the CPU time of the components. In addition, the driver
+kills components that wait without using CPU time: a component is killed
+after twice its time limit (times the number of concurrent portfolio
+configurations) plus one minute of wall-clock time.
+
 Portfolios require that a time limit is in effect. Portfolio configurations
 that exceed their time or memory limit are aborted, and the next
 configuration is run."""
@@ -183,9 +189,7 @@ def _check_mutex_args(parser, args, required=False):
 
 
 def _looks_like_search_input(filename):
-    with open(filename) as input_file:
-        first_line = next(input_file, "").rstrip()
-    return first_line == "begin_version"
+    return sas_binary.is_sas_file(filename)
 
 
 def _set_components_automatically(parser, args):
@@ -402,6 +406,25 @@ def parse_args():
         "--keep-sas-file", action="store_true",
         help="keep translator output file (implied by --sas-file, default: "
             "delete file if translator and search component are active)")
+    driver_other.add_argument(
+        "--sas-file-in-memory", action="store_true",
+        help="store the translator output in a temporary file in shared "
+            "memory ({}, if available) instead of the working directory. All "
+            "search runs, e.g., of a portfolio, read this file. The file is "
+            "deleted at the end. Requires running the translator and the "
+            "search component".format(util.SHARED_MEMORY_DIR))
+
+    driver_other.add_argument(
+        "--translate-cache", metavar="DIR",
+        help="reuse translator output from the cache in DIR if the PDDL "
+            "input files, the translator options and the translator "
+            "code match a previous run, and add new translator output "
+            "to the cache. DIR can be shared by concurrent runs.")
+    driver_other.add_argument(
+        "--translate-cache-size", metavar="SIZE", default="1G",
+        help="maximal total size of the translator cache, given in MiB "
+            "or with a suffix K, M or G; the least recently used entries "
+            "are evicted first (default: %(default)s)")
 
     driver_other.add_argument(
         "--portfolio", metavar="FILE",
@@ -412,6 +435,24 @@ def parse_args():
     driver_other.add_argument(
         "--portfolio-single-plan", action="store_true",
         help="abort satisficing portfolio after finding the first plan")
+    driver_other.add_argument(
+        "--portfolio-jobs", metavar="N", default=1, type=int,
+        help="run up to N configurations of the portfolio in parallel. They "
+            "share the search memory limit, and the search time limit "
+            "still bounds their total CPU time (default: %(default)s)")
+    driver_other.add_argument(
+        "--portfolio-history", metavar="FILE",
+        help="adapt the order and time slices of the portfolio configurations "
+            "to the previous runs stored in FILE (one JSON object per line), "
+            "preferring configurations that solved many tasks quickly, and "
+            "append the runs of this portfolio to FILE")
+
+    driver_other.add_argument(
+        "--resource-summary", action="store_true",
+        help="write the CPU time, wall-clock time, peak memory usage, page "
+            "faults and context switches of each planner component and "
+            "portfolio configuration as JSON to the plan file name with "
+            "the suffix .resources.json")
 
     driver_other.add_argument(
         "--cleanup", action="store_true",
@@ -430,7 +471,16 @@ def parse_args():
 
     args = parser.parse_args()
 
-    if args.sas_file:
+    for option, is_specified in [("--sas-file", args.sas_file is not None),
+                                 ("--keep-sas-file", args.keep_sas_file)]:
+        _check_mutex_args(parser, [
+            ("--sas-file-in-memory", args.sas_file_in_memory),
+            (option, is_specified)])
+    if args.sas_file_in_memory:
+        args.sas_file = os.path.join(
+            util.get_shared_memory_dir(),
+            "fast-downward-{}.sas".format(os.getpid()))
+    elif args.sas_file:
         args.keep_sas_file = True
     else:
         args.sas_file = DEFAULT_SAS_FILE
@@ -455,6 +505,8 @@ def parse_args():
     _set_translator_output_options(parser, args)
 
     _convert_limits_to_ints(parser, args)
+    args.translate_cache_size = _get_memory_limit_in_bytes(
+        args.translate_cache_size, parser)
 
     if args.alias:
         try:
@@ -472,10 +524,23 @@ def parse_args():
     if args.portfolio_single_plan and not args.portfolio:
         print_usage_and_exit_with_driver_input_error(
             parser, "--portfolio-single-plan may only be used for portfolios.")
+    if args.portfolio_jobs != 1 and not args.portfolio:
+        print_usage_and_exit_with_driver_input_error(
+            parser, "--portfolio-jobs may only be used for portfolios.")
+    if args.portfolio_history and not args.portfolio:
+        print_usage_and_exit_with_driver_input_error(
+            parser, "--portfolio-history may only be used for portfolios.")
+    if args.portfolio_jobs < 1:
+        print_usage_and_exit_with_driver_input_error(
+            parser, "--portfolio-jobs must be positive.")
 
     if not args.version and not args.show_aliases and not args.cleanup:
         _set_components_and_inputs(parser, args)
         if "translate" not in args.components or "search" not in args.components:
+            if args.sas_file_in_memory:
+                print_usage_and_exit_with_driver_input_error(
+                    parser, "--sas-file-in-memory requires running the "
+                    "translator and the search component.")
             args.keep_sas_file = True
 
     return args
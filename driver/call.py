@@ -1,13 +1,47 @@
-"""Make subprocess calls with time and memory limits."""
+"""Make subprocess calls with time and memory limits.
+
+All calls go through SupervisedProcess, which starts the child process
+and supervises it with an asyncio event loop: the output of the child is
+streamed line by line to our stdout and stderr (so that we never hold
+the complete output in memory), an optional wall-clock time limit is
+enforced by killing the child, and the resource usage of the child is
+recorded with os.wait4 where available. On POSIX systems, the child
+runs in its own session, so that killing its process group also kills
+descendants that still hold its pipes open. CPU time and memory limits are
+set in the child with setrlimit. Several children can be supervised
+concurrently with run_processes.
+"""
 
 from . import limits
 from . import returncodes
+from . import sas_binary
 
+import asyncio
 import logging
 import os
 import shlex
+import signal
 import subprocess
 import sys
+import threading
+import time
+
+
+# Size of the chunks in which we read the output of child processes.
+CHUNK_SIZE = 1 << 16
+
+# Whether we can wait for child processes without reaping them and reap
+# them with their resource usage.
+_CAN_WAIT4 = hasattr(os, "wait4") and hasattr(os, "waitid")
+
+# Whether child processes run in their own session and process group,
+# which we kill as a whole.
+_CAN_KILLPG = os.name == "posix"
+
+# Seconds that we wait for the end of the output of a terminated child
+# process before we kill the remaining processes of its process group,
+# which keep its pipes open, and stop reading.
+OUTPUT_DRAIN_TIMEOUT = 5
 
 
 def print_call_settings(nick, cmd, stdin, time_limit, memory_limit):
@@ -46,25 +80,377 @@ def _get_preexec_function(time_limit, memory_limit):
         return set_limits
 
 
-def check_call(nick, cmd, stdin=None, time_limit=None, memory_limit=None):
-    print_call_settings(nick, cmd, stdin, time_limit, memory_limit)
+def _run_in_thread(function, *args):
+    """Call *function* in a new thread and return an asyncio future for
+    its result. In contrast to loop.run_in_executor, the number of
+    concurrent calls is not limited, which matters because the calls
+    block until a child process terminates."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
 
-    kwargs = {"preexec_fn": _get_preexec_function(time_limit, memory_limit)}
+    def set_result(result, exception):
+        if future.cancelled():
+            return
+        if exception is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exception)
 
-    sys.stdout.flush()
-    if stdin:
-        with open(stdin) as stdin_file:
-            return subprocess.check_call(cmd, stdin=stdin_file, **kwargs)
-    else:
-        return subprocess.check_call(cmd, **kwargs)
+    def run():
+        try:
+            result = function(*args)
+        except BaseException as err:
+            loop.call_soon_threadsafe(set_result, None, err)
+        else:
+            loop.call_soon_threadsafe(set_result, result, None)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _write_converted_input(sas_file, stream):
+    """Pipe the binary or compressed translator output file *sas_file*
+    to the process in the text format."""
+    try:
+        sas_binary.write_text(sas_file, stream)
+    except BrokenPipeError:
+        # The process terminated without reading all of its input.
+        pass
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def _get_exitcode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class OutputWriter:
+    """Write output lines of a child process to the binary buffer of the
+    given text stream, optionally preceded by a prefix."""
+    def __init__(self, stream, prefix=""):
+        self.stream = stream
+        self.prefix = prefix.encode("utf-8")
+
+    def write_lines(self, lines):
+        # Flush the text layer first, so that text we printed before
+        # appears before the output of the child.
+        self.stream.flush()
+        for line in lines:
+            self.stream.buffer.write(self.prefix + line)
+        self.stream.buffer.flush()
+
+
+class MemoryErrorFilter(OutputWriter):
+    """Write error output lines to stderr, but hold them back as long as
+    all lines mention MemoryError. This lets the caller decide whether
+    to suppress output that only reports that the child ran out of
+    memory without buffering other output."""
+    def __init__(self):
+        super().__init__(sys.stderr)
+        self.held_back_lines = []
+
+    def write_lines(self, lines):
+        if self.held_back_lines is not None:
+            for line in lines:
+                if b"MemoryError" not in line:
+                    lines = self.held_back_lines + lines
+                    self.held_back_lines = None
+                    break
+            else:
+                self.held_back_lines.extend(lines)
+                return
+        super().write_lines(lines)
+
+    def get_held_back_output(self):
+        return b"".join(self.held_back_lines or []).decode(
+            "utf-8", errors="replace")
+
+
+class SupervisedProcess:
+    """A child process that is supervised by an asyncio event loop.
+
+    *time_limit* (CPU time in seconds) and *memory_limit* (in bytes) are
+    enforced with setrlimit in the child, *wall_time_limit* (in seconds)
+    by killing the child. After the process has terminated, *returncode*
+    is its return code (negative for signals, or *timeout_returncode* if
+    given and we killed the process because it exceeded the wall-clock
+    time limit), *wall_time* its wall-clock time, *rusage* its resource
+    usage as returned by os.wait4 (or None if os.wait4 is not
+    available), *killed* tells whether we killed it and *timed_out*
+    whether it exceeded the wall-clock time limit.
+    """
+    def __init__(self, nick, cmd, stdin=None, time_limit=None,
+                 memory_limit=None, wall_time_limit=None,
+                 timeout_returncode=None, stdout_writer=None,
+                 stderr_writer=None):
+        self.nick = nick
+        self.cmd = cmd
+        self.stdin = stdin
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.wall_time_limit = wall_time_limit
+        self.timeout_returncode = timeout_returncode
+        self.stdout_writer = stdout_writer or OutputWriter(sys.stdout)
+        self.stderr_writer = stderr_writer or OutputWriter(sys.stderr)
+        self.returncode = None
+        self.wall_time = None
+        self.rusage = None
+        self.killed = False
+        self.timed_out = False
+        self._process = None
+        self._start_time = None
+        # Only _wait_for_exit reaps the process. kill() holds the lock
+        # while signalling to never signal a reaped process, whose pid
+        # might have been reused.
+        self._reaped = False
+        self._reap_lock = threading.Lock()
+
+    def start(self):
+        print_call_settings(
+            self.nick, self.cmd, self.stdin, self.time_limit, self.memory_limit)
+        if self.wall_time_limit is not None:
+            logging.info("{} wall-clock time limit: {}s".format(
+                self.nick, self.wall_time_limit))
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        kwargs = {
+            "stdout": subprocess.PIPE,
+            "stderr": subprocess.PIPE,
+            "preexec_fn": _get_preexec_function(
+                self.time_limit, self.memory_limit),
+            "start_new_session": _CAN_KILLPG,
+        }
+        if self.stdin and sas_binary.needs_conversion(self.stdin):
+            self._process = subprocess.Popen(
+                self.cmd, stdin=subprocess.PIPE, **kwargs)
+        elif self.stdin:
+            with open(self.stdin) as stdin_file:
+                self._process = subprocess.Popen(
+                    self.cmd, stdin=stdin_file, **kwargs)
+        else:
+            self._process = subprocess.Popen(self.cmd, **kwargs)
+        self._start_time = time.monotonic()
+
+    def kill(self):
+        with self._reap_lock:
+            if self._reaped or self.killed:
+                return
+            self.killed = True
+            if _CAN_KILLPG:
+                self._kill_process_group()
+            elif _CAN_WAIT4:
+                # Popen.kill() would poll the process first and might
+                # reap it before _wait_for_exit does.
+                os.kill(self._process.pid, signal.SIGKILL)
+            else:
+                self._process.kill()
+
+    def _kill_process_group(self):
+        # The process group of the child has the id of the child. It
+        # cannot be reused while any of its members is alive, so we may
+        # kill it even after the child has been reaped.
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def wait(self):
+        """Stream the output of the started process until it terminates
+        and return its return code. If the wait is cancelled, kill the
+        process."""
+        try:
+            return await self._wait()
+        except asyncio.CancelledError:
+            # Children in their own session do not receive the SIGINT of
+            # the terminal, so we stop them when the driver is interrupted.
+            self.kill()
+            raise
+
+    async def _wait(self):
+        helpers = [
+            self._forward_output(self._process.stdout, self.stdout_writer),
+            self._forward_output(self._process.stderr, self.stderr_writer)]
+        if self._process.stdin:
+            helpers.append(_run_in_thread(
+                _write_converted_input, self.stdin, self._process.stdin))
+        helpers = [asyncio.ensure_future(helper) for helper in helpers]
+        exit_future = _run_in_thread(self._wait_for_exit)
+        done, _ = await asyncio.wait([exit_future], timeout=self.wall_time_limit)
+        if not done:
+            logging.info("{} exceeded the wall-clock time limit. Killing it.".format(
+                self.nick))
+            self.timed_out = True
+            self.kill()
+        await exit_future
+        if (self.timed_out and self.returncode < 0 and
+                self.timeout_returncode is not None):
+            self.returncode = self.timeout_returncode
+        await self._drain_output(helpers)
+        self._log_resource_usage()
+        return self.returncode
+
+    async def run(self):
+        self.start()
+        return await self.wait()
+
+    async def _drain_output(self, helpers):
+        # The pipes reach their end when the process and all descendants
+        # that inherited them have terminated.
+        _, pending = await asyncio.wait(helpers, timeout=OUTPUT_DRAIN_TIMEOUT)
+        if pending and _CAN_KILLPG:
+            logging.info("{} left processes behind that keep its output "
+                         "open. Killing them.".format(self.nick))
+            self._kill_process_group()
+            _, pending = await asyncio.wait(
+                pending, timeout=OUTPUT_DRAIN_TIMEOUT)
+        for helper in pending:
+            # Cancelling an output forwarder closes its pipe transport.
+            helper.cancel()
+        await asyncio.gather(*helpers, return_exceptions=True)
+        for helper in helpers:
+            if not helper.cancelled() and helper.exception() is not None:
+                raise helper.exception()
+
+    def _wait_for_exit(self):
+        if _CAN_WAIT4:
+            pid = self._process.pid
+            os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+            with self._reap_lock:
+                _, status, self.rusage = os.wait4(pid, 0)
+                self._reaped = True
+            returncode = _get_exitcode(status)
+            # Let the Popen object know that the process has been reaped.
+            self._process.returncode = returncode
+        else:
+            returncode = self._process.wait()
+            self._reaped = True
+        self.wall_time = time.monotonic() - self._start_time
+        self.returncode = returncode
+
+    async def _forward_output(self, pipe, writer):
+        if os.name == "nt":
+            # The Windows event loops cannot read from anonymous pipes.
+            def forward_lines():
+                for line in pipe:
+                    writer.write_lines([line])
+            await _run_in_thread(forward_lines)
+            return
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=CHUNK_SIZE)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            partial_line = b""
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (partial_line + chunk).split(b"\n")
+                partial_line = lines.pop()
+                if lines:
+                    writer.write_lines([line + b"\n" for line in lines])
+            if partial_line:
+                writer.write_lines([partial_line])
+        finally:
+            transport.close()
+
+    def get_resource_usage(self):
+        """Return the resource usage of the terminated process as a
+        dictionary. Without os.wait4, we only know the wall-clock time."""
+        usage = {
+            "returncode": self.returncode,
+            "killed": self.killed,
+            "timed_out": self.timed_out,
+            "wall_time": self.wall_time,
+        }
+        if self.rusage is not None:
+            usage.update({
+                "cpu_time": self.rusage.ru_utime + self.rusage.ru_stime,
+                "user_time": self.rusage.ru_utime,
+                "system_time": self.rusage.ru_stime,
+                "max_rss_kb": get_max_rss_in_kb(self.rusage),
+                "minor_page_faults": self.rusage.ru_minflt,
+                "major_page_faults": self.rusage.ru_majflt,
+                "voluntary_context_switches": self.rusage.ru_nvcsw,
+                "involuntary_context_switches": self.rusage.ru_nivcsw,
+            })
+        return usage
+
+    def _log_resource_usage(self):
+        logging.info("{} {}".format(
+            self.nick, format_resource_usage(self.get_resource_usage())))
+
+
+def get_max_rss_in_kb(rusage):
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere.
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def format_resource_usage(usage):
+    parts = ["wall-clock time: {:.2f}s".format(usage["wall_time"])]
+    if "cpu_time" in usage:
+        parts += [
+            "CPU time: {:.2f}s".format(usage["cpu_time"]),
+            "peak memory: {} KB".format(usage["max_rss_kb"]),
+            "page faults: {} minor, {} major".format(
+                usage["minor_page_faults"], usage["major_page_faults"]),
+            "context switches: {} voluntary, {} involuntary".format(
+                usage["voluntary_context_switches"],
+                usage["involuntary_context_switches"]),
+        ]
+    return ", ".join(parts)
+
+
+def _record_resource_usage(process, resource_usage, **attributes):
+    if resource_usage is not None:
+        usage = dict(attributes, **process.get_resource_usage())
+        resource_usage.append(usage)
+
+
+def run_processes(processes):
+    """Run the given SupervisedProcess objects concurrently and return
+    their return codes."""
+    async def run_all():
+        return await asyncio.gather(*[process.run() for process in processes])
+    return asyncio.run(run_all())
 
 
-def get_error_output_and_returncode(nick, cmd, time_limit=None, memory_limit=None):
-    print_call_settings(nick, cmd, None, time_limit, memory_limit)
+def check_call(nick, cmd, stdin=None, time_limit=None, memory_limit=None,
+               wall_time_limit=None, timeout_returncode=None,
+               resource_usage=None, **attributes):
+    """Run the command and raise CalledProcessError if it fails. The
+    limits work as for SupervisedProcess. If *resource_usage* is a list,
+    append the resource usage of the process together with the
+    *attributes* to it."""
+    process = SupervisedProcess(
+        nick, cmd, stdin=stdin, time_limit=time_limit,
+        memory_limit=memory_limit, wall_time_limit=wall_time_limit,
+        timeout_returncode=timeout_returncode)
+    returncode, = run_processes([process])
+    _record_resource_usage(process, resource_usage, **attributes)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return returncode
 
-    preexec_fn = _get_preexec_function(time_limit, memory_limit)
 
-    sys.stdout.flush()
-    p = subprocess.Popen(cmd, preexec_fn=preexec_fn, stderr=subprocess.PIPE)
-    (stdout, stderr) = p.communicate()
-    return stderr, p.returncode
+def get_error_output_and_returncode(nick, cmd, time_limit=None, memory_limit=None,
+                                    wall_time_limit=None, timeout_returncode=None,
+                                    resource_usage=None, **attributes):
+    """Run the command and return the part of its error output that
+    has not been printed to stderr (see MemoryErrorFilter) together with
+    its return code. The other arguments work as for check_call."""
+    stderr_writer = MemoryErrorFilter()
+    process = SupervisedProcess(
+        nick, cmd, time_limit=time_limit, memory_limit=memory_limit,
+        wall_time_limit=wall_time_limit, timeout_returncode=timeout_returncode,
+        stderr_writer=stderr_writer)
+    returncode, = run_processes([process])
+    _record_resource_usage(process, resource_usage, **attributes)
+    return stderr_writer.get_held_back_output(), returncode
@@ -11,6 +11,7 @@ def _try_remove(f):
 def cleanup_temporary_files(args):
     _try_remove(args.sas_file)
     _try_remove(args.plan_file)
+    _try_remove(args.plan_file + ".resources.json")
 
     for i in count(1):
         if not _try_remove("%s.%s" % (args.plan_file, i)):
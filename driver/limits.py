@@ -16,6 +16,16 @@ memory limits are not enforced by that OS and hence we do not support imposing
 memory limits there.
 """
 
+# Child processes that exceed their CPU time limit are stopped by the
+# operating system. To also stop children that wait without using CPU
+# time, e.g., on a blocked pipe, the driver kills children that exceed
+# WALL_TIME_LIMIT_FACTOR times their CPU time limit (per concurrently
+# running child) plus WALL_TIME_LIMIT_SLACK seconds of wall-clock time.
+# The limit is generous because children may share the CPUs with other
+# processes and wait for I/O.
+WALL_TIME_LIMIT_FACTOR = 2
+WALL_TIME_LIMIT_SLACK = 60
+
 CANNOT_LIMIT_MEMORY_MSG = "Setting memory limits is not supported on your platform."
 CANNOT_LIMIT_TIME_MSG = "Setting time limits is not supported on your platform."
 
@@ -86,6 +96,19 @@ def get_time_limit(component_limit, overall_limit):
     return limit
 
 
+def get_wall_time_limit(time_limit, num_concurrent_processes=1):
+    """
+    Return the wall-clock time limit for a child process with the CPU
+    time limit *time_limit* that runs concurrently with at most
+    *num_concurrent_processes* - 1 other child processes, or None if
+    *time_limit* is None.
+    """
+    if time_limit is None:
+        return None
+    return (WALL_TIME_LIMIT_FACTOR * num_concurrent_processes * time_limit +
+            WALL_TIME_LIMIT_SLACK)
+
+
 def print_limits(nick, time_limit, memory_limit):
     if time_limit is not None:
         time_limit = str(time_limit) + "s"
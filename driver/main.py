@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import sys
@@ -34,23 +35,31 @@ def main():
     print()
 
     exitcode = None
-    for component in args.components:
-        if component == "translate":
-            (exitcode, continue_execution) = run_components.run_translate(args)
-        elif component == "search":
-            (exitcode, continue_execution) = run_components.run_search(args)
-            if not args.keep_sas_file:
-                print("Remove intermediate file {}".format(args.sas_file))
-                os.remove(args.sas_file)
-        elif component == "validate":
-            (exitcode, continue_execution) = run_components.run_validate(args)
-        else:
-            assert False, "Error: unhandled component: {}".format(component)
-        print("{component} exit code: {exitcode}".format(**locals()))
-        print()
-        if not continue_execution:
-            print("Driver aborting after {}".format(component))
-            break
+    # Resource usage of the child processes, one entry per process.
+    resource_usage = []
+    try:
+        for component in args.components:
+            if component == "translate":
+                (exitcode, continue_execution) = run_components.run_translate(args, resource_usage)
+            elif component == "search":
+                (exitcode, continue_execution) = run_components.run_search(args, resource_usage)
+                if not args.keep_sas_file:
+                    print("Remove intermediate file {}".format(args.sas_file))
+                    os.remove(args.sas_file)
+            elif component == "validate":
+                (exitcode, continue_execution) = run_components.run_validate(args, resource_usage)
+            else:
+                assert False, "Error: unhandled component: {}".format(component)
+            print("{component} exit code: {exitcode}".format(**locals()))
+            print()
+            if not continue_execution:
+                print("Driver aborting after {}".format(component))
+                break
+    finally:
+        # Never leave the translator output behind in shared memory, even
+        # if the translator failed or the driver was interrupted.
+        if args.sas_file_in_memory and os.path.exists(args.sas_file):
+            os.remove(args.sas_file)
 
     try:
         logging.info(f"Planner time: {util.get_elapsed_time():.2f}s")
@@ -58,6 +67,12 @@ def main():
         # Measuring the runtime of child processes is not supported on Windows.
         pass
 
+    if args.resource_summary:
+        summary_file = args.plan_file + ".resources.json"
+        logging.info(f"Writing resource usage summary to {summary_file}")
+        with open(summary_file, "w") as output:
+            json.dump(resource_usage, output, indent=2)
+
     # Exit with the exit code of the last component that ran successfully.
     # This means for example that if no plan was found, validate is not run,
     # and therefore the return code is that of the search.
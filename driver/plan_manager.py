@@ -39,6 +39,7 @@ class PlanManager:
             portfolio_bound = "infinity"
         self._portfolio_bound = portfolio_bound
         self._single_plan = single_plan
+        self._bound_file = None
 
     def get_plan_prefix(self):
         return self._plan_prefix
@@ -59,6 +60,28 @@ class PlanManager:
         else:
             return self._portfolio_bound
 
+    def set_bound_file(self, bound_file):
+        """Write the next portfolio cost bound to the given file whenever
+        it changes. Concurrent search runs read the bound from this
+        file to prune with the cost of the best plan found so far."""
+        self._bound_file = bound_file
+        self._write_bound_file()
+
+    def _write_bound_file(self):
+        bound = self.get_next_portfolio_cost_bound()
+        if self._bound_file is None or bound == "infinity":
+            return
+        # Replace the file atomically to make sure that the search never
+        # reads a partially written bound.
+        tmp_file = self._bound_file + ".tmp"
+        with open(tmp_file, "w") as output:
+            print(bound, file=output)
+        os.replace(tmp_file, self._bound_file)
+
+    def _add_plan_cost(self, cost):
+        self._plan_costs.append(cost)
+        self._write_bound_file()
+
     def abort_portfolio_after_first_plan(self):
         return self._single_plan
 
@@ -99,7 +122,57 @@ class PlanManager:
                         bogus_plan("problem type has changed")
                     if cost >= self._plan_costs[-1]:
                         bogus_plan("plan quality has not improved")
-                self._plan_costs.append(cost)
+                self._add_plan_cost(cost)
+
+    def import_plans(self, plan_prefix, first_number=1, keep_incomplete=False):
+        """Move the plans PLAN_PREFIX.FIRST_NUMBER, ... that a search run
+        wrote to the next plan files of this plan manager and return
+        the number of the first plan file that has not been imported.
+
+        This is used for search runs that are executed concurrently and
+        therefore cannot write their plans to the plan files of this
+        plan manager directly. Plans that are not cheaper than the best
+        plan found so far are deleted. Incomplete plans are deleted
+        unless *keep_incomplete* is set, which is needed for runs that
+        may still be writing the plan.
+        """
+        for number in itertools.count(first_number):
+            plan_filename = "%s.%d" % (plan_prefix, number)
+            if not os.path.exists(plan_filename):
+                return number
+            cost, problem_type = _parse_plan(plan_filename)
+            if cost is None:
+                if keep_incomplete:
+                    return number
+                print("%s is incomplete. Deleted the file." % plan_filename)
+                os.remove(plan_filename)
+            elif self._plan_costs and cost >= self._plan_costs[-1]:
+                print("%s is not cheaper than the best plan found so far. "
+                      "Deleted the file." % plan_filename)
+                os.remove(plan_filename)
+            else:
+                if self._problem_type is None:
+                    self._problem_type = problem_type
+                elif self._problem_type != problem_type:
+                    returncodes.exit_with_driver_critical_error(
+                        "%s: problem type has changed" % plan_filename)
+                new_plan_filename = self._get_plan_file(self.get_plan_counter() + 1)
+                os.replace(plan_filename, new_plan_filename)
+                print("plan manager: found new plan with cost %d" % cost)
+                self._add_plan_cost(cost)
+
+    def adopt_plans(self, plan_prefix):
+        """Move all plans that a search run wrote with the given plan
+        prefix to the plan files with the same numbers (or no number)
+        of this plan manager.
+
+        This is used if only a single concurrent search run may
+        contribute plans, e.g., the first run of an optimal portfolio
+        that finds a plan.
+        """
+        for plan_filename in PlanManager(plan_prefix).get_existing_plans():
+            os.replace(plan_filename,
+                       self._plan_prefix + plan_filename[len(plan_prefix):])
 
     def get_existing_plans(self):
         """Yield all plans that match the given plan prefix."""
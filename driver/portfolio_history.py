@@ -0,0 +1,167 @@
+"""Adapt the time slices of portfolio configs to previous runs.
+
+The history file contains one JSON object per line for each run. Each
+run stores the task (a hash of the translator output), the config (its
+search arguments as given in the portfolio), the CPU time of the run and
+whether it solved the task. We only ever append runs to the file, so
+concurrent driver runs can share it.
+
+Given the history, we compute time slices with the greedy algorithm that
+was used to build the FDSS portfolios: we repeatedly extend the slice of
+the config that solves the most previously unsolved history tasks per
+additional second, until the time limit is used up or no extension
+solves another task. The remaining time is distributed over all configs
+according to their relative times in the portfolio, so configs without
+history are still run. We first run the configs selected by the greedy
+algorithm, ordered by their greedy slices, and then the remaining
+configs in portfolio order.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+
+def get_config_key(args):
+    return " ".join(args)
+
+
+def _parse_run(line):
+    run = json.loads(line)
+    if not (isinstance(run, dict) and isinstance(run.get("task"), str) and
+            isinstance(run.get("config"), str) and
+            isinstance(run.get("time"), (int, float)) and
+            isinstance(run.get("solved"), bool)):
+        raise ValueError("invalid run: {}".format(line.strip()))
+    return run
+
+
+def compute_task_key(sas_file):
+    hasher = hashlib.sha256()
+    with open(sas_file, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class PortfolioHistory:
+    def __init__(self, filename):
+        self.filename = filename
+        self.runs = []
+        self.new_runs = []
+        if not os.path.exists(filename):
+            return
+        try:
+            with open(filename) as history_file:
+                lines = history_file.readlines()
+        except (OSError, ValueError) as err:
+            logging.warning("Ignoring unreadable portfolio history {}: {}".format(
+                filename, err))
+            return
+        num_invalid_lines = 0
+        for line in lines:
+            try:
+                self.runs.append(_parse_run(line))
+            except ValueError:
+                num_invalid_lines += 1
+        if num_invalid_lines:
+            # For example, a driver was killed while appending runs.
+            logging.warning("Ignoring {} invalid lines in portfolio history {}".format(
+                num_invalid_lines, filename))
+
+    def add_run(self, task, config, time, solved):
+        run = {"task": task, "config": config, "time": time, "solved": solved}
+        self.runs.append(run)
+        self.new_runs.append(run)
+
+    def save(self):
+        """Append the new runs to the history file."""
+        data = "".join(json.dumps(run) + "\n" for run in self.new_runs)
+        if not self._ends_with_newline():
+            # Do not extend an incomplete last line.
+            data = "\n" + data
+        # Appending with a single write keeps the runs of concurrent
+        # driver runs from interleaving.
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            os.write(fd, data.encode("utf-8"))
+        finally:
+            os.close(fd)
+        self.new_runs = []
+
+    def _ends_with_newline(self):
+        try:
+            with open(self.filename, "rb") as history_file:
+                history_file.seek(0, os.SEEK_END)
+                if history_file.tell() == 0:
+                    return True
+                history_file.seek(-1, os.SEEK_END)
+                return history_file.read(1) == b"\n"
+        except FileNotFoundError:
+            return True
+
+    def get_solve_times(self):
+        """Return a dictionary that maps each config to a dictionary
+        that maps the tasks solved by the config to the lowest CPU time
+        in which it solved them."""
+        solve_times = {}
+        for run in self.runs:
+            times = solve_times.setdefault(run["config"], {})
+            if run["solved"]:
+                task = run["task"]
+                times[task] = min(run["time"], times.get(task, run["time"]))
+        return solve_times
+
+    def compute_slices(self, configs, time):
+        """Return the greedy time slices of the configs for the given
+        total time. The slices sum to at most *time*."""
+        solve_times = self.get_solve_times()
+        keys = [get_config_key(args) for _, args in configs]
+        slices = [0] * len(configs)
+        solved_tasks = set()
+        remaining_time = time
+        while True:
+            best = None
+            for pos, key in enumerate(keys):
+                for task, solve_time in solve_times.get(key, {}).items():
+                    extension = solve_time - slices[pos]
+                    if (task in solved_tasks or extension <= 0 or
+                            extension > remaining_time):
+                        continue
+                    num_solved = sum(
+                        1 for other_task, other_time in solve_times[key].items()
+                        if other_time <= solve_time and
+                        other_task not in solved_tasks)
+                    score = num_solved / extension
+                    if best is None or score > best[0]:
+                        best = (score, pos, solve_time)
+            if best is None:
+                return slices
+            _, pos, solve_time = best
+            remaining_time -= solve_time - slices[pos]
+            slices[pos] = solve_time
+            solved_tasks.update(
+                task for task, task_time in solve_times[keys[pos]].items()
+                if task_time <= solve_time)
+
+    def adapt_configs(self, configs, time):
+        """Return the configs in the order in which to run them, with
+        relative times that are the time slices in seconds for the total
+        time *time*."""
+        slices = self.compute_slices(configs, time)
+        if not any(slices):
+            print("No portfolio history for these configs.")
+            return configs
+        remaining_time = time - sum(slices)
+        total_relative_time = sum(relative_time for relative_time, _ in configs)
+        adapted = []
+        for pos, (relative_time, args) in enumerate(configs):
+            run_time = (slices[pos] +
+                        remaining_time * relative_time / total_relative_time)
+            adapted.append((slices[pos] == 0, slices[pos], pos, run_time, args))
+        adapted.sort()
+        print("Adapted portfolio to history:")
+        for _, _, pos, run_time, _ in adapted:
+            print("config {}: {:.2f}s".format(pos, run_time))
+        return [(run_time, args) for _, _, _, run_time, args in adapted]
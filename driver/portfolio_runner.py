@@ -11,20 +11,42 @@ amount of memory that the Python process needs. On maia for example
 this amounts to 128MB of reserved virtual memory. We can make Python
 reserve less space by lowering the soft limit for virtual memory before
 the process is started.
+
+Parallel portfolios: With more than one job, we run several
+configurations concurrently. The time limit still bounds the total CPU
+time of all configurations and each configuration receives the same
+share of it as in the sequential case, but the portfolio finishes
+faster in terms of wall-clock time. The configurations share the memory
+limit, i.e., each planner call may use the memory limit divided by the
+number of jobs. Each run writes its plans to temporary files, and we
+stream its output with the prefix "[run N]" while it is running. In
+satisficing portfolios, we import new plans into the plan files of the
+plan manager as soon as they are written and write the best plan cost
+to a bound file, from which the running configurations read their cost
+bound.
 """
 
 __all__ = ["run"]
 
+import asyncio
+import math
+import os
+import shutil
 import subprocess
 import sys
+import tempfile
 
 from . import call
 from . import limits
+from . import portfolio_history
 from . import returncodes
+from . import sas_binary
 from . import util
 
 
 DEFAULT_TIMEOUT = 1800
+# Seconds between imports of the plans of concurrent runs.
+POLL_INTERVAL = 0.05
 
 
 def adapt_heuristic_cost_type(arg, cost_type):
@@ -62,7 +84,8 @@ def adapt_args(args, search_cost_type, heuristic_cost_type, plan_manager):
             break
 
 
-def run_search(executable, args, sas_file, plan_manager, time, memory):
+def run_search(executable, args, sas_file, plan_manager, time, memory,
+               resource_usage, config):
     complete_args = [executable] + args + [
         "--internal-plan-file", plan_manager.get_plan_prefix()]
     print("args: %s" % complete_args)
@@ -70,7 +93,11 @@ def run_search(executable, args, sas_file, plan_manager, time, memory):
     try:
         exitcode = call.check_call(
             "search", complete_args, stdin=sas_file,
-            time_limit=time, memory_limit=memory)
+            time_limit=time, memory_limit=memory,
+            wall_time_limit=limits.get_wall_time_limit(time),
+            timeout_returncode=returncodes.SEARCH_OUT_OF_TIME,
+            resource_usage=resource_usage, component="search", args=args,
+            config=portfolio_history.get_config_key(config))
     except subprocess.CalledProcessError as err:
         exitcode = err.returncode
     print("exitcode: %d" % exitcode)
@@ -78,8 +105,10 @@ def run_search(executable, args, sas_file, plan_manager, time, memory):
     return exitcode
 
 
-def compute_run_time(timeout, configs, pos):
-    remaining_time = timeout - util.get_elapsed_time()
+def compute_run_time(timeout, configs, pos, reserved_time=0):
+    """*reserved_time* is the time that has been assigned to
+    configurations that are still running in parallel."""
+    remaining_time = timeout - util.get_elapsed_time() - reserved_time
     print("remaining time: {}".format(remaining_time))
     relative_time = configs[pos][0]
     remaining_relative_time = sum(config[0] for config in configs[pos:])
@@ -87,11 +116,16 @@ def compute_run_time(timeout, configs, pos):
           pos, relative_time, remaining_relative_time))
     # For the last config we have relative_time == remaining_relative_time, so
     # we use all of the remaining time at the end.
-    return remaining_time * relative_time / remaining_relative_time
+    # CPU time limits must be given in whole seconds. We round up to
+    # avoid skipping configs that receive less than a second, but never
+    # exceed the remaining time.
+    run_time = math.ceil(remaining_time * relative_time / remaining_relative_time)
+    return min(run_time, math.floor(remaining_time))
 
 
 def run_sat_config(configs, pos, search_cost_type, heuristic_cost_type,
-                   executable, sas_file, plan_manager, timeout, memory):
+                   executable, sas_file, plan_manager, timeout, memory,
+                   resource_usage):
     run_time = compute_run_time(timeout, configs, pos)
     if run_time <= 0:
         return None
@@ -102,13 +136,14 @@ def run_sat_config(configs, pos, search_cost_type, heuristic_cost_type,
         args.extend([
             "--internal-previous-portfolio-plans",
             str(plan_manager.get_plan_counter())])
-    result = run_search(executable, args, sas_file, plan_manager, run_time, memory)
+    result = run_search(executable, args, sas_file, plan_manager, run_time,
+                        memory, resource_usage, args_template)
     plan_manager.process_new_plans()
     return result
 
 
 def run_sat(configs, executable, sas_file, plan_manager, final_config,
-            final_config_builder, timeout, memory):
+            final_config_builder, timeout, memory, resource_usage):
     # If the configuration contains S_COST_TYPE or H_COST_TRANSFORM and the task
     # has non-unit costs, we start by treating all costs as one. When we find
     # a solution, we rerun the successful config with real costs.
@@ -120,7 +155,8 @@ def run_sat(configs, executable, sas_file, plan_manager, final_config,
         for pos, (relative_time, args) in enumerate(configs):
             exitcode = run_sat_config(
                 configs, pos, search_cost_type, heuristic_cost_type,
-                executable, sas_file, plan_manager, timeout, memory)
+                executable, sas_file, plan_manager, timeout, memory,
+                resource_usage)
             if exitcode is None:
                 return
 
@@ -140,7 +176,8 @@ def run_sat(configs, executable, sas_file, plan_manager, final_config,
                     heuristic_cost_type = "plusone"
                     exitcode = run_sat_config(
                         configs, pos, search_cost_type, heuristic_cost_type,
-                        executable, sas_file, plan_manager, timeout, memory)
+                        executable, sas_file, plan_manager, timeout, memory,
+                        resource_usage)
                     if exitcode is None:
                         return
 
@@ -163,22 +200,266 @@ def run_sat(configs, executable, sas_file, plan_manager, final_config,
         exitcode = run_sat_config(
             [(1, final_config)], 0, search_cost_type,
             heuristic_cost_type, executable, sas_file, plan_manager,
-            timeout, memory)
+            timeout, memory, resource_usage)
         if exitcode is not None:
             yield exitcode
 
 
-def run_opt(configs, executable, sas_file, plan_manager, timeout, memory):
+def run_opt(configs, executable, sas_file, plan_manager, timeout, memory,
+            resource_usage):
     for pos, (relative_time, args) in enumerate(configs):
         run_time = compute_run_time(timeout, configs, pos)
         exitcode = run_search(executable, args, sas_file, plan_manager,
-                              run_time, memory)
+                              run_time, memory, resource_usage, args)
         yield exitcode
 
         if exitcode in [returncodes.SUCCESS, returncodes.SEARCH_UNSOLVABLE]:
             break
 
 
+class ParallelRun:
+    def __init__(self, number, plan_prefix, args, config, process, task,
+                 run_time, info):
+        self.number = number
+        self.plan_prefix = plan_prefix
+        self.args = args
+        self.config = config
+        self.process = process
+        self.task = task
+        self.run_time = run_time
+        # Information about the config for the caller.
+        self.info = info
+        self.next_plan_number = 1
+
+
+class ParallelRunner:
+    """Run up to *jobs* search configurations concurrently.
+
+    The runs are supervised by an event loop that streams their output
+    with the prefix "[run N]" and only runs while we wait for a run to
+    finish."""
+    def __init__(self, executable, sas_file, plan_manager, memory, jobs,
+                 resource_usage):
+        self.executable = executable
+        self.plan_manager = plan_manager
+        self.memory = memory // jobs if memory is not None else None
+        self.jobs = jobs
+        self.running = []
+        self.num_started_runs = 0
+        self.bound_file = None
+        self.resource_usage = resource_usage
+        self.loop = asyncio.new_event_loop()
+        plan_dir = os.path.dirname(os.path.abspath(plan_manager.get_plan_prefix()))
+        # Use the directory of the plan files to be able to move plans
+        # from the temporary directory to their final location.
+        self.tmp_dir = tempfile.mkdtemp(prefix="portfolio-", dir=plan_dir)
+        self.sas_file = sas_file
+
+    def share_plans(self):
+        """Import the plans of the runs while they are still running
+        and let the runs read the cost bound of the best plan found so
+        far from a file, which we update whenever we import a cheaper
+        plan."""
+        self.bound_file = os.path.join(self.tmp_dir, "bound")
+        self.plan_manager.set_bound_file(self.bound_file)
+
+    def _import_plans(self, run, is_running):
+        run.next_plan_number = self.plan_manager.import_plans(
+            run.plan_prefix, run.next_plan_number, keep_incomplete=is_running)
+
+    def has_free_job(self):
+        return len(self.running) < self.jobs
+
+    def get_reserved_time(self):
+        return sum(run.run_time for run in self.running)
+
+    def start(self, args, run_time, config, info=None):
+        """Start a run with the final *args* of the portfolio *config*."""
+        self.num_started_runs += 1
+        number = self.num_started_runs
+        plan_prefix = os.path.join(self.tmp_dir, "sas_plan.run%d" % number)
+        complete_args = [self.executable] + args + [
+            "--internal-plan-file", plan_prefix]
+        if self.bound_file:
+            complete_args += ["--internal-bound-file", self.bound_file]
+        print("run %d args: %s" % (number, complete_args))
+        prefix = "[run %d] " % number
+        process = call.SupervisedProcess(
+            "search", complete_args, stdin=self.sas_file,
+            time_limit=run_time, memory_limit=self.memory,
+            wall_time_limit=limits.get_wall_time_limit(run_time, self.jobs),
+            timeout_returncode=returncodes.SEARCH_OUT_OF_TIME,
+            stdout_writer=call.OutputWriter(sys.stdout, prefix),
+            stderr_writer=call.OutputWriter(sys.stderr, prefix))
+        process.start()
+        task = self.loop.create_task(process.wait())
+        self.running.append(ParallelRun(
+            number, plan_prefix, args, config, process, task, run_time,
+            info))
+
+    def _finish(self, run, status):
+        self.running.remove(run)
+        if self.bound_file:
+            self._import_plans(run, is_running=False)
+        if self.resource_usage is not None:
+            self.resource_usage.append(dict(
+                run.process.get_resource_usage(), component="search",
+                args=run.args, run=run.number,
+                config=portfolio_history.get_config_key(run.config)))
+        print("run %d %s" % (run.number, status))
+        print()
+
+    def wait(self):
+        """Wait until one of the running configurations finishes and
+        return the run and its exit code."""
+        assert self.running
+        while True:
+            # Without shared plans, there is nothing to do until a run
+            # finishes.
+            timeout = POLL_INTERVAL if self.bound_file else None
+            self.loop.run_until_complete(asyncio.wait(
+                [run.task for run in self.running], timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED))
+            for run in self.running:
+                if run.task.done():
+                    exitcode = run.task.result()
+                    self._finish(run, "exitcode: %d" % exitcode)
+                    return run, exitcode
+                if self.bound_file:
+                    self._import_plans(run, is_running=True)
+
+    def cancel_all(self):
+        """Kill all running configurations. Unless we share plans, their
+        plans are discarded together with the temporary directory."""
+        for run in self.running:
+            run.process.kill()
+        if self.running:
+            self.loop.run_until_complete(
+                asyncio.wait([run.task for run in self.running]))
+        for run in list(self.running):
+            self._finish(run, "cancelled")
+
+    def close(self):
+        self.cancel_all()
+        self.loop.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def run_opt_parallel(configs, runner, plan_manager, timeout):
+    pending = list(configs)
+    while pending or runner.running:
+        while pending and runner.has_free_job():
+            run_time = compute_run_time(
+                timeout, pending, 0, runner.get_reserved_time())
+            if run_time <= 0:
+                break
+            _, args = pending.pop(0)
+            runner.start(list(args), run_time, args)
+        if not runner.running:
+            # There is no time left for the pending configurations.
+            return
+        run, exitcode = runner.wait()
+        yield exitcode
+
+        if exitcode in [returncodes.SUCCESS, returncodes.SEARCH_UNSOLVABLE]:
+            plan_manager.adopt_plans(run.plan_prefix)
+            runner.cancel_all()
+            return
+
+
+def get_parallel_sat_args(args_template, search_cost_type,
+                          heuristic_cost_type, plan_manager):
+    args = list(args_template)
+    adapt_args(args, search_cost_type, heuristic_cost_type, plan_manager)
+    if not plan_manager.abort_portfolio_after_first_plan():
+        # Concurrent runs number their plans starting from 1, and the plan
+        # manager imports them in the order in which the runs finish.
+        args.extend(["--internal-previous-portfolio-plans", "0"])
+    return args
+
+
+def run_sat_parallel(configs, runner, plan_manager, final_config,
+                     final_config_builder, timeout):
+    # Like run_sat, but runs the configurations of each round
+    # concurrently. Runs that are started later use the best cost bound
+    # found so far, and running configurations read improved bounds
+    # from the bound file.
+    if not plan_manager.abort_portfolio_after_first_plan():
+        runner.share_plans()
+    heuristic_cost_type = "one"
+    search_cost_type = "one"
+    changed_cost_types = False
+    while configs:
+        configs_next_round = []
+        # Entries (position, is_rerun); reruns with real costs are not
+        # added to the next round again.
+        pending = [(pos, False) for pos in range(len(configs))]
+        while pending or runner.running:
+            while pending and runner.has_free_job():
+                run_time = compute_run_time(
+                    timeout, [configs[pos] for pos, _ in pending], 0,
+                    runner.get_reserved_time())
+                if run_time <= 0:
+                    break
+                pos, is_rerun = pending.pop(0)
+                args = get_parallel_sat_args(
+                    configs[pos][1], search_cost_type, heuristic_cost_type,
+                    plan_manager)
+                runner.start(args, run_time, configs[pos][1], (pos, is_rerun))
+            if not runner.running:
+                # There is no time left for the pending configurations.
+                return
+            run, exitcode = runner.wait()
+            if (plan_manager.abort_portfolio_after_first_plan() and
+                    exitcode == returncodes.SUCCESS):
+                plan_manager.adopt_plans(run.plan_prefix)
+            yield exitcode
+            if exitcode == returncodes.SEARCH_UNSOLVABLE:
+                runner.cancel_all()
+                return
+
+            if exitcode == returncodes.SUCCESS:
+                if plan_manager.abort_portfolio_after_first_plan():
+                    runner.cancel_all()
+                    return
+                pos, is_rerun = run.info
+                _, args = configs[pos]
+                if not is_rerun:
+                    configs_next_round.append(pos)
+                if (not changed_cost_types and can_change_cost_type(args) and
+                    plan_manager.get_problem_type() == "general cost"):
+                    print("Switch to real costs and repeat run %d." % run.number)
+                    changed_cost_types = True
+                    search_cost_type = "normal"
+                    heuristic_cost_type = "plusone"
+                    pending.insert(0, (pos, True))
+                if final_config_builder:
+                    print("Build final config.")
+                    final_config = final_config_builder(args)
+                    runner.cancel_all()
+                    break
+
+        if final_config:
+            break
+
+        # Only run the successful configs in the next round.
+        configs = [configs[pos] for pos in sorted(configs_next_round)]
+
+    if final_config:
+        print("Abort portfolio and run final config.")
+        run_time = compute_run_time(timeout, [(1, final_config)], 0)
+        if run_time <= 0:
+            return
+        args = get_parallel_sat_args(
+            final_config, search_cost_type, heuristic_cost_type, plan_manager)
+        runner.start(args, run_time, final_config)
+        run, exitcode = runner.wait()
+        if (plan_manager.abort_portfolio_after_first_plan() and
+                exitcode == returncodes.SUCCESS):
+            plan_manager.adopt_plans(run.plan_prefix)
+        yield exitcode
+
+
 def can_change_cost_type(args):
     return any("S_COST_TYPE" in part or "H_COST_TRANSFORM" in part for part in args)
 
@@ -201,12 +482,28 @@ def get_portfolio_attributes(portfolio):
     return attributes
 
 
-def run(portfolio, executable, sas_file, plan_manager, time, memory):
+def record_history(history, sas_file, config_runs):
+    task = portfolio_history.compute_task_key(sas_file)
+    for config_run in config_runs:
+        # Without os.wait4, we only know the wall-clock time.
+        time = config_run.get("cpu_time", config_run["wall_time"])
+        history.add_run(
+            task, config_run["config"], time,
+            config_run["returncode"] == returncodes.SUCCESS)
+    history.save()
+
+
+def run(portfolio, executable, sas_file, plan_manager, time, memory, jobs=1,
+        resource_usage=None, history_file=None):
     """
     Run the configs in the given portfolio file.
 
     The portfolio is allowed to run for at most *time* seconds and may
-    use a maximum of *memory* bytes.
+    use a maximum of *memory* bytes. It runs up to *jobs* configs in
+    parallel. If *resource_usage* is a list, we append the resource
+    usage of each config run to it. If *history_file* is given, we adapt
+    the time slices of the configs to the runs stored in it (see
+    portfolio_history) and add the runs of this portfolio to it.
     """
     attributes = get_portfolio_attributes(portfolio)
     configs = attributes["CONFIGS"]
@@ -228,11 +525,39 @@ def run(portfolio, executable, sas_file, plan_manager, time, memory):
 
     timeout = util.get_elapsed_time() + time
 
-    if optimal:
-        exitcodes = run_opt(
-            configs, executable, sas_file, plan_manager, timeout, memory)
+    config_runs = []
+    history = None
+    if history_file:
+        history = portfolio_history.PortfolioHistory(history_file)
+        configs = history.adapt_configs(configs, time)
+
+    # Each run converts binary or compressed input while piping it to
+    # the search (see call.SupervisedProcess), so we never write a text
+    # copy of the task to disk.
+    if jobs > 1:
+        runner = ParallelRunner(
+            executable, sas_file, plan_manager, memory, jobs, config_runs)
+        try:
+            # The runs have to finish before we close the runner.
+            if optimal:
+                exitcodes = list(run_opt_parallel(
+                    configs, runner, plan_manager, timeout))
+            else:
+                exitcodes = list(run_sat_parallel(
+                    configs, runner, plan_manager, final_config,
+                    final_config_builder, timeout))
+        finally:
+            runner.close()
+    elif optimal:
+        exitcodes = list(run_opt(
+            configs, executable, sas_file, plan_manager, timeout, memory,
+            config_runs))
     else:
-        exitcodes = run_sat(
+        exitcodes = list(run_sat(
             configs, executable, sas_file, plan_manager, final_config,
-            final_config_builder, timeout, memory)
-    return returncodes.generate_portfolio_exitcode(list(exitcodes))
+            final_config_builder, timeout, memory, config_runs))
+    if resource_usage is not None:
+        resource_usage.extend(config_runs)
+    if history:
+        record_history(history, sas_file, config_runs)
+    return returncodes.generate_portfolio_exitcode(exitcodes)
@@ -3,11 +3,13 @@ import logging
 import os.path
 import subprocess
 import sys
+import time
 
 from . import call
 from . import limits
 from . import portfolio_runner
 from . import returncodes
+from . import translator_cache
 from . import util
 from .plan_manager import PlanManager
 
@@ -47,7 +49,7 @@ def get_executable(build, rel_path):
     return abs_path
 
 
-def run_translate(args):
+def run_translate(args, resource_usage=None):
     logging.info("Running translator.")
     time_limit = limits.get_time_limit(
         args.translate_time_limit, args.overall_time_limit)
@@ -57,15 +59,35 @@ def run_translate(args):
     assert sys.executable, "Path to interpreter could not be found"
     cmd = [sys.executable] + [translate] + args.translate_inputs + args.translate_options
 
+    cache = None
+    if args.translate_cache and translator_cache.is_cacheable(args.translate_options):
+        cache = translator_cache.TranslatorCache(
+            args.translate_cache, args.translate_cache_size)
+        start_time = time.monotonic()
+        cache_key = translator_cache.compute_key(
+            translate, args.translate_inputs, args.translate_options)
+        if cache.lookup(cache_key, args.sas_file):
+            if resource_usage is not None:
+                resource_usage.append({
+                    "component": "translate", "cached": True,
+                    "returncode": 0, "killed": False, "timed_out": False,
+                    "wall_time": time.monotonic() - start_time})
+            return (0, True)
+
     stderr, returncode = call.get_error_output_and_returncode(
         "translator",
         cmd,
         time_limit=time_limit,
-        memory_limit=memory_limit)
-
-    # We collect stderr of the translator and print it here, unless
-    # the translator ran out of memory and all output in stderr is
-    # related to MemoryError.
+        memory_limit=memory_limit,
+        wall_time_limit=limits.get_wall_time_limit(time_limit),
+        timeout_returncode=returncodes.TRANSLATE_OUT_OF_TIME,
+        resource_usage=resource_usage,
+        component="translate")
+
+    # The error output of the translator is streamed to stderr, except
+    # for leading lines related to MemoryError, which we collect and
+    # print here, unless the translator ran out of memory and all
+    # output in stderr is related to MemoryError.
     do_print_on_stderr = True
     if returncode == returncodes.TRANSLATE_OUT_OF_MEMORY:
         output_related_to_memory_error = True
@@ -82,6 +104,8 @@ def run_translate(args):
         returncodes.print_stderr(stderr)
 
     if returncode == 0:
+        if cache:
+            cache.store(cache_key, args.sas_file)
         return (0, True)
     elif returncode == 1:
         # Unlikely case that the translator crashed without raising an
@@ -93,7 +117,7 @@ def run_translate(args):
         return (returncode, False)
 
 
-def run_search(args):
+def run_search(args, resource_usage=None):
     logging.info("Running search (%s)." % args.build)
     time_limit = limits.get_time_limit(
         args.search_time_limit, args.overall_time_limit)
@@ -112,7 +136,8 @@ def run_search(args):
         logging.info("search portfolio: %s" % args.portfolio)
         return portfolio_runner.run(
             args.portfolio, executable, args.search_input, plan_manager,
-            time_limit, memory_limit)
+            time_limit, memory_limit, args.portfolio_jobs, resource_usage,
+            args.portfolio_history)
     else:
         if not args.search_options:
             returncodes.exit_with_driver_input_error(
@@ -125,7 +150,11 @@ def run_search(args):
                 [executable] + args.search_options,
                 stdin=args.search_input,
                 time_limit=time_limit,
-                memory_limit=memory_limit)
+                memory_limit=memory_limit,
+                wall_time_limit=limits.get_wall_time_limit(time_limit),
+                timeout_returncode=returncodes.SEARCH_OUT_OF_TIME,
+                resource_usage=resource_usage,
+                component="search")
         except subprocess.CalledProcessError as err:
             # TODO: if we ever add support for SEARCH_PLAN_FOUND_AND_* directly
             # in the planner, this assertion no longer holds. Furthermore, we
@@ -138,7 +167,7 @@ def run_search(args):
             return (0, True)
 
 
-def run_validate(args):
+def run_validate(args, resource_usage=None):
     logging.info("Running validate.")
 
     num_files = len(args.filenames)
@@ -161,7 +190,10 @@ def run_validate(args):
             "validate",
             [VALIDATE] + validate_inputs,
             time_limit=args.validate_time_limit,
-            memory_limit=args.validate_memory_limit)
+            memory_limit=args.validate_memory_limit,
+            wall_time_limit=limits.get_wall_time_limit(args.validate_time_limit),
+            resource_usage=resource_usage,
+            component="validate")
     except OSError as err:
         if err.errno == errno.ENOENT:
             returncodes.exit_with_driver_input_error("Error: {} not found. Is it on the PATH?".format(VALIDATE))
@@ -0,0 +1,229 @@
+"""Read translator output files in the binary or compressed format.
+
+The translator can write its output in a binary format (see the
+description at the top of src/translate/sas_tasks.py) and compress it
+with gzip. The search component only reads the text format, so the
+driver converts such files while passing them to the search.
+"""
+
+import gzip
+import shutil
+
+
+BINARY_SAS_MAGIC = b"SASB"
+BINARY_SAS_FORMAT_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+TEXT_SAS_MAGIC = b"begin_version"
+
+NUM_SECTIONS = 6
+INPUT_CHUNK_SIZE = 1 << 20
+OUTPUT_CHUNK_SIZE = 1 << 20
+# Upper bound on the size of an encoded number. Numbers that fit into 64
+# bits need at most 10 bytes.
+MAX_NUMBER_SIZE = 16
+
+
+class BinarySASError(Exception):
+    pass
+
+
+def _read_start(filename, size):
+    with open(filename, "rb") as input_file:
+        start = input_file.read(size)
+    if start.startswith(GZIP_MAGIC):
+        with gzip.open(filename, "rb") as input_file:
+            start = input_file.read(size)
+    return start
+
+
+def needs_conversion(filename):
+    """Return True if the search cannot read the file directly."""
+    with open(filename, "rb") as input_file:
+        start = input_file.read(len(BINARY_SAS_MAGIC))
+    return start == BINARY_SAS_MAGIC or start.startswith(GZIP_MAGIC)
+
+
+def is_sas_file(filename):
+    """Return True if the file looks like translator output in any
+    of the supported formats."""
+    start = _read_start(filename, len(TEXT_SAS_MAGIC))
+    return start == TEXT_SAS_MAGIC or start.startswith(BINARY_SAS_MAGIC)
+
+
+def write_text(filename, stream):
+    """Write the content of the translator output file in the text
+    format to the binary stream. We decode the input in chunks, so we
+    never hold the whole task in memory."""
+    with open(filename, "rb") as input_file:
+        is_compressed = input_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    opener = gzip.open if is_compressed else open
+    with opener(filename, "rb") as input_file:
+        start = input_file.read(len(BINARY_SAS_MAGIC))
+        if start != BINARY_SAS_MAGIC:
+            stream.write(start)
+            shutil.copyfileobj(input_file, stream)
+            return
+        for chunk in _decode(input_file):
+            stream.write(chunk.encode("utf-8"))
+
+
+class _Decoder:
+    """Read numbers and strings from the binary input file, which is
+    positioned after the magic bytes."""
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.data = b""
+        self.pos = 0
+        # Number of bytes of the file that precede self.data.
+        self.offset = len(BINARY_SAS_MAGIC)
+
+    def _fill(self, size):
+        """Read the next chunk of the file such that at least *size*
+        bytes follow the current position, unless the file ends."""
+        self.offset += self.pos
+        self.data = self.data[self.pos:] + self.input_file.read(
+            max(size, INPUT_CHUNK_SIZE))
+        self.pos = 0
+
+    def tell(self):
+        return self.offset + self.pos
+
+    def at_end(self):
+        if self.pos == len(self.data):
+            self._fill(1)
+        return self.pos == len(self.data)
+
+    def read_number(self):
+        if self.pos + MAX_NUMBER_SIZE > len(self.data):
+            self._fill(MAX_NUMBER_SIZE)
+        data = self.data
+        pos = self.pos
+        byte = data[pos]
+        pos += 1
+        number = byte & 0x7f
+        shift = 7
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            number |= (byte & 0x7f) << shift
+            shift += 7
+        self.pos = pos
+        return number >> 1 if not number & 1 else -(number >> 1) - 1
+
+    def read_string(self):
+        length = self.read_number()
+        if self.pos + length > len(self.data):
+            self._fill(length)
+            if self.pos + length > len(self.data):
+                raise IndexError
+        start = self.pos
+        self.pos += length
+        return self.data[start:self.pos].decode("utf-8")
+
+    def read_pairs(self):
+        return [(self.read_number(), self.read_number())
+                for _ in range(self.read_number())]
+
+
+def _format_pairs(pairs):
+    return "".join("%d %d\n" % pair for pair in pairs)
+
+
+def _decode(input_file):
+    """Generate the text format of the binary task in *input_file*,
+    which is positioned after the magic bytes, in chunks."""
+    decoder = _Decoder(input_file)
+    try:
+        format_version = decoder.read_number()
+        if format_version != BINARY_SAS_FORMAT_VERSION:
+            raise BinarySASError(
+                "unsupported format version: {}".format(format_version))
+        sas_version = decoder.read_number()
+        metric = decoder.read_number()
+        num_sections = decoder.read_number()
+        if num_sections != NUM_SECTIONS:
+            raise BinarySASError(
+                "unexpected number of sections: {}".format(num_sections))
+        section_sizes = [decoder.read_number() for _ in range(num_sections)]
+        end = decoder.tell() + sum(section_sizes)
+
+        yield ("begin_version\n%d\nend_version\n"
+               "begin_metric\n%d\nend_metric\n" % (sas_version, metric))
+
+        parts = ["%d\n" % decoder.read_number()]
+        for var in range(int(parts[0])):
+            axiom_layer = decoder.read_number()
+            rang = decoder.read_number()
+            parts.append("begin_variable\nvar%d\n%d\n%d\n" % (
+                var, axiom_layer, rang))
+            parts.extend("%s\n" % decoder.read_string() for _ in range(rang))
+            parts.append("end_variable\n")
+        yield "".join(parts)
+
+        num_mutexes = decoder.read_number()
+        yield "%d\n" % num_mutexes
+        yield from _in_chunks(
+            "begin_mutex_group\n%d\n%send_mutex_group\n" % (
+                len(facts), _format_pairs(facts))
+            for facts in (decoder.read_pairs() for _ in range(num_mutexes)))
+
+        values = [decoder.read_number() for _ in range(decoder.read_number())]
+        yield "begin_state\n%send_state\n" % "".join(
+            "%d\n" % val for val in values)
+
+        goal = decoder.read_pairs()
+        yield "begin_goal\n%d\n%send_goal\n" % (len(goal), _format_pairs(goal))
+
+        num_operators = decoder.read_number()
+        yield "%d\n" % num_operators
+        yield from _in_chunks(
+            _decode_operator(decoder) for _ in range(num_operators))
+
+        num_axioms = decoder.read_number()
+        yield "%d\n" % num_axioms
+        yield from _in_chunks(
+            _decode_axiom(decoder) for _ in range(num_axioms))
+    except IndexError:
+        raise BinarySASError("unexpected end of file")
+    if not decoder.at_end():
+        raise BinarySASError("unexpected data after the last section")
+    if decoder.tell() != end:
+        raise BinarySASError("section sizes do not match the file size")
+
+
+def _decode_operator(decoder):
+    name = decoder.read_string()
+    prevail = decoder.read_pairs()
+    parts = ["begin_operator\n%s\n%d\n" % (name, len(prevail)),
+             _format_pairs(prevail)]
+    num_pre_post = decoder.read_number()
+    parts.append("%d\n" % num_pre_post)
+    for _ in range(num_pre_post):
+        cond = decoder.read_pairs()
+        parts.append("%d " % len(cond))
+        parts.extend("%d %d " % fact for fact in cond)
+        parts.append("%d %d %d\n" % (
+            decoder.read_number(), decoder.read_number(),
+            decoder.read_number()))
+    parts.append("%d\nend_operator\n" % decoder.read_number())
+    return "".join(parts)
+
+
+def _decode_axiom(decoder):
+    condition = decoder.read_pairs()
+    return "begin_rule\n%d\n%s%d %d %d\nend_rule\n" % (
+        len(condition), _format_pairs(condition), decoder.read_number(),
+        decoder.read_number(), decoder.read_number())
+
+
+def _in_chunks(strings):
+    chunk = []
+    chunk_size = 0
+    for string in strings:
+        chunk.append(string)
+        chunk_size += len(string)
+        if chunk_size >= OUTPUT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            chunk_size = 0
+    yield "".join(chunk)
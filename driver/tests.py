@@ -4,16 +4,28 @@ Test module for Fast Downward driver script. Run with
     py.test driver/tests.py
 """
 
+import asyncio
+import gzip
+import io
+import json
 import os
+import stat
 import subprocess
 import sys
+import time
 
 import pytest
 
 from .aliases import ALIASES, PORTFOLIOS
 from .arguments import EXAMPLES
+from . import call
 from . import limits
+from . import portfolio_history
+from . import portfolio_runner
 from . import returncodes
+from . import sas_binary
+from . import translator_cache
+from .plan_manager import PlanManager
 from .util import REPO_ROOT_DIR, find_domain_filename
 
 
@@ -84,3 +96,471 @@ def test_automatic_domain_file_name_computation():
         for filename in filenames:
             if "domain" not in filename:
                 assert find_domain_filename(os.path.join(dirpath, filename))
+
+
+def test_translator_cache(tmp_path):
+    cache = translator_cache.TranslatorCache(str(tmp_path / "cache"), max_size=11)
+    sas_file = tmp_path / "output.sas"
+    assert not cache.lookup("first", str(sas_file))
+    sas_file.write_text("first")
+    cache.store("first", str(sas_file))
+    sas_file.write_text("second")
+    cache.store("second", str(sas_file))
+    assert cache.lookup("first", str(sas_file))
+    assert sas_file.read_text() == "first"
+
+    # Storing a third entry exceeds the size limit and evicts the least
+    # recently used entry.
+    os.utime(tmp_path / "cache" / "first.sas", (0, 0))
+    cache.store("third", str(sas_file))
+    assert not cache.lookup("first", str(sas_file))
+    assert cache.lookup("second", str(sas_file))
+    assert cache.lookup("third", str(sas_file))
+
+
+def test_translator_cache_key():
+    domain = os.path.join(REPO_ROOT_DIR, "misc", "tests", "benchmarks", "gripper", "domain.pddl")
+    problem = os.path.join(REPO_ROOT_DIR, "misc", "tests", "benchmarks", "gripper", "prob01.pddl")
+    translator = os.path.join(REPO_ROOT_DIR, "src", "translate", "translate.py")
+    key = translator_cache.compute_key(translator, [domain, problem], ["--sas-file", "a.sas"])
+    assert key == translator_cache.compute_key(translator, [domain, problem], ["--sas-file", "b.sas"])
+    assert key != translator_cache.compute_key(translator, [domain, problem], ["--full-encoding"])
+    assert key != translator_cache.compute_key(translator, [problem, domain], [])
+    assert key == translator_cache.compute_key(
+        translator, [domain, problem],
+        ["--invariant-cache", "cache", "--translation-processes", "2"])
+    assert key == translator_cache.compute_key(
+        translator, [domain, problem], ["--sas-file=c.sas"])
+
+
+def test_translator_cache_uncacheable_options():
+    assert translator_cache.is_cacheable(["--full-encoding"])
+    for option in ["--dump-task", "--profile-file", "--model-snapshot"]:
+        assert not translator_cache.is_cacheable([option, "file"])
+    assert not translator_cache.is_cacheable(["--profile-file=file"])
+
+
+def test_translator_cache_hit_records_resource_usage(tmp_path):
+    cmd = [sys.executable, os.path.join(REPO_ROOT_DIR, "fast-downward.py"),
+           "--translate", "--translate-cache", str(tmp_path / "cache"),
+           "--resource-summary",
+           os.path.join(REPO_ROOT_DIR, "misc", "tests", "benchmarks",
+                        "gripper", "prob01.pddl")]
+    for _ in range(2):
+        subprocess.check_call(cmd, cwd=str(tmp_path), stdout=subprocess.DEVNULL)
+    with open(tmp_path / "sas_plan.resources.json") as summary_file:
+        usage, = json.load(summary_file)
+    assert usage["component"] == "translate" and usage["cached"]
+
+
+@pytest.mark.parametrize("translator_options", [
+    ["--sas-format", "binary"],
+    ["--sas-format", "binary", "--sas-compression", "gzip"],
+    ["--sas-compression", "gzip"]])
+def test_binary_sas_file(tmp_path, monkeypatch, translator_options):
+    benchmark_dir = os.path.join(REPO_ROOT_DIR, "misc", "tests", "benchmarks", "philosophers")
+    translator = os.path.join(REPO_ROOT_DIR, "src", "translate", "translate.py")
+    text_file = str(tmp_path / "text.sas")
+    other_file = str(tmp_path / "other.sas")
+    for sas_file, options in [(text_file, []), (other_file, translator_options)]:
+        subprocess.check_call(
+            [sys.executable, translator,
+             os.path.join(benchmark_dir, "domain.pddl"),
+             os.path.join(benchmark_dir, "p01-phil2.pddl"),
+             "--sas-file", sas_file] + options,
+            stdout=subprocess.DEVNULL)
+    assert not sas_binary.needs_conversion(text_file)
+    assert sas_binary.needs_conversion(other_file)
+    assert sas_binary.is_sas_file(other_file)
+    # Decode in small chunks to test reading across chunk boundaries.
+    monkeypatch.setattr(sas_binary, "INPUT_CHUNK_SIZE", 7)
+    converted_file = tmp_path / "converted.sas"
+    with open(converted_file, "wb") as stream:
+        sas_binary.write_text(other_file, stream)
+    with open(text_file, "rb") as stream:
+        assert converted_file.read_bytes() == stream.read()
+
+
+def test_sas_file_in_memory_requires_translate_and_search():
+    cmd = [sys.executable, "fast-downward.py", "--sas-file-in-memory",
+           "--translate", "misc/tests/benchmarks/gripper/prob01.pddl"]
+    returncode = subprocess.call(cmd, cwd=REPO_ROOT_DIR, stderr=subprocess.DEVNULL)
+    assert returncode == returncodes.DRIVER_INPUT_ERROR
+
+
+FAKE_SEARCH = """\
+#! {python}
+# Behaves like a search configuration "fake(cost=C,sleep=S,bound=B)".
+import sys, time
+args = sys.argv[1:]
+options = dict(option.split("=") for option in
+               args[args.index("--search") + 1][5:-1].split(","))
+plan_file = args[args.index("--internal-plan-file") + 1]
+if "--internal-previous-portfolio-plans" in args:
+    counter = int(args[args.index("--internal-previous-portfolio-plans") + 1])
+    plan_file += ".%d" % (counter + 1)
+time.sleep(float(options.get("sleep", 0)))
+cost = int(options.get("cost", 0))
+bound = float(options.get("bound", "infinity"))
+if "--internal-bound-file" in args:
+    try:
+        with open(args[args.index("--internal-bound-file") + 1]) as bound_file:
+            bound = min(bound, int(bound_file.read()))
+    except FileNotFoundError:
+        pass
+if cost >= bound:
+    sys.exit(12)
+with open(plan_file, "w") as output:
+    output.write("(noop)\\n; cost = %d (general cost)\\n" % cost)
+"""
+
+
+def run_fake_portfolio(tmp_path, optimal, configs, resource_usage=None,
+                       history_file=None, jobs=2, compress=False):
+    executable = tmp_path / "fake-search"
+    executable.write_text(FAKE_SEARCH.format(python=sys.executable))
+    executable.chmod(0o755)
+    portfolio = tmp_path / "portfolio.py"
+    portfolio.write_text("OPTIMAL = {}\nCONFIGS = {!r}\n".format(optimal, [
+        (1, ["--search", "fake({})".format(config)]) for config in configs]))
+    sas_file = tmp_path / "output.sas"
+    if compress:
+        sas_file.write_bytes(gzip.compress(b"begin_version\n"))
+    else:
+        sas_file.write_text("begin_version\n")
+    plan_manager = PlanManager(str(tmp_path / "sas_plan"))
+    result = portfolio_runner.run(
+        str(portfolio), str(executable), str(sas_file), plan_manager,
+        time=100, memory=None, jobs=jobs, resource_usage=resource_usage,
+        history_file=history_file)
+    plans = {path.name: path.read_text() for path in tmp_path.iterdir()
+             if path.name.startswith("sas_plan")}
+    return result, plans
+
+
+def test_parallel_optimal_portfolio(tmp_path):
+    result, plans = run_fake_portfolio(
+        tmp_path, True, ["sleep=60", "cost=3,sleep=0.1"])
+    assert result == (returncodes.SUCCESS, True)
+    assert plans == {"sas_plan": "(noop)\n; cost = 3 (general cost)\n"}
+
+
+def test_parallel_portfolio_resource_usage(tmp_path):
+    resource_usage = []
+    run_fake_portfolio(
+        tmp_path, True, ["sleep=60", "cost=3,sleep=0.1"], resource_usage)
+    assert [(usage["run"], usage["killed"]) for usage in resource_usage] == [
+        (2, False), (1, True)]
+    assert resource_usage[0]["args"] == ["--search", "fake(cost=3,sleep=0.1)"]
+    if hasattr(os, "wait4"):
+        assert all(usage["max_rss_kb"] > 0 for usage in resource_usage)
+
+
+def test_parallel_satisficing_portfolio(tmp_path, capsys):
+    result, plans = run_fake_portfolio(
+        tmp_path, False,
+        ["cost=5,sleep=0.5,bound=BOUND", "cost=3,sleep=0.1,bound=BOUND"])
+    assert result == (returncodes.SUCCESS, True)
+    assert plans == {"sas_plan.1": "(noop)\n; cost = 3 (general cost)\n"}
+    # The first config reads the bound 3 from the bound file and fails.
+    # Only the second config runs again with the bound 3 and fails.
+    assert "Exit codes: [0, 12, 12]" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_portfolio_streams_converted_input(tmp_path, monkeypatch, jobs):
+    streams = []
+    write_text = sas_binary.write_text
+
+    def record_conversion(filename, stream):
+        streams.append(stat.S_ISFIFO(os.fstat(stream.fileno()).st_mode))
+        write_text(filename, stream)
+
+    monkeypatch.setattr(sas_binary, "write_text", record_conversion)
+    result, _ = run_fake_portfolio(
+        tmp_path, True, ["cost=3,bound=1", "cost=3,bound=2", "cost=3"],
+        jobs=jobs, compress=True)
+    assert result == (returncodes.SUCCESS, True)
+    # Each run decodes the input into the pipe to its search process
+    # instead of reading a text copy on disk.
+    assert streams == [True] * 3
+    assert sorted(path.name for path in tmp_path.iterdir()
+                  if path.suffix == ".sas") == ["output.sas"]
+
+
+def test_supervised_process_wall_time_limit():
+    process = call.SupervisedProcess(
+        "sleep", [sys.executable, "-c", "import time; time.sleep(60)"],
+        wall_time_limit=0.5)
+    returncode, = call.run_processes([process])
+    assert process.killed and process.timed_out
+    assert returncode < 0
+    assert process.wall_time < 30
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write_lines(self, lines):
+        self.lines.extend(lines)
+
+
+def _process_is_gone(pid, timeout=10):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+SPAWN_GRANDCHILD = """
+import subprocess, sys, time
+grandchild = subprocess.Popen(
+    [sys.executable, "-c", "import time; time.sleep(60)"])
+print(grandchild.pid, flush=True)
+time.sleep(%s)
+"""
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs process groups")
+def test_supervised_process_wall_time_limit_kills_grandchild():
+    writer = RecordingWriter()
+    process = call.SupervisedProcess(
+        "spawn", [sys.executable, "-c", SPAWN_GRANDCHILD % 60],
+        wall_time_limit=2, stdout_writer=writer)
+    start_time = time.monotonic()
+    returncode, = call.run_processes([process])
+    assert process.timed_out and returncode < 0
+    # The grandchild holds the output pipes, so the run only ends this
+    # early if the grandchild has been killed with the child.
+    assert time.monotonic() - start_time < 30
+    grandchild_pid = int(writer.lines[0])
+    assert _process_is_gone(grandchild_pid)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs process groups")
+def test_supervised_process_kills_grandchild_holding_output(monkeypatch):
+    monkeypatch.setattr(call, "OUTPUT_DRAIN_TIMEOUT", 0.5)
+    writer = RecordingWriter()
+    process = call.SupervisedProcess(
+        "spawn", [sys.executable, "-c", SPAWN_GRANDCHILD % 0],
+        stdout_writer=writer)
+    start_time = time.monotonic()
+    returncode, = call.run_processes([process])
+    assert returncode == 0 and not process.timed_out
+    assert time.monotonic() - start_time < 30
+    grandchild_pid = int(writer.lines[0])
+    assert _process_is_gone(grandchild_pid)
+
+
+def test_check_call_wall_time_limit_returncode():
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        call.check_call(
+            "search", [sys.executable, "-c", "import time; time.sleep(60)"],
+            time_limit=10, wall_time_limit=0.5,
+            timeout_returncode=returncodes.SEARCH_OUT_OF_TIME)
+    assert excinfo.value.returncode == returncodes.SEARCH_OUT_OF_TIME
+
+
+def test_wall_time_limit():
+    assert limits.get_wall_time_limit(None) is None
+    assert limits.get_wall_time_limit(10) == 80
+    assert limits.get_wall_time_limit(10, 3) == 120
+
+
+def test_supervised_process_kill_after_exit():
+    process = call.SupervisedProcess("exit", [sys.executable, "-c", "pass"])
+    process.start()
+    # The process has exited but has not been reaped yet. Killing it
+    # must not reap it, or waiting for it would fail.
+    time.sleep(0.5)
+    process.kill()
+    assert asyncio.run(process.wait()) == 0
+
+
+def test_supervised_processes_stream_output(capfd):
+    script = "import sys; print('out %s'); print('err %s', file=sys.stderr)"
+    processes = [
+        call.SupervisedProcess(
+            "run%d" % number, [sys.executable, "-c", script % (number, number)],
+            stdout_writer=call.OutputWriter(sys.stdout, "[%d] " % number))
+        for number in range(2)]
+    assert call.run_processes(processes) == [0, 0]
+    out, err = capfd.readouterr()
+    assert "[0] out 0\n" in out and "[1] out 1\n" in out
+    assert "err 0\n" in err and "err 1\n" in err
+    if hasattr(os, "wait4"):
+        assert all(process.rusage.ru_maxrss > 0 for process in processes)
+
+
+def test_supervised_process_output_order():
+    script = "import time; print('first', flush=True); time.sleep(1); print('second')"
+    stream = io.TextIOWrapper(io.BytesIO())
+    process = call.SupervisedProcess(
+        "child", [sys.executable, "-c", script],
+        stdout_writer=call.OutputWriter(stream))
+
+    async def print_while_running():
+        process.start()
+        wait_task = asyncio.ensure_future(process.wait())
+        await asyncio.sleep(0.5)
+        print("driver", file=stream)
+        await wait_task
+
+    asyncio.run(print_while_running())
+    stream.flush()
+    assert stream.buffer.getvalue() == b"first\ndriver\nsecond\n"
+
+
+def test_error_output_holds_back_memory_errors(capfd):
+    script = "import sys; sys.stderr.write('MemoryError\\n'); sys.exit(3)"
+    stderr, returncode = call.get_error_output_and_returncode(
+        "translator", [sys.executable, "-c", script])
+    assert (stderr, returncode) == ("MemoryError\n", 3)
+    assert "MemoryError" not in capfd.readouterr().err
+
+
+def test_check_call_records_resource_usage():
+    resource_usage = []
+    with pytest.raises(subprocess.CalledProcessError):
+        call.check_call(
+            "exit", [sys.executable, "-c", "import sys; sys.exit(4)"],
+            resource_usage=resource_usage, component="search")
+    usage, = resource_usage
+    assert (usage["component"], usage["returncode"]) == ("search", 4)
+    assert usage["wall_time"] > 0
+
+
+def test_compute_run_time_rounds_up(monkeypatch):
+    monkeypatch.setattr(portfolio_runner.util, "get_elapsed_time", lambda: 0)
+    # The first config gets 60 * 26 / 1583 < 1 seconds.
+    configs = [(26, []), (1557, [])]
+    assert portfolio_runner.compute_run_time(60, configs, 0) == 1
+
+
+def test_compute_run_time_does_not_exceed_remaining_time(monkeypatch):
+    monkeypatch.setattr(portfolio_runner.util, "get_elapsed_time", lambda: 0)
+    configs = [(1, []), (1, [])]
+    assert portfolio_runner.compute_run_time(9.5, configs, 1) == 9
+    # Parallel configs that are still running reserve 59.5 seconds.
+    assert portfolio_runner.compute_run_time(60, configs, 0, 59.5) == 0
+
+
+class FakeParallelRunner:
+    """Record the time limits of the started runs. Each call of wait()
+    finishes the oldest run and lets the given amount of time pass."""
+    def __init__(self, jobs, timeout, elapsed_times):
+        self.jobs = jobs
+        self.timeout = timeout
+        self.running = []
+        self.run_times = []
+        self.elapsed_time = 0
+        self.elapsed_times = list(elapsed_times)
+
+    def get_elapsed_time(self):
+        return self.elapsed_time
+
+    def has_free_job(self):
+        return len(self.running) < self.jobs
+
+    def get_reserved_time(self):
+        return sum(run.run_time for run in self.running)
+
+    def start(self, args, run_time, config, info=None):
+        assert 0 < run_time <= (self.timeout - self.elapsed_time -
+                                self.get_reserved_time())
+        self.run_times.append(run_time)
+        self.running.append(portfolio_runner.ParallelRun(
+            len(self.run_times), None, args, config, None, None, run_time,
+            info))
+
+    def wait(self):
+        self.elapsed_time = self.elapsed_times.pop(0)
+        return self.running.pop(0), returncodes.SEARCH_OUT_OF_TIME
+
+
+def test_parallel_run_time_does_not_exceed_remaining_time(monkeypatch):
+    configs = [(1, ["--search", "fake(%d)" % pos]) for pos in range(4)]
+    runner = FakeParallelRunner(
+        jobs=2, timeout=10, elapsed_times=[4.5, 6.5, 8, 9])
+    monkeypatch.setattr(portfolio_runner.util, "get_elapsed_time",
+                        runner.get_elapsed_time)
+    exitcodes = list(portfolio_runner.run_opt_parallel(
+        configs, runner, None, timeout=10))
+    # The first two runs get 10 / 4 and 7 / 3 seconds, rounded up. When
+    # the first run finishes after 4.5 seconds, 2.5 seconds are not
+    # reserved by the second run, and the third run gets half of them,
+    # rounded up. After 6.5 seconds, only 1.5 seconds are not reserved
+    # by the third run. The last config gets all of them, and rounding
+    # up would exceed the remaining time.
+    assert runner.run_times == [3, 3, 2, 1]
+    assert len(exitcodes) == 4
+
+
+def test_portfolio_history_adapts_configs(tmp_path):
+    history = portfolio_history.PortfolioHistory(str(tmp_path / "history.json"))
+    for task, time in [("t1", 5), ("t2", 20), ("t3", 30)]:
+        history.add_run(task, "slow", time, True)
+    for task in ["t1", "t2", "t3"]:
+        history.add_run(task, "fast", 1, task == "t1")
+    configs = [(1, ["slow"]), (1, ["fast"]), (2, ["unknown"])]
+    assert history.compute_slices(configs, 40) == [30, 1, 0]
+    # The remaining 9 seconds are distributed by relative time.
+    assert history.adapt_configs(configs, 40) == [
+        (3.25, ["fast"]), (32.25, ["slow"]), (4.5, ["unknown"])]
+
+
+def test_portfolio_history_is_recorded(tmp_path):
+    history_file = tmp_path / "history.json"
+    for _ in range(2):
+        run_fake_portfolio(
+            tmp_path, True, ["cost=3,bound=1", "cost=3"],
+            history_file=str(history_file), jobs=1)
+    runs = portfolio_history.PortfolioHistory(str(history_file)).runs
+    # In the second run, the solving config runs first.
+    assert [(run["config"], run["solved"]) for run in runs] == [
+        ("--search fake(cost=3,bound=1)", False), ("--search fake(cost=3)", True),
+        ("--search fake(cost=3)", True)]
+
+
+def test_memory_error_filter_releases_held_back_lines(capfd):
+    script = ("import sys; sys.stderr.write('MemoryError 1\\nMemoryError 2\\n'); "
+              "sys.stderr.write('other\\n')")
+    stderr, returncode = call.get_error_output_and_returncode(
+        "translator", [sys.executable, "-c", script])
+    assert (stderr, returncode) == ("", 0)
+    assert capfd.readouterr().err.endswith("MemoryError 1\nMemoryError 2\nother\n")
+
+
+def test_portfolio_history_appends_runs(tmp_path):
+    history_file = str(tmp_path / "history.jsonl")
+    first = portfolio_history.PortfolioHistory(history_file)
+    second = portfolio_history.PortfolioHistory(history_file)
+    first.add_run("t1", "a", 1.0, True)
+    second.add_run("t2", "b", 2.0, False)
+    first.save()
+    second.save()
+    runs = portfolio_history.PortfolioHistory(history_file).runs
+    assert [(run["task"], run["config"]) for run in runs] == [
+        ("t1", "a"), ("t2", "b")]
+
+
+def test_portfolio_history_ignores_invalid_runs(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    history_file.write_text(
+        '{"task": "t1", "config": "a", "time": 1.0, "solved": true}\n'
+        '[1, 2]\n'
+        '{"task": "t2", "config": "a", "ti')
+    runs = portfolio_history.PortfolioHistory(str(history_file)).runs
+    assert [run["task"] for run in runs] == ["t1"]
+    history = portfolio_history.PortfolioHistory(str(history_file))
+    history.add_run("t3", "a", 1.0, True)
+    history.save()
+    runs = portfolio_history.PortfolioHistory(str(history_file)).runs
+    assert [run["task"] for run in runs] == ["t1", "t3"]
+    history_file.write_bytes(b"\xff\xfe")
+    assert portfolio_history.PortfolioHistory(str(history_file)).runs == []
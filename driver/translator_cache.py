@@ -0,0 +1,159 @@
+"""Content-addressed on-disk cache for translator output.
+
+Cache entries are translator output files named after a hash of the
+translator source code, the contents of the PDDL input files and the
+translator options. Entries are written atomically (write to a
+temporary file in the cache directory, then rename), so several
+planner runs can share one cache directory. When the total size of
+the cache exceeds its size limit, the least recently used entries are
+removed. Using an entry updates its modification time.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+
+ENTRY_SUFFIX = ".sas"
+
+# Translator options that do not influence the content of the output
+# file. The invariant cache only speeds up invariant synthesis, so it
+# does not matter that a cache hit does not update it.
+_IGNORED_OPTIONS_WITH_ARGUMENT = [
+    "--sas-file", "--invariant-cache", "--translation-processes",
+    "--invariant-generation-processes"]
+
+# Translator options for which we never use the cache because they have
+# side effects other than writing the output file. --profile-file
+# writes a report and --model-snapshot stores the reachability model.
+_UNCACHEABLE_OPTIONS = [
+    "-h", "--help", "--dump-task", "--profile-file", "--model-snapshot"]
+
+
+def _update_hash_with_file(hasher, filename):
+    with open(filename, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 20), b""):
+            hasher.update(chunk)
+
+
+def _get_option_name(option):
+    """Return the name of *option*, which may be given as --name=value."""
+    if option.startswith("--"):
+        return option.split("=", 1)[0]
+    return option
+
+
+def _get_relevant_options(options):
+    relevant_options = []
+    skip_next = False
+    for option in options:
+        if skip_next:
+            skip_next = False
+        elif _get_option_name(option) in _IGNORED_OPTIONS_WITH_ARGUMENT:
+            # With --name=value, the argument is part of the option.
+            skip_next = "=" not in option
+        else:
+            relevant_options.append(option)
+    return relevant_options
+
+
+def is_cacheable(options):
+    return not any(_get_option_name(option) in _UNCACHEABLE_OPTIONS
+                   for option in options)
+
+
+def compute_key(translator, input_files, options):
+    """Return the cache key for translating *input_files* with the
+    translator script *translator* and the given translator options."""
+    hasher = hashlib.sha256()
+    translator_dir = os.path.dirname(os.path.abspath(translator))
+    sources = glob.glob(
+        os.path.join(translator_dir, "**", "*.py"), recursive=True)
+    for source in sorted(sources):
+        hasher.update(os.path.relpath(source, translator_dir).encode() + b"\0")
+        _update_hash_with_file(hasher, source)
+    for input_file in input_files:
+        hasher.update(b"\0input\0")
+        _update_hash_with_file(hasher, input_file)
+    for option in _get_relevant_options(options):
+        hasher.update(b"\0option\0" + option.encode())
+    return hasher.hexdigest()
+
+
+class TranslatorCache:
+    def __init__(self, directory, max_size):
+        """*max_size* is the maximal total size of all entries in bytes."""
+        self._directory = directory
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_entry_path(self, key):
+        return os.path.join(self._directory, key + ENTRY_SUFFIX)
+
+    def lookup(self, key, sas_file):
+        """Copy the entry for *key* to *sas_file* and return True if it
+        exists. Otherwise, return False."""
+        entry = self._get_entry_path(key)
+        try:
+            # Mark the entry as recently used. This fails if the entry
+            # does not exist (or was evicted concurrently).
+            os.utime(entry)
+            _copy_atomically(entry, sas_file)
+        except FileNotFoundError:
+            return False
+        logging.info("translator cache hit: {}".format(entry))
+        return True
+
+    def store(self, key, sas_file):
+        """Add *sas_file* as the entry for *key* and evict old entries
+        if the cache exceeds its size limit."""
+        entry = self._get_entry_path(key)
+        _copy_atomically(sas_file, entry)
+        logging.info("translator cache: stored {}".format(entry))
+        self._evict()
+
+    def _get_entries(self):
+        entries = []
+        for entry in glob.glob(os.path.join(self._directory, "*" + ENTRY_SUFFIX)):
+            try:
+                stat = os.stat(entry)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        return sorted(entries)
+
+    def _evict(self):
+        entries = self._get_entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                # Another planner run removed the entry concurrently.
+                pass
+            else:
+                logging.info("translator cache: evicted {}".format(entry))
+            total_size -= size
+
+
+def _copy_atomically(source, destination):
+    directory = os.path.dirname(os.path.abspath(destination))
+    handle, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=".tmp-", suffix=ENTRY_SUFFIX)
+    os.close(handle)
+    try:
+        # mkstemp creates the file with mode 0600. Use the default mode
+        # for new files instead, so that the cache can be shared.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
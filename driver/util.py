@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from . import returncodes
 
@@ -6,6 +7,7 @@ from . import returncodes
 DRIVER_DIR = os.path.abspath(os.path.dirname(__file__))
 REPO_ROOT_DIR = os.path.dirname(DRIVER_DIR)
 BUILDS_DIR = os.path.join(REPO_ROOT_DIR, "builds")
+SHARED_MEMORY_DIR = "/dev/shm"
 
 
 def get_elapsed_time():
@@ -19,6 +21,16 @@ def get_elapsed_time():
     return sum(os.times()[:4])
 
 
+def get_shared_memory_dir():
+    """
+    Return a directory for temporary files that are kept in memory, or
+    the default directory for temporary files if there is none.
+    """
+    if os.path.isdir(SHARED_MEMORY_DIR) and os.access(SHARED_MEMORY_DIR, os.W_OK):
+        return SHARED_MEMORY_DIR
+    return tempfile.gettempdir()
+
+
 def find_domain_filename(task_filename):
     """
     Find domain filename for the given task using automatic naming rules.
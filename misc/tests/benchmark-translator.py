@@ -0,0 +1,236 @@
+#! /usr/bin/env python3
+
+
+HELP = """\
+Measure the performance of the translator.
+Translate each task several times inside one Python process (after some
+warmup runs), record the CPU and wall-clock time of each run and translator
+phase with high-resolution clocks and the peak memory usage, and write the
+results and their medians over the runs to a JSON file. If a baseline file
+from a previous run is given, compare the median times against it and
+exit with a non-zero exit code if a task or phase became slower by more than
+the given threshold.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+from pathlib import Path
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from translator_tasks import get_task_name, get_tasks, TASK_HELP
+
+
+DIR = Path(__file__).resolve().parent
+REPO = DIR.parents[1]
+TRANSLATOR_DIR = REPO / "src" / "translate"
+
+sys.path.insert(0, str(REPO))
+from driver import util
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=HELP)
+    parser.add_argument(
+        "benchmarks_dir",
+        help="path to benchmark directory")
+    parser.add_argument(
+        "suite", nargs="*", default=["all"],
+        help='Use "all" to benchmark all tasks (default), '
+             '"first" to benchmark the first task of each domain, '
+             'or ' + TASK_HELP)
+    parser.add_argument(
+        "--warmup-runs", type=int, default=1,
+        help="translate each task this many times before measuring "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--runs-per-task", type=int, default=5,
+        help="measure this many translator runs per task and report the "
+             "median times (default: %(default)s)")
+    parser.add_argument(
+        "--translator-options", nargs=argparse.REMAINDER, default=[],
+        help="pass all remaining arguments to the translator")
+    parser.add_argument(
+        "--output", default="translator-benchmark.json",
+        help="write the results to this file (default: %(default)s)")
+    parser.add_argument(
+        "--baseline",
+        help="compare the results with this file written by a previous run")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="report a regression if a median time increases by more than "
+             "this fraction of the baseline time (default: %(default)s)")
+    parser.add_argument(
+        "--min-time", type=float, default=0.05,
+        help="ignore phases whose baseline and new median times are below "
+             "this many seconds, since they are dominated by noise "
+             "(default: %(default)s)")
+    # Used internally to run the translator in a fresh process per task.
+    parser.add_argument("--run-task", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.benchmarks_dir = Path(args.benchmarks_dir).resolve()
+    return args
+
+
+def _flatten_phases(phases, prefix=""):
+    """Map the nested phases of a profiling report to their times.
+    Phase names are prefixed with the names of their parent phases."""
+    times = {}
+    for phase in phases:
+        name = prefix + phase["name"]
+        # Some phases (e.g., "Simplifying axioms") can occur repeatedly.
+        cpu_time, wall_time = times.get(name, (0, 0))
+        times[name] = (cpu_time + phase["cpu_time"],
+                       wall_time + phase["wall_time"])
+        times.update(_flatten_phases(phase["phases"], name + "/"))
+    return times
+
+
+def _get_cpu_time():
+    # In contrast to os.times(), which only has a resolution of 10 ms on
+    # many systems, getrusage measures in microseconds, which matters
+    # for small tasks.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_task(domain_file, task_file, args):
+    """Translate the task repeatedly in this process and print the
+    measurements as JSON."""
+    sys.path.insert(0, str(TRANSLATOR_DIR))
+    # The translator parses its options when the options module is imported.
+    sys.argv = [str(TRANSLATOR_DIR / "translate.py"), domain_file, task_file,
+                "--sas-file", os.devnull] + args.translator_options
+    with contextlib.redirect_stdout(sys.stderr):
+        import timers
+        import tools
+        import translate
+    runs = []
+    for run in range(args.warmup_runs + args.runs_per_task):
+        profiler = timers.enable_profiling()
+        start_cpu_time = _get_cpu_time()
+        start_wall_time = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                translate.main()
+        cpu_time = _get_cpu_time() - start_cpu_time
+        wall_time = time.perf_counter() - start_wall_time
+        timers.disable_profiling()
+        if run >= args.warmup_runs:
+            report = profiler.get_report()
+            runs.append({
+                "cpu_time": cpu_time,
+                "wall_time": wall_time,
+                "phases": _flatten_phases(report["phases"]),
+                "counts": report["counts"],
+            })
+    try:
+        peak_memory = tools.get_peak_memory_in_kb()
+    except Warning:
+        peak_memory = None
+    print(json.dumps({"runs": runs, "peak_memory_kb": peak_memory}))
+
+
+def _get_medians(runs):
+    medians = {
+        "total": (statistics.median(run["cpu_time"] for run in runs),
+                  statistics.median(run["wall_time"] for run in runs))}
+    # Phases can be missing from some runs, e.g., if a cache makes them
+    # unnecessary. Such runs spend no time in the phase.
+    names = dict.fromkeys(itertools.chain.from_iterable(
+        run["phases"] for run in runs))
+    for name in names:
+        medians[name] = tuple(
+            statistics.median(run["phases"].get(name, (0, 0))[index]
+                              for run in runs)
+            for index in range(2))
+    return medians
+
+
+def benchmark_task(task_file, args):
+    domain_file = util.find_domain_filename(str(task_file))
+    cmd = [sys.executable, __file__, str(args.benchmarks_dir),
+           "--run-task", domain_file, str(task_file),
+           "--warmup-runs", str(args.warmup_runs),
+           "--runs-per-task", str(args.runs_per_task)]
+    if args.translator_options:
+        cmd += ["--translator-options"] + args.translator_options
+    try:
+        output = subprocess.check_output(
+            cmd, stderr=subprocess.DEVNULL, encoding="utf-8")
+    except subprocess.CalledProcessError as err:
+        sys.exit(f"Error: translating {task_file} failed "
+                 f"with exit code {err.returncode}")
+    result = json.loads(output)
+    result["median_times"] = _get_medians(result["runs"])
+    return result
+
+
+def compare(results, baseline, threshold, min_time):
+    """Print the changes of the median CPU times and return the number
+    of regressions."""
+    num_regressions = 0
+    for task, result in sorted(results.items()):
+        if task not in baseline:
+            print(f"{task}: not in baseline")
+            continue
+        old_times = baseline[task]["median_times"]
+        for phase, (cpu_time, _) in result["median_times"].items():
+            if phase not in old_times:
+                continue
+            old_cpu_time = old_times[phase][0]
+            if max(cpu_time, old_cpu_time) < min_time:
+                continue
+            change = (cpu_time - old_cpu_time) / max(old_cpu_time, 1e-9)
+            is_regression = change > threshold
+            num_regressions += is_regression
+            print(f"{task} {phase}: {old_cpu_time:.3f}s -> {cpu_time:.3f}s "
+                  f"({change:+.1%}){' REGRESSION' if is_regression else ''}")
+    return num_regressions
+
+
+def main():
+    args = parse_args()
+    if args.run_task:
+        run_task(*args.run_task, args)
+        return
+    results = {}
+    for task_file in get_tasks(args.benchmarks_dir, args.suite):
+        name = get_task_name(task_file)
+        print(f"Benchmark {name}", flush=True)
+        result = benchmark_task(task_file, args)
+        cpu_time, wall_time = result["median_times"]["total"]
+        print(f"Median time: {cpu_time:.3f}s CPU, {wall_time:.3f}s wall-clock, "
+              f"peak memory: {result['peak_memory_kb']} KB", flush=True)
+        results[name] = result
+    with open(args.output, "w") as output_file:
+        json.dump({
+            "version": RESULTS_FORMAT_VERSION,
+            "python": platform.python_version(),
+            "translator_options": args.translator_options,
+            "tasks": results}, output_file, indent=2)
+        output_file.write("\n")
+    print(f"Wrote results to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("version") != RESULTS_FORMAT_VERSION:
+            sys.exit("Error: baseline file has an unsupported format")
+        num_regressions = compare(
+            results, baseline["tasks"], args.threshold, args.min_time)
+        if num_regressions:
+            sys.exit(f"Error: {num_regressions} regressions")
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
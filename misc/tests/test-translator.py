@@ -9,14 +9,14 @@ different runs might lead to the same nondeterministic results.
 """
 
 import argparse
-from collections import defaultdict
-import itertools
 import os
 from pathlib import Path
 import re
 import subprocess
 import sys
 
+from translator_tasks import get_task_name, get_tasks, TASK_HELP
+
 
 DIR = Path(__file__).resolve().parent
 REPO = DIR.parents[1]
@@ -32,7 +32,7 @@ def parse_args():
         "suite", nargs="*", default=["first"],
         help='Use "all" to test all benchmarks, '
              '"first" to test the first task of each domain (default), '
-             'or "<domain>:<problem>" to test individual tasks')
+             'or ' + TASK_HELP)
     parser.add_argument(
         "--runs-per-task",
         help="translate each task this many times and compare the outputs",
@@ -42,10 +42,6 @@ def parse_args():
     return args
 
 
-def get_task_name(path):
-    return "-".join(str(path).split("/")[-2:])
-
-
 def translate_task(task_file):
     print(f"Translate {get_task_name(task_file)}", flush=True)
     sys.stdout.flush()
@@ -59,53 +55,23 @@ def translate_task(task_file):
             r"\[(.+s CPU, .+s wall-clock)\]",
             r"(\d+) KB",
             r"Planner time: (.+s)",
+            r"wall-clock time: (.+)",
             ]:
         output = re.sub(pattern, "XXX", output)
     return output
 
 
-def _get_all_tasks_by_domain(benchmarks_dir):
-    # Ignore domains where translating the first task takes too much time or memory.
-    # We also ignore citycar, which indeed reveals some nondeterminism in the
-    # invariant synthesis. Fixing it would require to sort the actions which
-    # seems to be detrimental on some other domains.
-    blacklisted_domains = [
-        "agricola-sat18-strips",
-        "citycar-opt14-adl",  # cf. issue879
-        "citycar-sat14-adl",  # cf. issue879
-        "organic-synthesis-sat18-strips",
-        "organic-synthesis-split-opt18-strips",
-        "organic-synthesis-split-sat18-strips"]
-    benchmarks_dir = Path(benchmarks_dir)
-    tasks = defaultdict(list)
-    domains = [
-        domain_dir for domain_dir in benchmarks_dir.iterdir()
-        if domain_dir.is_dir() and
-        not str(domain_dir.name).startswith((".", "_", "unofficial")) and
-        str(domain_dir.name) not in blacklisted_domains]
-    for domain in domains:
-        path = benchmarks_dir / domain
-        tasks[domain] = [
-            benchmarks_dir / domain / f
-            for f in sorted(path.iterdir()) if "domain" not in str(f)]
-    return sorted(tasks.values())
-
-
-def get_tasks(args):
-    suite = []
-    for task in args.suite:
-        if task == "first":
-            # Add the first task of each domain.
-            suite.extend([tasks[0] for tasks in _get_all_tasks_by_domain(args.benchmarks_dir)])
-        elif task == "all":
-            # Add the whole benchmark suite.
-            suite.extend(itertools.chain.from_iterable(
-                    tasks for tasks in _get_all_tasks_by_domain(args.benchmarks_dir)))
-        else:
-            # Add task from command line.
-            task = task.replace(":", "/")
-            suite.append(args.benchmarks_dir / task)
-    return sorted(set(suite))
+# Ignore domains where translating the first task takes too much time or memory.
+# We also ignore citycar, which indeed reveals some nondeterminism in the
+# invariant synthesis. Fixing it would require to sort the actions which
+# seems to be detrimental on some other domains.
+IGNORED_DOMAINS = [
+    "agricola-sat18-strips",
+    "citycar-opt14-adl",  # cf. issue879
+    "citycar-sat14-adl",  # cf. issue879
+    "organic-synthesis-sat18-strips",
+    "organic-synthesis-split-opt18-strips",
+    "organic-synthesis-split-sat18-strips"]
 
 
 def cleanup():
@@ -125,7 +91,7 @@ def main():
     args = parse_args()
     os.chdir(DIR)
     cleanup()
-    for task in get_tasks(args):
+    for task in get_tasks(args.benchmarks_dir, args.suite, IGNORED_DOMAINS):
         base_file = "translator-output-0.txt"
         write_combined_output(base_file, task)
         for i in range(1, args.runs_per_task):
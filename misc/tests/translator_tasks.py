@@ -0,0 +1,47 @@
+"""Select the tasks of a benchmark directory for translator tests and
+benchmarks.
+
+A suite consists of "all" (all tasks), "first" (the first task of each
+domain) and individual tasks given as "<domain>:<problem>" or
+"<domain>/<problem>", for example "gripper:prob01.pddl".
+"""
+
+import itertools
+from pathlib import Path
+
+
+TASK_HELP = '"<domain>:<problem>" to select individual tasks'
+
+
+def get_task_name(path):
+    return "-".join(str(path).split("/")[-2:])
+
+
+def get_all_tasks_by_domain(benchmarks_dir, ignored_domains=()):
+    """Return a list with the sorted problem files of each domain."""
+    tasks = []
+    for domain_dir in sorted(Path(benchmarks_dir).iterdir()):
+        if (domain_dir.is_dir() and
+                not domain_dir.name.startswith((".", "_", "unofficial")) and
+                domain_dir.name not in ignored_domains):
+            tasks.append([
+                path for path in sorted(domain_dir.iterdir())
+                if "domain" not in path.name])
+    return [domain_tasks for domain_tasks in tasks if domain_tasks]
+
+
+def get_tasks(benchmarks_dir, suite, ignored_domains=()):
+    tasks = []
+    for task in suite:
+        if task == "first":
+            # Add the first task of each domain.
+            tasks.extend(domain_tasks[0] for domain_tasks in
+                         get_all_tasks_by_domain(benchmarks_dir, ignored_domains))
+        elif task == "all":
+            # Add the whole benchmark suite.
+            tasks.extend(itertools.chain.from_iterable(
+                get_all_tasks_by_domain(benchmarks_dir, ignored_domains)))
+        else:
+            # Add task from command line.
+            tasks.append(Path(benchmarks_dir) / task.replace(":", "/"))
+    return sorted(set(tasks))
@@ -46,6 +46,7 @@ static shared_ptr<SearchEngine> parse_cmd_line_aux(
     string plan_filename = "sas_plan";
     int num_previously_generated_plans = 0;
     bool is_part_of_anytime_portfolio = false;
+    string bound_filename;
     options::Predefinitions predefinitions;
 
     shared_ptr<SearchEngine> engine;
@@ -105,6 +106,11 @@ static shared_ptr<SearchEngine> parse_cmd_line_aux(
             num_previously_generated_plans = parse_int_arg(arg, args[i]);
             if (num_previously_generated_plans < 0)
                 throw ArgError("argument for --internal-previous-portfolio-plans must be positive");
+        } else if (arg == "--internal-bound-file") {
+            if (is_last)
+                throw ArgError("missing argument after --internal-bound-file");
+            ++i;
+            bound_filename = args[i];
         } else if (utils::startswith(arg, "--") &&
                    registry.is_predefinition(arg.substr(2))) {
             if (is_last)
@@ -123,6 +129,7 @@ static shared_ptr<SearchEngine> parse_cmd_line_aux(
         plan_manager.set_plan_filename(plan_filename);
         plan_manager.set_num_previously_generated_plans(num_previously_generated_plans);
         plan_manager.set_is_part_of_anytime_portfolio(is_part_of_anytime_portfolio);
+        engine->set_bound_filename(bound_filename);
     }
     return engine;
 }
@@ -171,5 +178,9 @@ string usage(const string &progname) {
            "    This planner call is part of a portfolio which already created\n"
            "    plan files FILENAME.1 up to FILENAME.COUNTER.\n"
            "    Start enumerating plan files with COUNTER+1, i.e. FILENAME.COUNTER+1\n\n"
+           "--internal-bound-file FILENAME\n"
+           "    This planner call is part of a portfolio that runs several planner\n"
+           "    calls in parallel. Whenever another call finds a cheaper plan, the\n"
+           "    file FILENAME contains its cost, which is then used as the bound.\n\n"
            "See https://www.fast-downward.org for details.";
 }
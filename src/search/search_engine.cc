@@ -15,12 +15,16 @@
 #include "utils/timer.h"
 
 #include <cassert>
+#include <fstream>
 #include <iostream>
 #include <limits>
 
 using namespace std;
 using utils::ExitCode;
 
+// Seconds between reading the bound file (see update_bound_from_file).
+static const double BOUND_FILE_CHECK_INTERVAL = 1.0;
+
 class PruningMethod;
 
 successor_generator::SuccessorGenerator &get_successor_generator(
@@ -83,10 +87,31 @@ void SearchEngine::set_plan(const Plan &p) {
     plan = p;
 }
 
+void SearchEngine::update_bound_from_file() {
+    /*
+      The driver atomically replaces the bound file whenever a concurrent
+      run of a portfolio finds a cheaper plan. We only use the bound if it
+      is tighter than the current one.
+    */
+    ifstream bound_file(bound_filename);
+    int new_bound;
+    if (bound_file >> new_bound && new_bound >= 0 && new_bound < bound) {
+        log << "New cost bound from " << bound_filename << ": "
+            << new_bound << endl;
+        bound = new_bound;
+    }
+}
+
 void SearchEngine::search() {
     initialize();
     utils::CountdownTimer timer(max_time);
+    utils::Timer bound_file_timer;
+    double next_bound_file_check = 0;
     while (status == IN_PROGRESS) {
+        if (!bound_filename.empty() && bound_file_timer() >= next_bound_file_check) {
+            update_bound_from_file();
+            next_bound_file_check = bound_file_timer() + BOUND_FILE_CHECK_INTERVAL;
+        }
         status = step();
         if (timer.is_expired()) {
             log << "Time limit reached. Abort search." << endl;
@@ -12,6 +12,7 @@
 
 #include "utils/logging.h"
 
+#include <string>
 #include <vector>
 
 namespace options {
@@ -48,6 +49,8 @@ protected:
     SearchProgress search_progress;
     SearchStatistics statistics;
     int bound;
+    // File from which a concurrent portfolio run may tighten the bound.
+    std::string bound_filename;
     OperatorCost cost_type;
     bool is_unit_cost;
     double max_time;
@@ -56,6 +59,7 @@ protected:
     virtual SearchStatus step() = 0;
 
     void set_plan(const Plan &plan);
+    void update_bound_from_file();
     bool check_goal_and_set_plan(const State &state);
     int get_adjusted_cost(const OperatorProxy &op) const;
 public:
@@ -70,6 +74,7 @@ public:
     const SearchStatistics &get_statistics() const {return statistics;}
     void set_bound(int b) {bound = b;}
     int get_bound() {return bound;}
+    void set_bound_filename(const std::string &filename) {bound_filename = filename;}
     PlanManager &get_plan_manager() {return plan_manager;}
 
     /* The following three methods should become functions as they
@@ -5,6 +5,7 @@
 
 #include "../utils/logging.h"
 
+#include <algorithm>
 #include <iostream>
 
 using namespace std;
@@ -63,8 +64,10 @@ SearchStatus IteratedSearch::step() {
     if (!current_search) {
         return found_solution() ? SOLVED : FAILED;
     }
+    current_search->set_bound_filename(bound_filename);
     if (pass_bound) {
-        current_search->set_bound(best_bound);
+        // The bound may have been tightened from the bound file.
+        current_search->set_bound(min(best_bound, bound));
     }
     ++phase;
 
@@ -1,14 +1,47 @@
 #! /usr/bin/env python3
 
 
-import sys
 import itertools
+import operator
+import os
+import pickle
+import tempfile
 
 import pddl
 import timers
 from functools import reduce
 
-def convert_rules(prog):
+class SymbolTable:
+    """Bidirectional mapping between symbols and small integers.
+
+    During model computation, predicates (which can be strings or
+    pddl.Action and pddl.Axiom objects) and objects are represented by
+    their integer IDs, and atoms are represented by flat tuples of the
+    form (predicate_id, arg_id_1, ..., arg_id_k). This makes hashing
+    cheap and avoids building pddl.Atom objects for every derived atom.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.symbols = []
+    def __len__(self):
+        return len(self.symbols)
+    def intern(self, symbol):
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+    def encode_atom(self, atom):
+        intern = self.intern
+        return (intern(atom.predicate),) + tuple(
+            [intern(arg) for arg in atom.args])
+    def decode_atom(self, encoded_atom):
+        symbols = self.symbols
+        return pddl.Atom(symbols[encoded_atom[0]],
+                         [symbols[arg] for arg in encoded_atom[1:]])
+
+def convert_rules(prog, symbols):
     RULE_TYPES = {
         "join": JoinRule,
         "product": ProductRule,
@@ -19,7 +52,7 @@ def convert_rules(prog):
         RuleType = RULE_TYPES[rule.type]
         new_effect, new_conditions = variables_to_numbers(
             rule.effect, rule.conditions)
-        rule = RuleType(new_effect, new_conditions)
+        rule = RuleType(new_effect, new_conditions, symbols)
         rule.validate()
         result.append(rule)
     return result
@@ -39,7 +72,8 @@ def variables_to_numbers(effect, conditions):
     #    effect, as indicated by the rename_map.
     # 2. They are constants. In that case, the unifier must guarantee
     #    that they are matched appropriately. In that case, they are
-    #    not modified (remain strings denoting objects).
+    #    not modified (remain strings denoting objects; the rules and
+    #    the unifier look up their symbol IDs).
     # 3. They are variables that don't occur in the effect (are
     #    projected away). This is only allowed in projection rules.
     #    Such arguments are also not modified (remain "?x" strings).
@@ -51,30 +85,62 @@ def variables_to_numbers(effect, conditions):
     return new_effect, new_conditions
 
 class BuildRule:
-    def prepare_effect(self, new_atom, cond_index):
-        effect_args = list(self.effect.args)
-        cond = self.conditions[cond_index]
-        for var_no, obj in zip(cond.args, new_atom.args):
-            if isinstance(var_no, int):
-                effect_args[var_no] = obj
-        return effect_args
+    def __init__(self, effect, conditions, symbols):
+        self.effect = effect
+        self.conditions = conditions
+        self.effect_predicate = symbols.intern(effect.predicate)
+        # The predicate and the encoded constant arguments of the effect.
+        self.effect_constants = (self.effect_predicate,) + tuple(
+            [symbols.intern(arg) for arg in effect.args
+             if not isinstance(arg, int)])
+    def get_effect_builder(self, cond_order):
+        """Return a function that maps the concatenation of
+        self.effect_constants and one encoded atom for each condition
+        in cond_order to the encoded effect atom."""
+        positions = {}
+        offset = len(self.effect_constants)
+        for cond_index in cond_order:
+            args = self.conditions[cond_index].args
+            for pos, arg in enumerate(args):
+                if isinstance(arg, int):
+                    positions.setdefault(arg, offset + pos + 1)
+            offset += len(args) + 1
+        indices = [0]
+        num_constants = 1
+        for arg in self.effect.args:
+            if isinstance(arg, int):
+                indices.append(positions[arg])
+            else:
+                indices.append(num_constants)
+                num_constants += 1
+        if len(indices) == 1:
+            return lambda values: values[:1]
+        return operator.itemgetter(*indices)
     def __str__(self):
         return "%s :- %s" % (self.effect, ", ".join(map(str, self.conditions)))
     def __repr__(self):
         return "<%s %s>" % (self.__class__.__name__, self)
 
 class JoinRule(BuildRule):
-    def __init__(self, effect, conditions):
-        self.effect = effect
-        self.conditions = conditions
+    def __init__(self, effect, conditions, symbols):
+        super().__init__(effect, conditions, symbols)
         left_args = conditions[0].args
         right_args = conditions[1].args
         left_vars = {var for var in left_args if isinstance(var, int)}
         right_vars = {var for var in right_args if isinstance(var, int)}
         common_vars = sorted(left_vars & right_vars)
-        self.common_var_positions = [
-            [args.index(var) for var in common_vars]
-            for args in (list(left_args), list(right_args))]
+        # Positions refer to the encoded atom tuples (see SymbolTable).
+        # The keys of atoms_by_key are the values of the common
+        # variables (a single value if there is only one of them).
+        if common_vars:
+            self.get_keys = [
+                operator.itemgetter(
+                    *[args.index(var) + 1 for var in common_vars])
+                for args in (list(left_args), list(right_args))]
+        else:
+            self.get_keys = [lambda atom: ()] * 2
+        self.effect_builders = [self.get_effect_builder([0, 1]),
+                                self.get_effect_builder([1, 0])]
         self.atoms_by_key = ({}, {})
     def validate(self):
         assert len(self.conditions) == 2, self
@@ -90,31 +156,60 @@ class JoinRule(BuildRule):
         assert left_vars & right_vars, self
         assert (left_vars | right_vars) == (left_vars & right_vars) | eff_vars, self
     def update_index(self, new_atom, cond_index):
-        ordered_common_args = [
-            new_atom.args[position]
-            for position in self.common_var_positions[cond_index]]
-        key = tuple(ordered_common_args)
+        key = self.get_keys[cond_index](new_atom)
         self.atoms_by_key[cond_index].setdefault(key, []).append(new_atom)
     def fire(self, new_atom, cond_index, enqueue_func):
-        effect_args = self.prepare_effect(new_atom, cond_index)
-        ordered_common_args = [
-            new_atom.args[position]
-            for position in self.common_var_positions[cond_index]]
-        key = tuple(ordered_common_args)
-        other_cond_index = 1 - cond_index
-        other_cond = self.conditions[other_cond_index]
-        for atom in self.atoms_by_key[other_cond_index].get(key, []):
-            for var_no, obj in zip(other_cond.args, atom.args):
-                if isinstance(var_no, int):
-                    effect_args[var_no] = obj
-            enqueue_func(self.effect.predicate, effect_args)
+        key = self.get_keys[cond_index](new_atom)
+        partners = self.atoms_by_key[1 - cond_index].get(key)
+        if partners:
+            prefix = self.effect_constants + new_atom
+            build = self.effect_builders[cond_index]
+            enqueue_func([build(prefix + partner) for partner in partners])
+    def fire_delta(self, deltas, enqueue_func):
+        # Semi-naive join of the atoms that are new in this round:
+        # (old_0 + delta_0) x delta_1  +  delta_0 x old_1.
+        left_delta, right_delta = deltas
+        for atom in left_delta:
+            self.update_index(atom, 0)
+        self._join_delta(right_delta, 1, enqueue_func)
+        self._join_delta(left_delta, 0, enqueue_func)
+        for atom in right_delta:
+            self.update_index(atom, 1)
+    def _join_delta(self, delta, cond_index, enqueue_func):
+        if not delta:
+            return
+        get_key = self.get_keys[cond_index]
+        delta_by_key = {}
+        for atom in delta:
+            delta_by_key.setdefault(get_key(atom), []).append(atom)
+        other_index = self.atoms_by_key[1 - cond_index]
+        constants = self.effect_constants
+        build = self.effect_builders[cond_index]
+        for key, atoms in delta_by_key.items():
+            partners = other_index.get(key)
+            if partners:
+                prefixes = [constants + atom for atom in atoms]
+                enqueue_func([build(prefix + partner)
+                              for prefix in prefixes for partner in partners])
 
 class ProductRule(BuildRule):
-    def __init__(self, effect, conditions):
-        self.effect = effect
-        self.conditions = conditions
+    def __init__(self, effect, conditions, symbols):
+        super().__init__(effect, conditions, symbols)
+        # The atoms of each condition. These lists are the factors of
+        # the products and grow incrementally.
         self.atoms_by_index = [[] for c in self.conditions]
         self.empty_atom_list_no = len(self.conditions)
+        cond_indices = range(len(self.conditions))
+        self.other_atom_lists = [
+            [self.atoms_by_index[pos] for pos in cond_indices
+             if pos != cond_index]
+            for cond_index in cond_indices]
+        self.effect_builders = [
+            self.get_effect_builder(
+                [cond_index] + [pos for pos in cond_indices
+                                if pos != cond_index])
+            for cond_index in cond_indices]
+        self.delta_effect_builder = self.get_effect_builder(cond_indices)
     def validate(self):
         assert len(self.conditions) >= 2, self
         cond_vars = [{v for v in cond.args
@@ -131,199 +226,388 @@ class ProductRule(BuildRule):
             self.empty_atom_list_no -= 1
         atom_list.append(new_atom)
 
-    def _get_bindings(self, atom, cond):
-        return [(var_no, obj) for var_no, obj in zip(cond.args, atom.args)
-                if isinstance(var_no, int)]
-
     def fire(self, new_atom, cond_index, enqueue_func):
         if self.empty_atom_list_no:
             return
+        prefix = self.effect_constants + new_atom
+        build = self.effect_builders[cond_index]
+        factors = self.other_atom_lists[cond_index]
+        if len(factors) == 1:
+            enqueue_func([build(prefix + atom) for atom in factors[0]])
+        else:
+            enqueue_func([build(reduce(operator.add, atoms, prefix))
+                          for atoms in itertools.product(*factors)])
 
-        # Binding: a (var_no, object) pair
-        # Bindings: List-of(Binding)
-        # BindingsFactor: List-of(Bindings)
-        # BindingsFactors: List-of(BindingsFactor)
-        bindings_factors = []
-        for pos, cond in enumerate(self.conditions):
-            if pos == cond_index:
+    def fire_delta(self, deltas, enqueue_func):
+        # Semi-naive product: the new combinations are the union over
+        # all i of full_0 x ... x full_(i-1) x delta_i x old_(i+1) x ...
+        # We obtain this by processing the conditions in order and
+        # adding delta_i to the index right after using it.
+        constants = self.effect_constants
+        build = self.delta_effect_builder
+        for cond_index, delta in enumerate(deltas):
+            if not delta:
                 continue
-            atoms = self.atoms_by_index[pos]
-            assert atoms, "if we have no atoms, this should never be called"
-            factor = [self._get_bindings(atom, cond) for atom in atoms]
-            bindings_factors.append(factor)
-
-        eff_args = self.prepare_effect(new_atom, cond_index)
-
-        for bindings_list in itertools.product(*bindings_factors):
-            bindings = itertools.chain(*bindings_list)
-            for var_no, obj in bindings:
-                eff_args[var_no] = obj
-            enqueue_func(self.effect.predicate, eff_args)
+            for atom in delta:
+                self.update_index(atom, cond_index)
+            if self.empty_atom_list_no:
+                continue
+            factors = list(self.atoms_by_index)
+            factors[cond_index] = delta
+            enqueue_func([build(reduce(operator.add, atoms, constants))
+                          for atoms in itertools.product(*factors)])
 
 
 class ProjectRule(BuildRule):
-    def __init__(self, effect, conditions):
-        self.effect = effect
-        self.conditions = conditions
+    def __init__(self, effect, conditions, symbols):
+        super().__init__(effect, conditions, symbols)
+        self.effect_builder = self.get_effect_builder([0])
     def validate(self):
         assert len(self.conditions) == 1
     def update_index(self, new_atom, cond_index):
         pass
     def fire(self, new_atom, cond_index, enqueue_func):
-        effect_args = self.prepare_effect(new_atom, cond_index)
-        enqueue_func(self.effect.predicate, effect_args)
+        enqueue_func([self.effect_builder(self.effect_constants + new_atom)])
+    def fire_delta(self, deltas, enqueue_func):
+        constants = self.effect_constants
+        build = self.effect_builder
+        enqueue_func([build(constants + atom) for atom in deltas[0]])
 
 class Unifier:
-    def __init__(self, rules):
-        self.predicate_to_rule_generator = {}
+    """Map encoded atoms to the (rule, cond_index) pairs of the rule
+    conditions that they match.
+
+    For each predicate, we compile the conditions into a dispatch table
+    from the arguments at the positions where the conditions have
+    constants to the tuple of matches. Atoms of predicates without such
+    conditions all match the same conditions, so their matches are
+    looked up with a single dictionary access."""
+    def __init__(self, rules, symbols):
+        self.symbols = symbols
+        # Maps predicates to lists of pairs (constant_arguments, match).
+        self.conditions_by_predicate = {}
         for rule in rules:
-            for i, cond in enumerate(rule.conditions):
-                self._insert_condition(rule, i)
+            for cond_index, condition in enumerate(rule.conditions):
+                predicate = symbols.intern(condition.predicate)
+                # Argument indices refer to the encoded atom tuples.
+                constant_arguments = tuple(
+                    (arg_index + 1, symbols.intern(arg))
+                    for (arg_index, arg) in enumerate(condition.args)
+                    if not isinstance(arg, int) and arg[0] != "?")
+                self.conditions_by_predicate.setdefault(predicate, []).append(
+                    (constant_arguments, (rule, cond_index)))
+        self.unconstrained_matches = {}
+        self.dispatch_tables = {}
+        for predicate, conditions in self.conditions_by_predicate.items():
+            dispatch_table = _compile_dispatch_table(conditions)
+            if dispatch_table is None:
+                self.unconstrained_matches[predicate] = tuple(
+                    match for _, match in conditions)
+            else:
+                self.dispatch_tables[predicate] = dispatch_table
     def unify(self, atom):
-        result = []
-        generator = self.predicate_to_rule_generator.get(atom.predicate)
-        if generator:
-            generator.generate(atom, result)
-        return result
-    def _insert_condition(self, rule, cond_index):
-        condition = rule.conditions[cond_index]
-        root = self.predicate_to_rule_generator.get(condition.predicate)
-        if not root:
-            root = LeafGenerator()
-        constant_arguments = [
-            (arg_index, arg)
-            for (arg_index, arg) in enumerate(condition.args)
-            if not isinstance(arg, int) and arg[0] != "?"]
-        newroot = root._insert(constant_arguments, (rule, cond_index))
-        self.predicate_to_rule_generator[condition.predicate] = newroot
+        matches = self.unconstrained_matches.get(atom[0])
+        if matches is not None:
+            return matches
+        dispatch_table = self.dispatch_tables.get(atom[0])
+        if dispatch_table is None:
+            return ()
+        get_key, matches_by_key, groups, unconstrained = dispatch_table
+        key = get_key(atom)
+        matches = matches_by_key.get(key)
+        if matches is None:
+            if groups is None:
+                # The table contains all keys with constrained matches.
+                return unconstrained
+            matches = unconstrained + tuple(itertools.chain.from_iterable(
+                group_matches.get(get_group_key(atom), ())
+                for get_group_key, group_matches in groups))
+            matches_by_key[key] = matches
+        return matches
     def dump(self):
-        predicates = sorted(self.predicate_to_rule_generator)
+        symbols = self.symbols.symbols
+        predicates = sorted(self.conditions_by_predicate,
+                            key=lambda pred: str(symbols[pred]))
         print("Unifier:")
         for pred in predicates:
-            print("    %s:" % pred)
-            rule_gen = self.predicate_to_rule_generator[pred]
-            rule_gen.dump("    " * 2)
+            print("    %s:" % symbols[pred])
+            for constant_arguments, match in self.conditions_by_predicate[pred]:
+                constraints = ", ".join(
+                    "args[%s] == %s" % (arg_index - 1, symbols[arg])
+                    for arg_index, arg in constant_arguments)
+                print("%s%s%s" % ("    " * 2, match,
+                                  " if %s" % constraints if constraints else ""))
 
-class LeafGenerator:
-    index = sys.maxsize
-    def __init__(self):
-        self.matches = []
-    def empty(self):
-        return not self.matches
-    def generate(self, atom, result):
-        result += self.matches
-    def _insert(self, args, value):
-        if not args:
-            self.matches.append(value)
-            return self
-        else:
-            root = LeafGenerator()
-            root.matches.append(value)
-            for arg_index, arg in args[::-1]:
-                new_root = MatchGenerator(arg_index, LeafGenerator())
-                new_root.match_generator[arg] = root
-                root = new_root
-            root.matches = self.matches # can be swapped in C++
-            return root
-    def dump(self, indent):
-        for match in self.matches:
-            print("%s%s" % (indent, match))
-
-class MatchGenerator:
-    def __init__(self, index, next):
-        self.index = index
-        self.matches = []
-        self.match_generator = {}
-        self.next = next
-    def empty(self):
-        return False
-    def generate(self, atom, result):
-        result += self.matches
-        generator = self.match_generator.get(atom.args[self.index])
-        if generator:
-            generator.generate(atom, result)
-        self.next.generate(atom, result)
-    def _insert(self, args, value):
-        if not args:
-            self.matches.append(value)
-            return self
-        else:
-            arg_index, arg = args[0]
-            if self.index < arg_index:
-                self.next = self.next._insert(args, value)
-                return self
-            elif self.index > arg_index:
-                new_parent = MatchGenerator(arg_index, self)
-                new_branch = LeafGenerator()._insert(args[1:], value)
-                new_parent.match_generator[arg] = new_branch
-                return new_parent
-            else:
-                branch_generator = self.match_generator.get(arg)
-                if not branch_generator:
-                    branch_generator = LeafGenerator()
-                self.match_generator[arg] = branch_generator._insert(
-                    args[1:], value)
-                return self
-    def dump(self, indent):
-        for match in self.matches:
-            print("%s%s" % (indent, match))
-        for key in sorted(self.match_generator.keys()):
-            print("%sargs[%s] == %s:" % (indent, self.index, key))
-            self.match_generator[key].dump(indent + "    ")
-        if not self.next.empty():
-            assert isinstance(self.next, MatchGenerator)
-            print("%s[*]" % indent)
-            self.next.dump(indent + "    ")
+def _compile_dispatch_table(conditions):
+    """Return None if no condition has constant arguments. Otherwise,
+    return a tuple (get_key, matches_by_key, groups, unconstrained).
+    get_key maps an atom to its arguments at all positions where a
+    condition has a constant, and matches_by_key maps such keys to the
+    tuple of all matches. unconstrained holds the matches of the
+    conditions without constants.
+
+    If all constrained conditions have constants at the same positions,
+    matches_by_key is complete, i.e., atoms with other keys only match
+    the unconstrained conditions, and groups is None. Otherwise,
+    matches_by_key is filled lazily from the groups, a list of pairs
+    (get_group_key, matches_by_group_key) with one entry for each set
+    of positions with constants."""
+    unconstrained = tuple(
+        match for constant_arguments, match in conditions
+        if not constant_arguments)
+    # Maps position tuples to dicts from constant tuples to matches.
+    groups_by_positions = {}
+    for constant_arguments, match in conditions:
+        if constant_arguments:
+            positions, constants = zip(*constant_arguments)
+            groups_by_positions.setdefault(positions, {}).setdefault(
+                _get_key(constants), []).append(match)
+    if not groups_by_positions:
+        return None
+    all_positions = sorted(set(itertools.chain.from_iterable(
+        groups_by_positions)))
+    get_key = operator.itemgetter(*all_positions)
+    if len(groups_by_positions) == 1:
+        [group_matches] = groups_by_positions.values()
+        matches_by_key = {
+            key: unconstrained + tuple(matches)
+            for key, matches in group_matches.items()}
+        return get_key, matches_by_key, None, unconstrained
+    groups = [
+        (operator.itemgetter(*positions),
+         {key: tuple(matches) for key, matches in group_matches.items()})
+        for positions, group_matches in groups_by_positions.items()]
+    return get_key, {}, groups, unconstrained
+
+def _get_key(values):
+    # operator.itemgetter returns a single value instead of a tuple if
+    # it has only one position.
+    return values if len(values) > 1 else values[0]
 
 class Queue:
-    def __init__(self, atoms):
+    # The queue holds encoded atoms (see SymbolTable). The same tuple
+    # objects are stored in self.queue and self.enqueued. The first
+    # num_processed atoms count as already popped.
+    def __init__(self, atoms, num_processed=0):
         self.queue = atoms
-        self.queue_pos = 0
-        self.enqueued = {(atom.predicate,) + tuple(atom.args)
-                         for atom in self.queue}
+        self.queue_pos = num_processed
+        self.enqueued = set(self.queue)
         self.num_pushes = len(atoms)
     def __bool__(self):
         return self.queue_pos < len(self.queue)
     __nonzero__ = __bool__
-    def push(self, predicate, args):
-        self.num_pushes += 1
-        eff_tuple = (predicate,) + tuple(args)
-        if eff_tuple not in self.enqueued:
-            self.enqueued.add(eff_tuple)
-            self.queue.append(pddl.Atom(predicate, list(args)))
+    def push_all(self, atoms):
+        """Enqueue those of the given encoded atoms that have not been
+        enqueued before. The rules produce their effects in batches, so
+        we can filter them with one set operation."""
+        self.num_pushes += len(atoms)
+        new_atoms = set(atoms)
+        new_atoms -= self.enqueued
+        if new_atoms:
+            self.enqueued |= new_atoms
+            self.queue.extend(new_atoms)
     def pop(self):
         result = self.queue[self.queue_pos]
         self.queue_pos += 1
         return result
 
-def compute_model(prog):
+class DeltaQueue(Queue):
+    """Queue for semi-naive evaluation.
+
+    Atoms are handed out in rounds: pop_delta returns all atoms that
+    were pushed since the previous call. The model (self.queue)
+    contains the atoms in the order in which they were derived."""
+    def __init__(self, atoms, num_processed=0):
+        super().__init__(atoms, num_processed)
+        self.delta = atoms[num_processed:]
+    def __bool__(self):
+        return bool(self.delta)
+    __nonzero__ = __bool__
+    def push_all(self, atoms):
+        self.num_pushes += len(atoms)
+        new_atoms = set(atoms)
+        new_atoms -= self.enqueued
+        if new_atoms:
+            self.enqueued |= new_atoms
+            self.queue.extend(new_atoms)
+            self.delta.extend(new_atoms)
+    def pop_delta(self):
+        result = self.delta
+        self.delta = []
+        self.queue_pos = len(self.queue)
+        return result
+
+def compute_model(prog, evaluation="naive", snapshot=None):
+    """Compute the model of prog. If the model of prog extends the
+    model of the given ModelSnapshot, we only derive the new atoms."""
     with timers.timing("Preparing model"):
-        rules = convert_rules(prog)
-        unifier = Unifier(rules)
+        symbols = SymbolTable()
+        rules = convert_rules(prog, symbols)
+        unifier = Unifier(rules, symbols)
         # unifier.dump()
-        fact_atoms = sorted(fact.atom for fact in prog.facts)
-        queue = Queue(fact_atoms)
+        previous_model = None
+        if snapshot is not None:
+            previous_model = snapshot.get_previous_model(prog)
+        extends_snapshot = previous_model is not None
+        if not extends_snapshot:
+            previous_model = []
+        # The indices of the rules already contain all atoms of the
+        # previous model, and the rules have fired for them.
+        previous_atoms = [symbols.encode_atom(atom) for atom in previous_model]
+        for atom in previous_atoms:
+            for rule, cond_index in unifier.unify(atom):
+                rule.update_index(atom, cond_index)
+        known_atoms = set(previous_atoms)
+        fact_atoms = [symbols.encode_atom(atom) for atom in
+                      sorted(fact.atom for fact in prog.facts)]
+        fact_atoms = [atom for atom in fact_atoms if atom not in known_atoms]
+        if evaluation == "semi-naive":
+            queue = DeltaQueue(previous_atoms + fact_atoms, len(previous_atoms))
+        else:
+            assert evaluation == "naive", evaluation
+            queue = Queue(previous_atoms + fact_atoms, len(previous_atoms))
 
     print("Generated %d rules." % len(rules))
+    timers.add_count("rules", len(rules))
+    if snapshot is not None:
+        if extends_snapshot:
+            print("Extending the model snapshot with %d new facts." %
+                  len(fact_atoms))
+        else:
+            print("Model snapshot does not match, computing the model "
+                  "from scratch.")
     with timers.timing("Computing model"):
-        relevant_atoms = 0
-        auxiliary_atoms = 0
-        while queue:
-            next_atom = queue.pop()
-            pred = next_atom.predicate
-            if isinstance(pred, str) and "$" in pred:
-                auxiliary_atoms += 1
-            else:
-                relevant_atoms += 1
-            matches = unifier.unify(next_atom)
-            for rule, cond_index in matches:
-                rule.update_index(next_atom, cond_index)
-                rule.fire(next_atom, cond_index, queue.push)
-    print("%d relevant atoms" % relevant_atoms)
+        if evaluation == "semi-naive":
+            _compute_model_semi_naive(unifier, queue)
+        else:
+            _compute_model_naive(unifier, queue)
+    with timers.timing("Decoding model"):
+        model = previous_model + [
+            symbols.decode_atom(atom)
+            for atom in queue.queue[len(previous_atoms):]]
+    auxiliary_atoms = sum(1 for atom in model
+                          if isinstance(atom.predicate, str) and
+                          "$" in atom.predicate)
+    print("%d relevant atoms" % (len(model) - auxiliary_atoms))
     print("%d auxiliary atoms" % auxiliary_atoms)
     print("%d final queue length" % len(queue.queue))
     print("%d total queue pushes" % queue.num_pushes)
-    return queue.queue
+    timers.add_count("relevant atoms", len(model) - auxiliary_atoms)
+    timers.add_count("auxiliary atoms", auxiliary_atoms)
+    timers.add_count("queue pushes", queue.num_pushes)
+    return model
+
+class ModelSnapshot:
+    """The rules, facts and model of a Datalog program.
+
+    If a later program has the same rules and a superset of the facts,
+    its model is a superset of the snapshot model, so compute_model can
+    extend the snapshot model instead of starting from scratch. This is
+    the case if a planning task only gains initial facts or objects or
+    only changes its goal, which does not occur in the program.
+
+    Predicates that are pddl.Action or pddl.Axiom objects are replaced
+    by their index in the order in which they occur in the rules, so
+    that snapshots can be pickled and compared across translator runs.
+    """
+    def __init__(self, prog, model):
+        placeholders = _get_predicate_placeholders(prog)
+        self.rules = _get_portable_rules(prog, placeholders)
+        self.facts = {_get_portable_atom(fact.atom, placeholders)
+                      for fact in prog.facts}
+        self.model = [_get_portable_atom(atom, placeholders)
+                      for atom in model]
+
+    def get_previous_model(self, prog):
+        """Return the snapshot model in terms of the predicates of prog
+        if the model of prog extends it and None otherwise."""
+        placeholders = _get_predicate_placeholders(prog)
+        if self.rules != _get_portable_rules(prog, placeholders):
+            return None
+        facts = {_get_portable_atom(fact.atom, placeholders)
+                 for fact in prog.facts}
+        if not self.facts <= facts:
+            return None
+        predicates = list(placeholders)
+        return [pddl.Atom(predicate if isinstance(predicate, str)
+                          else predicates[predicate], args)
+                for predicate, args in self.model]
+
+    def save(self, filename):
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(handle, "wb") as snapshot_file:
+                pickle.dump(self, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+def load_model_snapshot(filename):
+    """Return the ModelSnapshot stored in the given file or None if
+    there is no valid snapshot."""
+    try:
+        with open(filename, "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print("Ignoring invalid model snapshot %s: %s" % (filename, e))
+        return None
+    if not isinstance(snapshot, ModelSnapshot):
+        print("Ignoring invalid model snapshot %s" % filename)
+        return None
+    return snapshot
+
+def _get_predicate_placeholders(prog):
+    placeholders = {}
+    for rule in prog.rules:
+        for atom in [rule.effect] + rule.conditions:
+            if not isinstance(atom.predicate, str):
+                placeholders.setdefault(atom.predicate, len(placeholders))
+    return placeholders
+
+def _get_portable_atom(atom, placeholders):
+    predicate = atom.predicate
+    if not isinstance(predicate, str):
+        predicate = placeholders[predicate]
+    return (predicate, tuple(atom.args))
+
+def _get_portable_rules(prog, placeholders):
+    return [(rule.type, _get_portable_atom(rule.effect, placeholders),
+             [_get_portable_atom(cond, placeholders)
+              for cond in rule.conditions])
+            for rule in prog.rules]
+
+def _compute_model_naive(unifier, queue):
+    # We collect the effects of all rules that fire for an atom and
+    # push them at once.
+    while queue:
+        next_atom = queue.pop()
+        effects = []
+        for rule, cond_index in unifier.unify(next_atom):
+            rule.update_index(next_atom, cond_index)
+            rule.fire(next_atom, cond_index, effects.extend)
+        if effects:
+            queue.push_all(effects)
+
+def _compute_model_semi_naive(unifier, queue):
+    # Each round collects the new atoms per (rule, condition) and lets
+    # every rule join its deltas against the atoms of earlier rounds.
+    # Rules are processed in the order in which the unifier reports them
+    # first, which keeps the model order deterministic.
+    while queue:
+        deltas_by_rule = {}
+        for atom in queue.pop_delta():
+            for rule, cond_index in unifier.unify(atom):
+                deltas = deltas_by_rule.get(rule)
+                if deltas is None:
+                    deltas = [[] for _ in rule.conditions]
+                    deltas_by_rule[rule] = deltas
+                deltas[cond_index].append(atom)
+        for rule, deltas in deltas_by_rule.items():
+            rule.fire_delta(deltas, queue.push_all)
 
 if __name__ == "__main__":
     import pddl_parser
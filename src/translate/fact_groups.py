@@ -1,13 +1,53 @@
+from collections import defaultdict
+
 import invariant_finder
 import options
-import pddl
 import timers
 
 
 DEBUG = False
 
 
-def expand_group(group, task, reachable_facts):
+class ReachableFactIndex:
+    """Index of the reachable facts by predicate, the position of the
+    "?X" placeholder of a group fact and the remaining arguments.
+
+    The index for a (predicate, position) pair is built when it is
+    first needed. Each index entry lists the matching facts in the
+    order of their objects in task.objects. Like trying all objects of
+    task.objects, a fact is listed once for each occurrence of its
+    object in task.objects."""
+    def __init__(self, task, reachable_facts):
+        self.object_positions = defaultdict(list)
+        for index, obj in enumerate(task.objects):
+            self.object_positions[obj.name].append(index)
+        self.facts_by_predicate = defaultdict(list)
+        for fact in reachable_facts:
+            self.facts_by_predicate[fact.predicate].append(fact)
+        self.indices = {}
+
+    def get_matches(self, fact, pos):
+        """Return the reachable facts that equal fact except for an
+        object from task.objects at position pos."""
+        index = self.indices.get((fact.predicate, pos))
+        if index is None:
+            index = self._build_index(fact.predicate, pos)
+        return index.get(fact.args[:pos] + fact.args[pos + 1:], [])
+
+    def _build_index(self, predicate, pos):
+        entries = defaultdict(list)
+        for fact in self.facts_by_predicate[predicate]:
+            positions = self.object_positions.get(fact.args[pos])
+            if positions:
+                key = fact.args[:pos] + fact.args[pos + 1:]
+                entries[key].extend((index, fact) for index in positions)
+        index = {key: [fact for _, fact in sorted(facts)]
+                 for key, facts in entries.items()}
+        self.indices[predicate, pos] = index
+        return index
+
+
+def expand_group(group, fact_index):
     result = []
     for fact in group:
         try:
@@ -15,20 +55,12 @@ def expand_group(group, task, reachable_facts):
         except ValueError:
             result.append(fact)
         else:
-            # NOTE: This could be optimized by only trying objects of the correct
-            #       type, or by using a unifier which directly generates the
-            #       applicable objects. It is not worth optimizing this at this stage,
-            #       though.
-            for obj in task.objects:
-                newargs = list(fact.args)
-                newargs[pos] = obj.name
-                atom = pddl.Atom(fact.predicate, newargs)
-                if atom in reachable_facts:
-                    result.append(atom)
+            result += fact_index.get_matches(fact, pos)
     return result
 
 def instantiate_groups(groups, task, reachable_facts):
-    return [expand_group(group, task, reachable_facts) for group in groups]
+    fact_index = ReachableFactIndex(task, reachable_facts)
+    return [expand_group(group, fact_index) for group in groups]
 
 class GroupCoverQueue:
     def __init__(self, groups):
@@ -6,6 +6,7 @@ from collections import defaultdict
 import build_model
 import pddl_to_prolog
 import pddl
+import relevance_analysis
 import timers
 
 def get_fluent_facts(task, model):
@@ -102,9 +103,21 @@ def instantiate(task, model):
             sorted(instantiated_axioms), reachable_action_parameters)
 
 
-def explore(task):
+def explore(task, datalog_evaluation="naive", model_snapshot_file=None,
+            relevance_pruning=False):
     prog = pddl_to_prolog.translate(task)
-    model = build_model.compute_model(prog)
+    snapshot = None
+    if model_snapshot_file:
+        snapshot = build_model.load_model_snapshot(model_snapshot_file)
+    model = build_model.compute_model(prog, datalog_evaluation, snapshot)
+    if model_snapshot_file:
+        with timers.timing("Saving model snapshot"):
+            build_model.ModelSnapshot(prog, model).save(model_snapshot_file)
+    if relevance_pruning:
+        with timers.timing("Pruning irrelevant action and axiom instances",
+                           block=True):
+            model = relevance_analysis.prune_irrelevant_instances(
+                task, model, get_objects_by_type(task.objects, task.types))
     with timers.timing("Completing instantiation"):
         return instantiate(task, model)
 
@@ -0,0 +1,148 @@
+"""Domain-level cache for the results of invariant balance checks.
+
+Whether a candidate invariant is balanced only depends on the action
+schemas of the normalized domain and on the inequality preconditions
+that invariant_finder.BalanceChecker adds based on the reachable
+action parameters of the instance. Such preconditions can only make
+more candidates balanced.
+
+We therefore store the result of a balance check (is the candidate
+balanced, and which refined candidates did the check generate) in a
+file per normalized domain whenever no action that threatens the
+candidate has instance-dependent inequality preconditions. Such
+results hold for every instance of the domain. When checking a
+candidate, a cached result can be reused if it says that the
+candidate is balanced, or if the candidate is threatened by the same
+actions as in the domain. All other candidates are checked as usual,
+so instance-specific information only strengthens the cached results.
+
+An unreadable or corrupt cache file is ignored. When saving, we merge
+our results with those that concurrent translator runs have saved in
+the meantime. Results that another run saves between our merge and our
+atomic replace of the file are lost, which only means that they are
+computed again later.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import invariants
+
+CACHE_FORMAT_VERSION = 1
+
+# The results depend on the code of these modules.
+_SOURCE_MODULES = ["constraints.py", "invariant_finder.py", "invariants.py",
+                   "invariant_cache.py"]
+
+
+def get_domain_key(task):
+    """Return a hash of everything in the normalized task that
+    influences the balance checks: the predicates and the actions."""
+    hasher = hashlib.sha256()
+    hasher.update(("version %d\n" % CACHE_FORMAT_VERSION).encode())
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in _SOURCE_MODULES:
+        with open(os.path.join(source_dir, module), "rb") as source_file:
+            hasher.update(source_file.read())
+    schema = io.StringIO()
+    with contextlib.redirect_stdout(schema):
+        for predicate in task.predicates:
+            print(predicate)
+        for action in task.actions:
+            action.dump()
+    hasher.update(schema.getvalue().encode())
+    return hasher.hexdigest()
+
+
+def _encode_invariant(invariant):
+    return sorted([part.predicate, list(part.order), part.omitted_pos]
+                  for part in invariant.parts)
+
+
+def _decode_invariant(encoded_parts):
+    return invariants.Invariant(
+        [invariants.InvariantPart(predicate, order, omitted_pos)
+         for predicate, order, omitted_pos in encoded_parts])
+
+
+class InvariantCache:
+    def __init__(self, directory, task):
+        self.filename = os.path.join(
+            directory, "%s.json" % get_domain_key(task))
+        self.directory = directory
+        # Maps candidates to pairs (is_balanced, refined_candidates).
+        self.results = self._load()
+        self.num_new_results = 0
+        self.num_hits = 0
+        print("%d cached balance check results" % len(self.results))
+
+    def _load(self):
+        """Return the results stored in the cache file. A broken cache
+        is never fatal: we then start with an empty cache."""
+        try:
+            with open(self.filename) as cache_file:
+                entries = json.load(cache_file)
+            if not isinstance(entries, list):
+                raise ValueError("expected a list of results")
+            return {
+                _decode_invariant(candidate): (
+                    is_balanced,
+                    [_decode_invariant(refined)
+                     for refined in refined_candidates])
+                for candidate, is_balanced, refined_candidates in entries}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as err:
+            print("Warning! Ignoring unreadable invariant cache %s: %s" % (
+                self.filename, err))
+            return {}
+
+    def lookup(self, candidate, balance_checker):
+        """Return the cached pair (is_balanced, refined_candidates) if
+        it holds for the current instance and None otherwise."""
+        result = self.results.get(candidate)
+        if result is not None and (
+                result[0] or
+                balance_checker.is_instance_independent(candidate)):
+            self.num_hits += 1
+            return result
+        return None
+
+    def add(self, candidate, balance_checker, is_balanced, refined_candidates):
+        if (candidate not in self.results and
+                balance_checker.is_instance_independent(candidate)):
+            self.results[candidate] = (is_balanced, refined_candidates)
+            self.num_new_results += 1
+
+    def save(self):
+        print("%d balance check results reused, %d added to the cache" % (
+            self.num_hits, self.num_new_results))
+        if not self.num_new_results:
+            return
+        # Keep the results that other runs have saved since we loaded
+        # the cache. All stored results hold for every instance, so it
+        # does not matter which run a result comes from.
+        for candidate, result in self._load().items():
+            self.results.setdefault(candidate, result)
+        entries = [
+            [_encode_invariant(candidate), is_balanced,
+             [_encode_invariant(refined) for refined in refined_candidates]]
+            for candidate, (is_balanced, refined_candidates)
+            in self.results.items()]
+        entries.sort()
+        os.makedirs(self.directory, exist_ok=True)
+        # Write atomically so that concurrent translator runs can
+        # share the cache directory.
+        handle, tmp_path = tempfile.mkstemp(
+            dir=self.directory, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(handle, "w") as cache_file:
+                json.dump(entries, cache_file)
+            os.replace(tmp_path, self.filename)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
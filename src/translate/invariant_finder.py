@@ -3,19 +3,26 @@
 
 from collections import deque, defaultdict
 import itertools
+import multiprocessing
 import time
 
+import invariant_cache
 import invariants
 import options
 import pddl
 import timers
+import tools
 
 class BalanceChecker:
     def __init__(self, task, reachable_action_params):
         self.predicates_to_add_actions = defaultdict(set)
         self.action_to_heavy_action = {}
+        # Actions with inequality preconditions that hold for this instance.
+        self.instance_dependent_actions = set()
         for act in task.actions:
             action = self.add_inequality_preconds(act, reachable_action_params)
+            if action is not act:
+                self.instance_dependent_actions.add(action)
             too_heavy_effects = []
             create_heavy_act = False
             heavy_act = action
@@ -42,6 +49,14 @@ class BalanceChecker:
     def get_heavy_action(self, action):
         return self.action_to_heavy_action[action]
 
+    def is_instance_independent(self, invariant):
+        """Return True if the balance check for the invariant does not
+        depend on instance-specific inequality preconditions."""
+        return not any(
+            action in self.instance_dependent_actions
+            for part in invariant.parts
+            for action in self.get_threats(part.predicate))
+
     def add_inequality_preconds(self, action, reachable_action_params):
         if reachable_action_params is None or len(action.parameters) < 2:
             return action
@@ -83,10 +98,33 @@ def get_initial_invariants(task):
             part = invariants.InvariantPart(predicate.name, order, omitted_arg)
             yield invariants.Invariant((part,))
 
+# Candidates handed to each worker process per batch in parallel mode.
+CANDIDATES_PER_PROCESS_AND_BATCH = 8
+
+# Balance checker of the worker processes (set by the pool initializer).
+_worker_balance_checker = None
+
+def _init_worker(balance_checker):
+    global _worker_balance_checker
+    _worker_balance_checker = balance_checker
+
+def check_balance(candidate, balance_checker):
+    """Return a pair (is_balanced, refined_candidates). We collect the
+    refined candidates instead of enqueueing them directly, so that the
+    caller can enqueue them in the serial order."""
+    refined_candidates = []
+    is_balanced = candidate.check_balance(
+        balance_checker, refined_candidates.append)
+    return is_balanced, refined_candidates
+
+def _check_balance_in_worker(candidate):
+    return check_balance(candidate, _worker_balance_checker)
+
 def find_invariants(task, reachable_action_params):
     limit = options.invariant_generation_max_candidates
     candidates = deque(itertools.islice(get_initial_invariants(task), 0, limit))
     print(len(candidates), "initial candidates")
+    timers.add_count("initial candidates", len(candidates))
     seen_candidates = set(candidates)
 
     balance_checker = BalanceChecker(task, reachable_action_params)
@@ -96,14 +134,79 @@ def find_invariants(task, reachable_action_params):
             candidates.append(invariant)
             seen_candidates.add(invariant)
 
+    cache = None
+    if options.invariant_cache:
+        cache = invariant_cache.InvariantCache(options.invariant_cache, task)
+
+    num_processes = tools.get_num_processes(
+        options.invariant_generation_processes, "invariant synthesis")
+    if num_processes > 1:
+        results = _check_candidates_parallel(
+            candidates, balance_checker, cache, num_processes)
+    else:
+        results = _check_candidates(candidates, balance_checker, cache)
+    try:
+        for candidate, (is_balanced, refined_candidates) in results:
+            for refined_candidate in refined_candidates:
+                enqueue_func(refined_candidate)
+            if is_balanced:
+                yield candidate
+    finally:
+        timers.add_count("candidates", len(seen_candidates))
+        if cache:
+            cache.save()
+
+def _check_candidates(candidates, balance_checker, cache):
+    # Generate pairs (candidate, balance check result) for the
+    # candidates in queue order. The caller enqueues the refined
+    # candidates before we pop the next candidate.
     start_time = time.process_time()
     while candidates:
         candidate = candidates.popleft()
         if time.process_time() - start_time > options.invariant_generation_max_time:
             print("Time limit reached, aborting invariant generation")
             return
-        if candidate.check_balance(balance_checker, enqueue_func):
-            yield candidate
+        result = cache and cache.lookup(candidate, balance_checker)
+        if not result:
+            result = check_balance(candidate, balance_checker)
+            if cache:
+                cache.add(candidate, balance_checker, *result)
+        yield candidate, result
+
+def _check_candidates_parallel(candidates, balance_checker, cache,
+                               num_processes):
+    # We check a batch of candidates from the front of the queue in
+    # parallel and then let the caller enqueue the refined candidates
+    # of each checked candidate in queue order. All candidates of a
+    # batch were enqueued before any of their refinements, so this
+    # yields the same queue, and hence the same invariants, as the
+    # serial loop.
+    # The time limit refers to wall-clock time here because the CPU
+    # time of this process does not include the time of the workers.
+    print("Using %d processes for invariant synthesis" % num_processes)
+    batch_size = num_processes * CANDIDATES_PER_PROCESS_AND_BATCH
+    context = multiprocessing.get_context("fork")
+    with context.Pool(num_processes, initializer=_init_worker,
+                      initargs=(balance_checker,)) as pool:
+        start_time = time.perf_counter()
+        while candidates:
+            if time.perf_counter() - start_time > options.invariant_generation_max_time:
+                print("Time limit reached, aborting invariant generation")
+                return
+            batch = [candidates.popleft()
+                     for _ in range(min(batch_size, len(candidates)))]
+            results = [cache and cache.lookup(candidate, balance_checker)
+                       for candidate in batch]
+            unchecked = [candidate for candidate, result in zip(batch, results)
+                         if not result]
+            checked = iter(pool.map(_check_balance_in_worker, unchecked,
+                                    chunksize=CANDIDATES_PER_PROCESS_AND_BATCH))
+            for candidate, result in zip(batch, results):
+                if not result:
+                    result = next(checked)
+                    if cache:
+                        cache.add(candidate, balance_checker, *result)
+                yield candidate, result
 
 def useful_groups(invariants, initial_facts):
     predicate_to_invariants = defaultdict(list)
@@ -129,6 +232,7 @@ def useful_groups(invariants, initial_facts):
 def get_groups(task, reachable_action_params=None):
     with timers.timing("Finding invariants", block=True):
         invariants = sorted(find_invariants(task, reachable_action_params))
+        timers.add_count("invariants", len(invariants))
     with timers.timing("Checking invariant weight"):
         result = list(useful_groups(invariants, task.init))
     return result
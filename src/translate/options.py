@@ -28,9 +28,40 @@ def parse_args():
     argparser.add_argument(
         "--sas-file", default="output.sas",
         help="path to the SAS output file (default: %(default)s)")
+    argparser.add_argument(
+        "--sas-format", choices=["text", "binary"], default="text",
+        help="format of the SAS output file. The binary format is more "
+        "compact and is converted to the text format by the driver when "
+        "running the search (default: %(default)s)")
+    argparser.add_argument(
+        "--sas-compression", choices=["none", "gzip"], default="none",
+        help="compression of the SAS output file (default: %(default)s)")
     argparser.add_argument(
         "--invariant-generation-max-time", default=300, type=int,
         help="max time for invariant generation (default: %(default)ds)")
+    argparser.add_argument(
+        "--invariant-generation-processes", default=1, type=int,
+        help="number of processes that check the balance of invariant "
+        "candidates during invariant synthesis (default: %(default)d, 0: "
+        "number of CPUs). Candidates are checked in batches, and refined "
+        "candidates are queued in the serial order, so the synthesized "
+        "invariants are the same for any number of processes. With more "
+        "than one process, --invariant-generation-max-time limits "
+        "wall-clock time instead of CPU time.")
+    argparser.add_argument(
+        "--translation-processes", default=1, type=int,
+        help="number of processes that translate the grounded STRIPS "
+        "operators to finite-domain operators in chunks of consecutive "
+        "operators (default: %(default)d, 0: number of CPUs). Axioms are "
+        "always translated serially. The chunks are concatenated in the "
+        "original order, so the output file is the same for any number "
+        "of processes.")
+    argparser.add_argument(
+        "--invariant-cache", metavar="DIR",
+        help="directory for caching the results of invariant balance checks "
+        "per normalized domain. Results that hold for all instances of a "
+        "domain are stored there and reused for other instances of the same "
+        "domain, which yields the same invariants faster.")
     argparser.add_argument(
         "--add-implied-preconditions", action="store_true",
         help="infer additional preconditions. This setting can cause a "
@@ -49,6 +80,37 @@ def parse_args():
         "--keep-unimportant-variables",
         dest="filter_unimportant_vars", action="store_false",
         help="keep variables that do not influence the goal in the causal graph")
+    argparser.add_argument(
+        "--datalog-evaluation", default="naive", choices=["naive", "semi-naive"],
+        help="How to compute the relaxed reachability model during grounding. "
+        "'naive' processes one atom at a time, while 'semi-naive' processes "
+        "all newly derived atoms of a round in batches per rule, using hash "
+        "joins on the shared variables. Both compute the same model.")
+    argparser.add_argument(
+        "--model-snapshot", metavar="FILE",
+        help="load the relaxed reachability model of a previous run from "
+        "FILE and store the model of this run there. If the domain is the "
+        "same and the task only has additional initial facts or objects "
+        "or a different goal, the previous model is extended incrementally "
+        "instead of being computed from scratch.")
+    argparser.add_argument(
+        "--relevance-pruning", action="store_true",
+        help="remove effects, actions and axioms that cannot contribute "
+        "to reaching the goal according to a backward relevance analysis. "
+        "The analysis runs on the predicates of the task before grounding "
+        "and on the ground atoms of the relaxed reachability model before "
+        "instantiating it. This shrinks the grounded task if parts of it "
+        "are irrelevant.")
+    argparser.add_argument(
+        "--profile-file", metavar="FILE",
+        help="write a JSON report with the CPU time, wall-clock time and "
+        "memory usage of each translator phase and the number of items "
+        "(rules, atoms, candidates, operators, ...) it produced to FILE")
+    argparser.add_argument(
+        "--profile-allocations", action="store_true",
+        help="also report the memory allocated by Python objects in each "
+        "phase (using tracemalloc). This slows down the translator "
+        "considerably. Only has an effect together with --profile-file.")
     argparser.add_argument(
         "--dump-task", action="store_true",
         help="dump human-readable SAS+ representation of the task")
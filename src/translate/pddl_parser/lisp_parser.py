@@ -1,3 +1,6 @@
+import io
+import re
+
 __all__ = ["ParseError", "parse_nested_list"]
 
 class ParseError(Exception):
@@ -6,16 +9,55 @@ class ParseError(Exception):
     def __str__(self):
         return self.value
 
+COMMENT_RE = re.compile(r";[^\n]*")
+
 # Basic functions for parsing PDDL (Lisp) files.
 def parse_nested_list(input_file):
-    tokens = tokenize(input_file)
-    next_token = next(tokens)
+    text = input_file.read()
+    if ";" in text:
+        code = COMMENT_RE.sub("", text)
+    else:
+        code = text
+    if not code.isascii():
+        # Fall back to the line-based tokenizer, which reports the
+        # first line with a non-ASCII character outside a comment.
+        tokens = tokenize(io.StringIO(text))
+    else:
+        # Tokenizing the whole input at once gives the same tokens as
+        # tokenize but is much faster. Splitting with str.split is also
+        # much faster than matching the tokens with a regular
+        # expression, which is about as slow as tokenize.
+        tokens = iter(split_into_tokens(code))
+    return parse_nested_list_from_tokens(tokens)
+
+def parse_nested_list_from_tokens(tokens):
+    next_token = next(tokens, None)
+    if next_token is None:
+        raise ParseError("Expected '(', got end of file.")
     if next_token != "(":
         raise ParseError("Expected '(', got %s." % next_token)
-    result = list(parse_list_aux(tokens))
-    for tok in tokens:  # Check that generator is exhausted.
-        raise ParseError("Unexpected token: %s." % tok)
-    return result
+    # Build the nested lists iteratively to avoid deep recursion.
+    stack = []
+    current = []
+    for token in tokens:
+        if token == "(":
+            stack.append(current)
+            sublist = []
+            current.append(sublist)
+            current = sublist
+        elif token == ")":
+            if not stack:
+                for tok in tokens:  # Check that the input is exhausted.
+                    raise ParseError("Unexpected token: %s." % tok)
+                return current
+            current = stack.pop()
+        else:
+            current.append(token)
+    raise ParseError("Missing ')'")
+
+def split_into_tokens(code):
+    code = code.replace("(", " ( ").replace(")", " ) ").replace("?", " ?")
+    return code.lower().split()
 
 def tokenize(input):
     for line in input:
@@ -25,20 +67,5 @@ def tokenize(input):
         except UnicodeEncodeError:
             raise ParseError("Non-ASCII character outside comment: %s" %
                              line[0:-1])
-        line = line.replace("(", " ( ").replace(")", " ) ").replace("?", " ?")
-        for token in line.split():
-            yield token.lower()
-
-def parse_list_aux(tokenstream):
-    # Leading "(" has already been swallowed.
-    while True:
-        try:
-            token = next(tokenstream)
-        except StopIteration:
-            raise ParseError("Missing ')'")
-        if token == ")":
-            return
-        elif token == "(":
-            yield list(parse_list_aux(tokenstream))
-        else:
+        for token in split_into_tokens(line):
             yield token
@@ -0,0 +1,252 @@
+"""Backward relevance analysis for normalized tasks.
+
+The analysis runs twice. Before grounding, prune_irrelevant_parts works
+on the predicates of the lifted task: a predicate is relevant if it
+occurs in the goal or in a condition of a relevant action effect or a
+relevant axiom. An effect is relevant if it adds or deletes a relevant
+predicate, and an axiom is relevant if it derives a relevant predicate.
+The conditions of a relevant effect include the precondition of its
+action. This pass is cheap and shrinks the Datalog program, but it
+keeps every effect on a relevant predicate.
+
+After computing the relaxed reachability model, prune_irrelevant_instances
+repeats the analysis on the ground atoms of the model: an atom is
+relevant if it occurs in the goal, in the precondition of a relevant
+action instance, in the condition of a relevant effect instance or in
+the body of a relevant axiom instance. An action instance is relevant
+if one of its effects adds or deletes a relevant atom, and an axiom
+instance is relevant if it derives a relevant atom. Only the relevant
+action and axiom instances are passed on to instantiation.
+
+Irrelevant effects cannot influence the goal, the preconditions of
+relevant actions or the bodies of relevant axioms, so removing them
+(and all actions without remaining effects and all irrelevant axioms)
+preserves the plans of the task up to irrelevant actions.
+"""
+
+from collections import defaultdict
+import itertools
+
+import pddl
+
+
+def get_literals(condition):
+    if isinstance(condition, pddl.Literal):
+        yield condition
+    else:
+        for part in condition.parts:
+            yield from get_literals(part)
+
+
+def get_predicates(condition):
+    if isinstance(condition, pddl.Literal):
+        return {condition.predicate}
+    predicates = set()
+    for part in condition.parts:
+        predicates |= get_predicates(part)
+    return predicates
+
+
+def compute_relevant_predicates(task):
+    # Maps each predicate to the sets of predicates that become
+    # relevant if it is relevant.
+    requirements = defaultdict(list)
+    for action in task.actions:
+        precondition_predicates = get_predicates(action.precondition)
+        for effect in action.effects:
+            requirements[effect.literal.predicate].append(
+                precondition_predicates | get_predicates(effect.condition))
+    for axiom in task.axioms:
+        requirements[axiom.name].append(get_predicates(axiom.condition))
+
+    relevant = get_predicates(task.goal)
+    queue = list(relevant)
+    while queue:
+        predicate = queue.pop()
+        for required_predicates in requirements.pop(predicate, []):
+            for required_predicate in required_predicates - relevant:
+                relevant.add(required_predicate)
+                queue.append(required_predicate)
+    return relevant
+
+
+def prune_irrelevant_parts(task):
+    """Remove irrelevant effects, actions without relevant effects and
+    irrelevant axioms from the normalized task."""
+    relevant = compute_relevant_predicates(task)
+    num_effects = sum(len(action.effects) for action in task.actions)
+    num_actions = len(task.actions)
+    num_axioms = len(task.axioms)
+    for action in task.actions:
+        action.effects = [effect for effect in action.effects
+                          if effect.literal.predicate in relevant]
+    task.actions = [action for action in task.actions if action.effects]
+    task.axioms = [axiom for axiom in task.axioms if axiom.name in relevant]
+    print("%d irrelevant effects removed" % (
+        num_effects - sum(len(action.effects) for action in task.actions)))
+    print("%d irrelevant actions removed" % (num_actions - len(task.actions)))
+    print("%d irrelevant axioms removed" % (num_axioms - len(task.axioms)))
+
+
+def match_literal(literal, atom):
+    """Return the variable mapping under which the literal refers to the
+    atom, or None if it cannot refer to the atom."""
+    var_mapping = {}
+    for arg, obj in zip(literal.args, atom.args):
+        if arg.startswith("?"):
+            if var_mapping.setdefault(arg, obj) != obj:
+                return None
+        elif arg != obj:
+            return None
+    return var_mapping
+
+
+def ground_atom(literal, var_mapping):
+    return pddl.Atom(literal.predicate,
+                     [var_mapping.get(arg, arg) for arg in literal.args])
+
+
+class RelevantInstances:
+    """Backward fixpoint over the ground atoms of a relaxed reachability
+    model. The instances of each action effect and axiom are indexed by
+    the arguments that determine the atom they add, delete or derive."""
+
+    def __init__(self, task, model, type_to_objects):
+        self.type_to_objects = type_to_objects
+        self.object_sets = {}
+        self.effect_indices = []
+        self.reachable_atoms = set()
+        self.action_instances = defaultdict(list)
+        self.axiom_instances = defaultdict(lambda: defaultdict(list))
+        for atom in model:
+            if isinstance(atom.predicate, pddl.Action):
+                self.action_instances[atom.predicate].append(atom)
+            elif isinstance(atom.predicate, pddl.Axiom):
+                axiom = atom.predicate
+                head = atom.args[:axiom.num_external_parameters]
+                self.axiom_instances[axiom][head].append(atom)
+            else:
+                self.reachable_atoms.add(atom)
+
+        # Maps each predicate to the action effects and axioms that
+        # add, delete or derive its atoms. Effects are numbered because
+        # equal effects of different actions need separate indices.
+        self.effects = defaultdict(list)
+        for action in task.actions:
+            for effect in action.effects:
+                self.effects[effect.literal.predicate].append(
+                    (len(self.effect_indices), action, effect))
+                self.effect_indices.append(None)
+        self.axioms = defaultdict(list)
+        for axiom in task.axioms:
+            self.axioms[axiom.name].append(axiom)
+
+        self.relevant_atoms = set()
+        self.relevant_instances = set()
+        self.queue = []
+        for literal in get_literals(task.goal):
+            self.add_atom(pddl.Atom(literal.predicate, literal.args))
+        while self.queue:
+            atom = self.queue.pop()
+            for effect_id, action, effect in self.effects.get(
+                    atom.predicate, ()):
+                self.add_effect_instances(effect_id, action, effect, atom)
+            for axiom in self.axioms.get(atom.predicate, ()):
+                for instance in self.axiom_instances[axiom].get(atom.args, ()):
+                    if instance not in self.relevant_instances:
+                        self.relevant_instances.add(instance)
+                        self.add_condition(axiom.condition, dict(
+                            zip([par.name for par in axiom.parameters],
+                                instance.args)))
+
+    def add_atom(self, atom):
+        if atom not in self.relevant_atoms:
+            self.relevant_atoms.add(atom)
+            self.queue.append(atom)
+
+    def add_condition(self, condition, var_mapping):
+        for literal in get_literals(condition):
+            self.add_atom(ground_atom(literal, var_mapping))
+
+    def is_reachable(self, condition, var_mapping):
+        return all(ground_atom(literal, var_mapping) in self.reachable_atoms
+                   for literal in get_literals(condition)
+                   if not literal.negated)
+
+    def get_objects(self, type_name):
+        objects = self.object_sets.get(type_name)
+        if objects is None:
+            objects = set(self.type_to_objects.get(type_name, []))
+            self.object_sets[type_name] = objects
+        return objects
+
+    def get_effect_index(self, effect_id, action, effect):
+        # Maps the arguments of the action parameters that occur in the
+        # effect literal to the instances with these arguments.
+        if self.effect_indices[effect_id] is None:
+            positions = {par.name: index
+                         for index, par in enumerate(action.parameters)}
+            key_positions = [positions[arg] for arg in
+                             dict.fromkeys(effect.literal.args)
+                             if arg in positions]
+            index = defaultdict(list)
+            for instance in self.action_instances.get(action, ()):
+                index[tuple(instance.args[pos]
+                            for pos in key_positions)].append(instance)
+            key_args = [action.parameters[pos].name for pos in key_positions]
+            self.effect_indices[effect_id] = (key_args, index)
+        return self.effect_indices[effect_id]
+
+    def add_effect_instances(self, effect_id, action, effect, atom):
+        var_mapping = match_literal(effect.literal, atom)
+        if var_mapping is None:
+            return
+        for par in effect.parameters:
+            if (par.name in var_mapping and var_mapping[par.name] not in
+                    self.get_objects(par.type_name)):
+                return
+        key_args, index = self.get_effect_index(effect_id, action, effect)
+        instances = index.get(tuple(var_mapping[arg] for arg in key_args))
+        if not instances:
+            return
+        # Quantified variables that only occur in the effect condition
+        # can take any object of their type. Effect instances whose
+        # condition is not relaxed reachable never fire.
+        free_parameters = [par for par in effect.parameters
+                           if par.name not in var_mapping]
+        object_lists = [self.type_to_objects.get(par.type_name, [])
+                        for par in free_parameters]
+        for instance in instances:
+            effect_mapping = {par.name: arg for par, arg in
+                              zip(action.parameters, instance.args)}
+            effect_mapping.update(var_mapping)
+            for objects in itertools.product(*object_lists):
+                effect_mapping.update(zip(
+                    [par.name for par in free_parameters], objects))
+                if not self.is_reachable(effect.condition, effect_mapping):
+                    continue
+                if instance not in self.relevant_instances:
+                    self.relevant_instances.add(instance)
+                    self.add_condition(action.precondition, effect_mapping)
+                self.add_condition(effect.condition, effect_mapping)
+
+
+def prune_irrelevant_instances(task, model, type_to_objects):
+    """Return the model without the action and axiom instances that
+    cannot contribute to reaching the goal."""
+    relevant_instances = RelevantInstances(
+        task, model, type_to_objects).relevant_instances
+    result = []
+    num_actions = num_axioms = 0
+    for atom in model:
+        if isinstance(atom.predicate, (pddl.Action, pddl.Axiom)):
+            if atom not in relevant_instances:
+                if isinstance(atom.predicate, pddl.Action):
+                    num_actions += 1
+                else:
+                    num_axioms += 1
+                continue
+        result.append(atom)
+    print("%d irrelevant action instances removed" % num_actions)
+    print("%d irrelevant axiom instances removed" % num_axioms)
+    return result
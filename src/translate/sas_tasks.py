@@ -1,7 +1,47 @@
 SAS_FILE_VERSION = 3
 
+# The binary encoding of the translator output consists of the magic
+# bytes and the format version, followed by the SAS file version, the
+# metric flag and a section index with the size in bytes of each of
+# the sections variables, mutexes, init, goal, operators and axioms.
+# The sections contain the same data as in the text format. Numbers
+# are encoded as zigzag varints and strings as their length followed
+# by their UTF-8 encoding. The file can additionally be compressed
+# with gzip. The driver decodes it to the text format for the search.
+BINARY_SAS_MAGIC = b"SASB"
+BINARY_SAS_FORMAT_VERSION = 1
+
 DEBUG = False
 
+# SASTask.output collects the output of operators and axioms in chunks
+# of roughly this many characters before writing them to the stream.
+OUTPUT_CHUNK_SIZE = 1 << 20
+
+
+def _format_pairs(pairs):
+    return "".join("%d %d\n" % pair for pair in pairs)
+
+
+def _append_number(buffer, number):
+    number = 2 * number if number >= 0 else -2 * number - 1
+    while number >= 0x80:
+        buffer.append(number & 0x7f | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+def _append_string(buffer, string):
+    encoded = string.encode("utf-8")
+    _append_number(buffer, len(encoded))
+    buffer += encoded
+
+
+def _append_pairs(buffer, pairs):
+    _append_number(buffer, len(pairs))
+    for var, val in pairs:
+        _append_number(buffer, var)
+        _append_number(buffer, val)
+
 
 class SASTask:
     """Planning task in finite-domain representation.
@@ -76,24 +116,45 @@ class SASTask:
         print("metric: %s" % self.metric)
 
     def output(self, stream):
-        print("begin_version", file=stream)
-        print(SAS_FILE_VERSION, file=stream)
-        print("end_version", file=stream)
-        print("begin_metric", file=stream)
-        print(int(self.metric), file=stream)
-        print("end_metric", file=stream)
+        # Formatting each part of the task as a string and writing
+        # large chunks is much faster than printing line by line.
+        stream.write(
+            "begin_version\n%d\nend_version\n"
+            "begin_metric\n%d\nend_metric\n" % (
+                SAS_FILE_VERSION, int(self.metric)))
         self.variables.output(stream)
-        print(len(self.mutexes), file=stream)
-        for mutex in self.mutexes:
-            mutex.output(stream)
+        stream.write("%d\n" % len(self.mutexes))
+        _output_in_chunks(stream, self.mutexes)
         self.init.output(stream)
         self.goal.output(stream)
-        print(len(self.operators), file=stream)
-        for op in self.operators:
-            op.output(stream)
-        print(len(self.axioms), file=stream)
-        for axiom in self.axioms:
-            axiom.output(stream)
+        stream.write("%d\n" % len(self.operators))
+        _output_in_chunks(stream, self.operators)
+        stream.write("%d\n" % len(self.axioms))
+        _output_in_chunks(stream, self.axioms)
+
+    def output_binary(self, stream):
+        """Write the task in the binary format described at the top of
+        this module to the binary stream."""
+        sections = [bytearray() for _ in range(6)]
+        self.variables.output_binary(sections[0])
+        for buffer, elements in [(sections[1], self.mutexes),
+                                 (sections[4], self.operators),
+                                 (sections[5], self.axioms)]:
+            _append_number(buffer, len(elements))
+            for element in elements:
+                element.output_binary(buffer)
+        self.init.output_binary(sections[2])
+        self.goal.output_binary(sections[3])
+
+        header = bytearray(BINARY_SAS_MAGIC)
+        for number in [BINARY_SAS_FORMAT_VERSION, SAS_FILE_VERSION,
+                       int(self.metric), len(sections)]:
+            _append_number(header, number)
+        for section in sections:
+            _append_number(header, len(section))
+        stream.write(header)
+        for section in sections:
+            stream.write(section)
 
     def get_encoding_size(self):
         task_size = 0
@@ -156,17 +217,27 @@ class SASVariables:
             print("v%d in {%s}%s" % (var, list(range(rang)), axiom_str))
 
     def output(self, stream):
-        print(len(self.ranges), file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
+        parts = ["%d\n" % len(self.ranges)]
         for var, (rang, axiom_layer, values) in enumerate(zip(
                 self.ranges, self.axiom_layers, self.value_names)):
-            print("begin_variable", file=stream)
-            print("var%d" % var, file=stream)
-            print(axiom_layer, file=stream)
-            print(rang, file=stream)
             assert rang == len(values), (rang, values)
+            parts.append("begin_variable\nvar%d\n%d\n%d\n" % (
+                var, axiom_layer, rang))
+            parts.extend("%s\n" % value for value in values)
+            parts.append("end_variable\n")
+        return "".join(parts)
+
+    def output_binary(self, buffer):
+        _append_number(buffer, len(self.ranges))
+        for rang, axiom_layer, values in zip(
+                self.ranges, self.axiom_layers, self.value_names):
+            _append_number(buffer, axiom_layer)
+            _append_number(buffer, rang)
             for value in values:
-                print(value, file=stream)
-            print("end_variable", file=stream)
+                _append_string(buffer, value)
 
     def get_encoding_size(self):
         # A variable with range k has encoding size k + 1 to also give the
@@ -190,11 +261,14 @@ class SASMutexGroup:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_mutex_group", file=stream)
-        print(len(self.facts), file=stream)
-        for var, val in self.facts:
-            print(var, val, file=stream)
-        print("end_mutex_group", file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
+        return "begin_mutex_group\n%d\n%send_mutex_group\n" % (
+            len(self.facts), _format_pairs(self.facts))
+
+    def output_binary(self, buffer):
+        _append_pairs(buffer, self.facts)
 
     def get_encoding_size(self):
         return len(self.facts)
@@ -220,10 +294,16 @@ class SASInit:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_state", file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
+        return "begin_state\n%send_state\n" % "".join(
+            "%d\n" % val for val in self.values)
+
+    def output_binary(self, buffer):
+        _append_number(buffer, len(self.values))
         for val in self.values:
-            print(val, file=stream)
-        print("end_state", file=stream)
+            _append_number(buffer, val)
 
 
 class SASGoal:
@@ -240,11 +320,14 @@ class SASGoal:
             print("v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_goal", file=stream)
-        print(len(self.pairs), file=stream)
-        for var, val in self.pairs:
-            print(var, val, file=stream)
-        print("end_goal", file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
+        return "begin_goal\n%d\n%send_goal\n" % (
+            len(self.pairs), _format_pairs(self.pairs))
+
+    def output_binary(self, buffer):
+        _append_pairs(buffer, self.pairs)
 
     def get_encoding_size(self):
         return len(self.pairs)
@@ -357,19 +440,30 @@ class SASOperator:
             print("  v%d: %d -> %d%s" % (var, pre, post, cond_str))
 
     def output(self, stream):
-        print("begin_operator", file=stream)
-        print(self.name[1:-1], file=stream)
-        print(len(self.prevail), file=stream)
-        for var, val in self.prevail:
-            print(var, val, file=stream)
-        print(len(self.pre_post), file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
+        parts = ["begin_operator\n%s\n%d\n" % (
+            self.name[1:-1], len(self.prevail))]
+        parts.append(_format_pairs(self.prevail))
+        parts.append("%d\n" % len(self.pre_post))
         for var, pre, post, cond in self.pre_post:
-            print(len(cond), end=' ', file=stream)
-            for cvar, cval in cond:
-                print(cvar, cval, end=' ', file=stream)
-            print(var, pre, post, file=stream)
-        print(self.cost, file=stream)
-        print("end_operator", file=stream)
+            parts.append("%d " % len(cond))
+            parts.extend("%d %d " % fact for fact in cond)
+            parts.append("%d %d %d\n" % (var, pre, post))
+        parts.append("%s\nend_operator\n" % self.cost)
+        return "".join(parts)
+
+    def output_binary(self, buffer):
+        _append_string(buffer, self.name[1:-1])
+        _append_pairs(buffer, self.prevail)
+        _append_number(buffer, len(self.pre_post))
+        for var, pre, post, cond in self.pre_post:
+            _append_pairs(buffer, cond)
+            _append_number(buffer, var)
+            _append_number(buffer, pre)
+            _append_number(buffer, post)
+        _append_number(buffer, self.cost)
 
     def get_encoding_size(self):
         size = 1 + len(self.prevail)
@@ -465,13 +559,34 @@ class SASAxiom:
         print("  v%d: %d" % (var, val))
 
     def output(self, stream):
-        print("begin_rule", file=stream)
-        print(len(self.condition), file=stream)
-        for var, val in self.condition:
-            print(var, val, file=stream)
+        stream.write(self.get_output_string())
+
+    def get_output_string(self):
         var, val = self.effect
-        print(var, 1 - val, val, file=stream)
-        print("end_rule", file=stream)
+        return "begin_rule\n%d\n%s%d %d %d\nend_rule\n" % (
+            len(self.condition), _format_pairs(self.condition),
+            var, 1 - val, val)
+
+    def output_binary(self, buffer):
+        _append_pairs(buffer, self.condition)
+        var, val = self.effect
+        _append_number(buffer, var)
+        _append_number(buffer, 1 - val)
+        _append_number(buffer, val)
 
     def get_encoding_size(self):
         return 1 + len(self.condition)
+
+
+def _output_in_chunks(stream, elements):
+    chunk = []
+    chunk_size = 0
+    for element in elements:
+        output = element.get_output_string()
+        chunk.append(output)
+        chunk_size += len(output)
+        if chunk_size >= OUTPUT_CHUNK_SIZE:
+            stream.write("".join(chunk))
+            chunk = []
+            chunk_size = 0
+    stream.write("".join(chunk))
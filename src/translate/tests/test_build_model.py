@@ -0,0 +1,77 @@
+import build_model
+import pddl
+from pddl_to_prolog import Rule, PrologProgram
+
+
+def get_program(start_nodes=("a",)):
+    prog = PrologProgram()
+    for x, y in [("a", "b"), ("b", "c"), ("c", "d"), ("d", "a")]:
+        prog.add_fact(pddl.Atom("edge", [x, y]))
+    for node in start_nodes:
+        prog.add_fact(pddl.Atom("start", [node]))
+    prog.add_fact(pddl.Atom("color", ["red"]))
+    prog.add_fact(pddl.Atom("color", ["blue"]))
+    prog.add_rule(Rule([pddl.Atom("start", ["?X"])],
+                       pddl.Atom("reach", ["?X"])))
+    prog.add_rule(Rule([pddl.Atom("reach", ["?X"]), pddl.Atom("edge", ["?X", "?Y"])],
+                       pddl.Atom("reach", ["?Y"])))
+    prog.add_rule(Rule([pddl.Atom("edge", ["?X", "?Y"]), pddl.Atom("edge", ["?Y", "?Z"])],
+                       pddl.Atom("path2", ["?X", "?Z"])))
+    prog.add_rule(Rule([pddl.Atom("reach", ["?X"]), pddl.Atom("color", ["?C"]),
+                        pddl.Atom("reach", ["?Y"])],
+                       pddl.Atom("paint", ["?X", "?C", "?Y"])))
+    prog.add_rule(Rule([pddl.Atom("paint", ["?X", "red", "?Y"])],
+                       pddl.Atom("red", ["?X"])))
+    prog.normalize()
+    prog.split_rules()
+    return prog
+
+
+def test_semi_naive_evaluation():
+    naive_model = build_model.compute_model(get_program(), "naive")
+    semi_naive_model = build_model.compute_model(get_program(), "semi-naive")
+    assert len(naive_model) == len(set(naive_model))
+    assert set(naive_model) == set(semi_naive_model)
+    assert len(naive_model) == len(semi_naive_model)
+    assert pddl.Atom("red", ["d"]) in semi_naive_model
+
+
+def test_symbol_table():
+    symbols = build_model.SymbolTable()
+    atom = pddl.Atom("at", ["truck", "depot"])
+    encoded = symbols.encode_atom(atom)
+    assert encoded == (0, 1, 2)
+    assert symbols.encode_atom(pddl.Atom("at", ["depot", "depot"])) == (0, 2, 2)
+    assert symbols.decode_atom(encoded) == atom
+    assert len(symbols) == 3
+
+
+def test_model_snapshot():
+    prog = get_program()
+    snapshot = build_model.ModelSnapshot(prog, build_model.compute_model(prog))
+    for evaluation in ["naive", "semi-naive"]:
+        full_model = build_model.compute_model(get_program(["a", "e"]), evaluation)
+        extended_model = build_model.compute_model(
+            get_program(["a", "e"]), evaluation, snapshot)
+        assert len(extended_model) == len(full_model)
+        assert set(extended_model) == set(full_model)
+        assert pddl.Atom("reach", ["e"]) in extended_model
+        # The model of a program with fewer facts does not extend the snapshot.
+        assert snapshot.get_previous_model(get_program([])) is None
+
+
+def test_unifier_with_constants():
+    prog = get_program()
+    prog.add_rule(Rule([pddl.Atom("edge", ["a", "?Y"])],
+                       pddl.Atom("from-a", ["?Y"])))
+    prog.add_rule(Rule([pddl.Atom("edge", ["?X", "a"])],
+                       pddl.Atom("to-a", ["?X"])))
+    prog.add_rule(Rule([pddl.Atom("edge", ["b", "c"])],
+                       pddl.Atom("b-to-c", [])))
+    prog.normalize()
+    prog.split_rules()
+    model = build_model.compute_model(prog)
+    derived = {atom for atom in model
+               if atom.predicate in ["from-a", "to-a", "b-to-c"]}
+    assert derived == {pddl.Atom("from-a", ["b"]), pddl.Atom("to-a", ["d"]),
+                       pddl.Atom("b-to-c", [])}
@@ -0,0 +1,52 @@
+import sys
+from types import SimpleNamespace
+
+import pddl
+
+
+def expand_group_by_trying_all_objects(group, task, reachable_facts):
+    result = []
+    for fact in group:
+        try:
+            pos = list(fact.args).index("?X")
+        except ValueError:
+            result.append(fact)
+        else:
+            for obj in task.objects:
+                newargs = list(fact.args)
+                newargs[pos] = obj.name
+                atom = pddl.Atom(fact.predicate, newargs)
+                if atom in reachable_facts:
+                    result.append(atom)
+    return result
+
+
+def test_instantiate_groups(monkeypatch):
+    # fact_groups imports options, which parses the command line.
+    monkeypatch.setattr(sys, "argv", ["translate.py", "domain.pddl", "task.pddl"])
+    import fact_groups
+    # The constant "a" of the domain also occurs as an object of the
+    # problem.
+    task = SimpleNamespace(objects=[
+        pddl.TypedObject("a", "room"),
+        pddl.TypedObject("c", "ball"),
+        pddl.TypedObject("b", "room"),
+        pddl.TypedObject("a", "object"),
+        pddl.TypedObject("left", "gripper")])
+    reachable_facts = {
+        pddl.Atom("at", ["c", "b"]), pddl.Atom("at", ["c", "a"]),
+        pddl.Atom("at", ["c", "d"]), pddl.Atom("carry", ["c", "left"]),
+        pddl.Atom("at-robby", ["b"]), pddl.Atom("free", ["left"])}
+    groups = [
+        [pddl.Atom("at", ["c", "?X"]), pddl.Atom("carry", ["c", "?X"])],
+        [pddl.Atom("at-robby", ["?X"])],
+        [pddl.Atom("free", ["left"]), pddl.Atom("carry", ["?X", "left"])],
+        [pddl.Atom("at", ["?X", "a"])]]
+    expected = [
+        expand_group_by_trying_all_objects(group, task, reachable_facts)
+        for group in groups]
+    assert expected[0] == [
+        pddl.Atom("at", ["c", "a"]), pddl.Atom("at", ["c", "b"]),
+        pddl.Atom("at", ["c", "a"]), pddl.Atom("carry", ["c", "left"])]
+    assert fact_groups.instantiate_groups(
+        groups, task, reachable_facts) == expected
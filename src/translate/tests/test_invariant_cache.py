@@ -0,0 +1,127 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import invariant_cache
+import invariants
+import pddl
+
+
+def make_task(extra_predicates=()):
+    move = pddl.Action(
+        "move",
+        [pddl.TypedObject("?from", "object"), pddl.TypedObject("?to", "object")],
+        2, pddl.Atom("at", ["?from"]),
+        [pddl.Effect([], pddl.Truth(), pddl.Atom("at", ["?to"])),
+         pddl.Effect([], pddl.Truth(), pddl.NegatedAtom("at", ["?from"]))],
+        None)
+    predicates = [pddl.Predicate("at", [pddl.TypedObject("?x", "object")])]
+    predicates += [pddl.Predicate(name, []) for name in extra_predicates]
+    return SimpleNamespace(predicates=predicates, actions=[move])
+
+
+CANDIDATE = invariants.Invariant((invariants.InvariantPart("at", [], 0),))
+REFINED = invariants.Invariant((invariants.InvariantPart("at", [0], -1),))
+
+
+@pytest.fixture
+def invariant_finder(monkeypatch):
+    # invariant_finder imports options, which parses the command line.
+    monkeypatch.setattr(sys, "argv", ["translate.py", "domain.pddl", "task.pddl"])
+    import invariant_finder
+    return invariant_finder
+
+
+def get_balance_checker(invariant_finder, task, instance_dependent=False):
+    reachable_action_params = None
+    if instance_dependent:
+        # No reachable parameters of move are equal, so the balance
+        # checker adds the precondition ?from != ?to.
+        reachable_action_params = {task.actions[0]: [("a", "b"), ("b", "a")]}
+    return invariant_finder.BalanceChecker(task, reachable_action_params)
+
+
+def test_cache_hit(tmp_path, invariant_finder):
+    task = make_task()
+    checker = get_balance_checker(invariant_finder, task)
+    result = invariant_finder.check_balance(CANDIDATE, checker)
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    assert cache.lookup(CANDIDATE, checker) is None
+    cache.add(CANDIDATE, checker, *result)
+    cache.save()
+
+    cache = invariant_cache.InvariantCache(str(tmp_path), make_task())
+    assert cache.lookup(CANDIDATE, checker) == result
+    assert cache.num_hits == 1
+
+
+def test_cache_miss_after_task_change(tmp_path, invariant_finder):
+    task = make_task()
+    checker = get_balance_checker(invariant_finder, task)
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    cache.add(CANDIDATE, checker, True, [])
+    cache.save()
+
+    changed_task = make_task(extra_predicates=["handempty"])
+    cache = invariant_cache.InvariantCache(str(tmp_path), changed_task)
+    assert not cache.results
+    assert cache.lookup(
+        CANDIDATE, get_balance_checker(invariant_finder, changed_task)) is None
+
+
+@pytest.mark.parametrize("content", ["[[[[\"at\", [], 0]], tr", "{}", "[1]"])
+def test_corrupt_cache_is_ignored(tmp_path, capsys, invariant_finder, content):
+    task = make_task()
+    checker = get_balance_checker(invariant_finder, task)
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    with open(cache.filename, "w") as cache_file:
+        cache_file.write(content)
+
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    assert "Ignoring unreadable invariant cache" in capsys.readouterr().out
+    assert not cache.results
+    cache.add(CANDIDATE, checker, True, [])
+    cache.save()
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    assert cache.lookup(CANDIDATE, checker) == (True, [])
+
+
+def test_only_balanced_results_hold_for_other_instances(
+        tmp_path, invariant_finder):
+    task = make_task()
+    independent = get_balance_checker(invariant_finder, task)
+    dependent = get_balance_checker(
+        invariant_finder, task, instance_dependent=True)
+    assert independent.is_instance_independent(CANDIDATE)
+    assert not dependent.is_instance_independent(CANDIDATE)
+
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    # Results that rely on instance-specific inequalities are not stored.
+    cache.add(CANDIDATE, dependent, True, [])
+    assert not cache.results
+
+    # An unbalanced result of the domain may not hold for an instance
+    # whose inequality preconditions make the candidate balanced...
+    cache.add(CANDIDATE, independent, False, [REFINED])
+    assert cache.lookup(CANDIDATE, independent) == (False, [REFINED])
+    assert cache.lookup(CANDIDATE, dependent) is None
+
+    # ... but a balanced candidate stays balanced with more preconditions.
+    cache.results[CANDIDATE] = (True, [])
+    assert cache.lookup(CANDIDATE, dependent) == (True, [])
+
+
+def test_save_merges_concurrent_results(tmp_path, invariant_finder):
+    task = make_task()
+    checker = get_balance_checker(invariant_finder, task)
+    first = invariant_cache.InvariantCache(str(tmp_path), task)
+    second = invariant_cache.InvariantCache(str(tmp_path), task)
+    first.add(CANDIDATE, checker, False, [REFINED])
+    second.add(REFINED, checker, True, [])
+    first.save()
+    second.save()
+
+    cache = invariant_cache.InvariantCache(str(tmp_path), task)
+    assert cache.lookup(CANDIDATE, checker) == (False, [REFINED])
+    assert cache.lookup(REFINED, checker) == (True, [])
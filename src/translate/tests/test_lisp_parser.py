@@ -0,0 +1,73 @@
+import io
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def lisp_parser(monkeypatch):
+    # pddl_parser imports options, which parses the command line.
+    monkeypatch.setattr(sys, "argv", ["translate.py", "domain.pddl", "task.pddl"])
+    from pddl_parser import lisp_parser
+    return lisp_parser
+
+
+def parse(lisp_parser, text):
+    return lisp_parser.parse_nested_list(io.StringIO(text))
+
+
+def parse_line_by_line(lisp_parser, text):
+    return lisp_parser.parse_nested_list_from_tokens(
+        lisp_parser.tokenize(io.StringIO(text)))
+
+
+@pytest.mark.parametrize("text", [
+    "(define (domain D) ; comment\n(:predicates (at ?x)))",
+    # Comments that start inside a token end it.
+    "(a b;c)\n)",
+    "(a?x;?y\n ?z)",
+    "(\"quoted;string\"\n)",
+    "(a;(\n b)",
+    "(a ;)\n)",
+    # A comment in the last line without a newline.
+    "(A (B)) ; end",
+    "(a\tb\r\n;;;\r\nc)",
+])
+def test_comments_in_tokens(lisp_parser, text):
+    assert parse(lisp_parser, text) == parse_line_by_line(lisp_parser, text)
+
+
+def test_comments_in_tokens_result(lisp_parser):
+    assert parse(lisp_parser, "(a b;c)\n)") == ["a", "b"]
+    assert parse(lisp_parser, "(a?x;?y\n ?z)") == ["a", "?x", "?z"]
+    assert parse(lisp_parser, "(\"quoted;string\"\n)") == ["\"quoted"]
+    assert parse(lisp_parser, "(A (B)) ; end") == ["a", ["b"]]
+
+
+def test_non_ascii_in_comment(lisp_parser):
+    # Non-ASCII characters in comments use the fast path.
+    text = "(define ; Gr\xfc\xdfe é\n (domain d))"
+    assert parse(lisp_parser, text) == ["define", ["domain", "d"]]
+
+
+def test_non_ascii_outside_comment(lisp_parser):
+    # The fallback to the line-based tokenizer reports the first line
+    # with a non-ASCII character outside a comment.
+    text = "(define ; \xe9\n (domain d\xe9) ; \xfc\n (x \xfc))"
+    with pytest.raises(lisp_parser.ParseError) as excinfo:
+        parse(lisp_parser, text)
+    assert str(excinfo.value) == (
+        "Non-ASCII character outside comment:  (domain d\xe9)")
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "Expected '(', got end of file."),
+    ("a (b)", "Expected '(', got a."),
+    ("(a (b)", "Missing ')'"),
+    ("(a) b", "Unexpected token: b."),
+])
+def test_parse_errors(lisp_parser, text, message):
+    for parse_function in [parse, parse_line_by_line]:
+        with pytest.raises(lisp_parser.ParseError) as excinfo:
+            parse_function(lisp_parser, text)
+        assert str(excinfo.value) == message
@@ -0,0 +1,94 @@
+import sys
+from types import SimpleNamespace
+
+import pddl
+import relevance_analysis
+
+
+def make_action(name, precondition, effects):
+    return pddl.Action(
+        name, [], 0, pddl.Conjunction(precondition),
+        [pddl.Effect([], pddl.Truth(), literal) for literal in effects], None)
+
+
+def test_prune_irrelevant_parts():
+    move = make_action("move", [pddl.Atom("at", ["a"])],
+                       [pddl.Atom("at", ["b"]), pddl.Atom("visited", ["b"])])
+    paint = make_action("paint", [pddl.NegatedAtom("painted", [])],
+                        [pddl.Atom("painted", [])])
+    task = SimpleNamespace(
+        goal=pddl.Atom("at", ["b"]), actions=[move, paint], axioms=[])
+    assert relevance_analysis.compute_relevant_predicates(task) == {"at"}
+    relevance_analysis.prune_irrelevant_parts(task)
+    assert task.actions == [move]
+    assert [effect.literal for effect in move.effects] == [
+        pddl.Atom("at", ["b"])]
+
+
+DOMAIN = """
+(define (domain rooms)
+  (:requirements :strips :typing :derived-predicates :conditional-effects)
+  (:types room)
+  (:predicates (at ?r - room) (connected ?a ?b - room)
+               (painted ?r - room) (ready ?r - room) (lit ?r - room))
+  (:derived (ready ?r - room) (painted ?r))
+  (:action move
+    :parameters (?a ?b - room)
+    :precondition (and (at ?a) (connected ?a ?b))
+    :effect (and (at ?b) (not (at ?a))))
+  (:action paint
+    :parameters (?r - room)
+    :precondition (at ?r)
+    :effect (painted ?r))
+  (:action switch
+    :parameters (?r - room)
+    :precondition (at ?r)
+    :effect (forall (?s - room) (when (connected ?r ?s) (lit ?s)))))
+"""
+
+PROBLEM = """
+(define (problem rooms-1)
+  (:domain rooms)
+  (:objects r1 r2 r3 - room)
+  (:init (at r1) (connected r1 r2) (connected r2 r1) (connected r2 r3))
+  (:goal (and (at r3) (ready r2) (lit r3))))
+"""
+
+
+def explore(tmp_path, relevance_pruning):
+    import instantiate
+    import normalize
+    import pddl_parser
+    domain_file = tmp_path / "domain.pddl"
+    domain_file.write_text(DOMAIN)
+    problem_file = tmp_path / "problem.pddl"
+    problem_file.write_text(PROBLEM)
+    task = pddl_parser.open(domain_filename=str(domain_file),
+                            task_filename=str(problem_file))
+    normalize.normalize(task)
+    if relevance_pruning:
+        relevance_analysis.prune_irrelevant_parts(task)
+    return instantiate.explore(task, relevance_pruning=relevance_pruning)
+
+
+def test_prune_irrelevant_instances(monkeypatch, tmp_path):
+    # pddl_parser imports options, which parses the command line.
+    monkeypatch.setattr(sys, "argv", ["translate.py", "domain.pddl", "task.pddl"])
+    _, _, actions, _, axioms, _ = explore(tmp_path, relevance_pruning=False)
+    assert sorted(action.name for action in actions) == [
+        "(move r1 r2)", "(move r2 r1)", "(move r2 r3)",
+        "(paint r1)", "(paint r2)", "(paint r3)",
+        "(switch r1)", "(switch r2)"]
+    assert len(axioms) == 3
+
+    # Painting r1 or r3, deriving that they are ready and lighting r2
+    # cannot help to reach the goal, although all predicates are
+    # relevant.
+    relaxed_reachable, _, actions, goal, axioms, _ = explore(
+        tmp_path, relevance_pruning=True)
+    assert relaxed_reachable
+    assert sorted(action.name for action in actions) == [
+        "(move r1 r2)", "(move r2 r1)", "(move r2 r3)", "(paint r2)",
+        "(switch r2)"]
+    assert [axiom.effect for axiom in axioms] == [pddl.Atom("ready", ["r2"])]
+    assert pddl.Atom("lit", ["r3"]) in goal
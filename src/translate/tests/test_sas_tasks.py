@@ -0,0 +1,75 @@
+import io
+
+import sas_tasks
+
+
+EXPECTED_OUTPUT = """\
+begin_version
+3
+end_version
+begin_metric
+1
+end_metric
+2
+begin_variable
+var0
+-1
+2
+Atom at(a)
+Atom at(b)
+end_variable
+begin_variable
+var1
+0
+2
+Atom p()
+NegatedAtom p()
+end_variable
+1
+begin_mutex_group
+2
+0 0
+0 1
+end_mutex_group
+begin_state
+0
+1
+end_state
+begin_goal
+1
+0 1
+end_goal
+1
+begin_operator
+move a b
+1
+1 0
+2
+1 1 1 0 -1 0
+0 0 0 1
+3
+end_operator
+1
+begin_rule
+1
+0 1
+1 1 0
+end_rule
+"""
+
+
+def test_output():
+    variables = sas_tasks.SASVariables(
+        [2, 2], [-1, 0],
+        [["Atom at(a)", "Atom at(b)"], ["Atom p()", "NegatedAtom p()"]])
+    mutexes = [sas_tasks.SASMutexGroup([(0, 1), (0, 0)])]
+    init = sas_tasks.SASInit([0, 1])
+    goal = sas_tasks.SASGoal([(0, 1)])
+    operator = sas_tasks.SASOperator(
+        "(move a b)", [(1, 0)], [(0, 0, 1, []), (0, -1, 0, [(1, 1)])], 3)
+    axiom = sas_tasks.SASAxiom([(0, 1)], (1, 0))
+    task = sas_tasks.SASTask(
+        variables, mutexes, init, goal, [operator], [axiom], True)
+    stream = io.StringIO()
+    task.output(stream)
+    assert stream.getvalue() == EXPECTED_OUTPUT
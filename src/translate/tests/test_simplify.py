@@ -0,0 +1,34 @@
+import sas_tasks
+import simplify
+
+
+def test_dtg_reachable():
+    dtg = simplify.DomainTransitionGraph(0, 4)
+    dtg.add_arc(0, 1)
+    dtg.add_arc(2, 3)
+    assert simplify.get_values(dtg.reachable()) == [0, 1]
+    dtg.add_arcs_from_all_values(2)
+    assert simplify.get_values(dtg.reachable()) == [0, 1, 2, 3]
+
+
+def test_filter_unreachable_propositions():
+    variables = sas_tasks.SASVariables(
+        [3, 2], [-1, -1],
+        [["Atom at(a)", "Atom at(b)", "Atom at(c)"],
+         ["Atom p()", "NegatedAtom p()"]])
+    init = sas_tasks.SASInit([0, 1])
+    goal = sas_tasks.SASGoal([(0, 1)])
+    operators = [
+        sas_tasks.SASOperator("(move a b)", [], [(0, 0, 1, [])], 1),
+        sas_tasks.SASOperator("(move c a)", [], [(0, 2, 0, [])], 1),
+        sas_tasks.SASOperator("(set-p)", [], [(1, 1, 0, [(1, 0)])], 1),
+        sas_tasks.SASOperator("(reset-p)", [(0, 1)], [(1, -1, 1, [])], 1),
+    ]
+    task = sas_tasks.SASTask(variables, [], init, goal, operators, [], True)
+    simplify.filter_unreachable_propositions(task)
+    assert task.variables.ranges == [2]
+    assert task.variables.value_names == [["Atom at(a)", "Atom at(b)"]]
+    assert task.init.values == [0]
+    assert task.goal.pairs == [(0, 1)]
+    assert [op.name for op in task.operators] == ["(move a b)"]
+    assert task.operators[0].pre_post == [(0, 0, 1, [])]
@@ -0,0 +1,38 @@
+import timers
+
+
+def test_profiler_records_nested_phases():
+    profiler = timers.enable_profiling()
+    try:
+        with timers.timing("outer", block=True):
+            timers.add_count("items", 3)
+            with timers.timing("inner"):
+                pass
+        timers.add_count("total", 5)
+    finally:
+        timers.disable_profiling()
+    report = profiler.get_report()
+    assert report["counts"] == {"total": 5}
+    [outer] = report["phases"]
+    assert outer["name"] == "outer"
+    assert outer["counts"] == {"items": 3}
+    [inner] = outer["phases"]
+    assert inner["name"] == "inner"
+    assert inner["phases"] == []
+    assert inner["cpu_time"] >= 0 and inner["wall_time"] >= 0
+
+
+def test_profiler_finishes_phase_on_exception():
+    profiler = timers.enable_profiling()
+    try:
+        try:
+            with timers.timing("failing"):
+                raise ValueError
+        except ValueError:
+            pass
+        with timers.timing("next"):
+            pass
+    finally:
+        timers.disable_profiling()
+    report = profiler.get_report()
+    assert [phase["name"] for phase in report["phases"]] == ["failing", "next"]
@@ -0,0 +1,88 @@
+import itertools
+import random
+import sys
+
+import pytest
+
+import pddl
+
+
+@pytest.fixture
+def translate(monkeypatch):
+    # translate imports options, which parses the command line.
+    monkeypatch.setattr(sys, "argv", ["translate.py", "domain.pddl", "task.pddl"])
+    import translate
+    return translate
+
+
+def test_negated_fact_with_several_pairs(translate):
+    # p is represented by value 1 of variable 0 and value 1 of
+    # variable 1. Only the second pair conflicts with q, the first one
+    # is compatible with r.
+    p, q, r = pddl.Atom("p", []), pddl.Atom("q", []), pddl.Atom("r", [])
+    dictionary = {p: [(0, 1), (1, 1)], q: [(1, 1)], r: [(0, 2)]}
+    ranges = [3, 3]
+    not_p = p.negate()
+
+    assert translate.is_contradictory([q, not_p], dictionary)
+    assert translate.get_possible_values(
+        [q, not_p], dictionary, ranges) is None
+    assert not translate.is_contradictory([r, not_p], dictionary)
+    assert translate.get_possible_values(
+        [r, not_p], dictionary, ranges) == {0: {2}}
+
+    # The negation of (not q or r) and (p or s) prunes the prefix [q, r]
+    # but must keep [q, not r], whose extension with not p conflicts.
+    s = pddl.Atom("s", [])
+    condition = [[q.negate(), r], [p, s]]
+    negation = translate.negate_and_translate_condition(
+        condition, dictionary, ranges, {}, [])
+    assert negation == reference_negation(
+        translate, condition, dictionary, ranges, {}, [])
+
+
+def reference_negation(translate, condition, dictionary, ranges,
+                       mutex_dict, mutex_ranges):
+    # Translate every combination of negated literals without pruning.
+    if [] in condition:
+        return None
+    negation = []
+    for combination in itertools.product(*condition):
+        cond = [literal.negate() for literal in combination]
+        cond = translate.translate_strips_conditions(
+            cond, dictionary, ranges, mutex_dict, mutex_ranges)
+        if cond is not None:
+            negation.extend(cond)
+    return negation if negation else None
+
+
+def random_dictionary(rng, atoms, ranges):
+    # Some facts are static and hence missing from the dictionary, and
+    # some are represented by several (var, val) pairs.
+    dictionary = {}
+    for atom in atoms:
+        num_pairs = rng.choice([0, 1, 1, 2])
+        variables = rng.sample(range(len(ranges)), num_pairs)
+        pairs = [(var, rng.randrange(ranges[var] - 1)) for var in variables]
+        if pairs:
+            dictionary[atom] = pairs
+    return dictionary
+
+
+def test_negation_pruning_matches_full_product(translate):
+    rng = random.Random(2023)
+    atoms = [pddl.Atom("p%d" % i, []) for i in range(6)]
+    for _ in range(30000):
+        ranges = [rng.randint(2, 4) for _ in range(4)]
+        mutex_ranges = [rng.randint(2, 4) for _ in range(2)]
+        dictionary = random_dictionary(rng, atoms, ranges)
+        mutex_dict = random_dictionary(rng, atoms, mutex_ranges)
+        condition = [
+            [rng.choice(atoms) if rng.random() < 0.5
+             else rng.choice(atoms).negate()
+             for _ in range(rng.randint(1, 3))]
+            for _ in range(rng.randint(1, 4))]
+        assert translate.negate_and_translate_condition(
+            condition, dictionary, ranges, mutex_dict, mutex_ranges) == \
+            reference_negation(translate, condition, dictionary, ranges,
+                               mutex_dict, mutex_ranges)
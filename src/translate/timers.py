@@ -1,7 +1,9 @@
 import contextlib
+import json
 import os
 import sys
 import time
+import tracemalloc
 
 
 class Timer:
@@ -13,21 +15,144 @@ class Timer:
         times = os.times()
         return times[0] + times[1]
 
+    def elapsed_cpu_time(self):
+        return self._clock() - self.start_clock
+
+    def elapsed_wall_time(self):
+        return time.time() - self.start_time
+
     def __str__(self):
         return "[%.3fs CPU, %.3fs wall-clock]" % (
-            self._clock() - self.start_clock,
-            time.time() - self.start_time)
+            self.elapsed_cpu_time(), self.elapsed_wall_time())
+
+
+class PreciseTimer:
+    """Measure CPU and wall-clock time like Timer, but with the
+    high-resolution clocks of the time module. os.times(), which Timer
+    uses, only has a resolution of 10 ms on many systems, which is too
+    coarse for profiling short phases."""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.start_clock = time.process_time()
+
+    def elapsed_cpu_time(self):
+        return time.process_time() - self.start_clock
+
+    def elapsed_wall_time(self):
+        return time.perf_counter() - self.start_time
+
+
+def _get_rss_in_kb():
+    try:
+        # This will only work on Linux systems.
+        with open("/proc/self/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+class Profiler:
+    """Record resource usage and item counts per timing block.
+
+    The phases form a tree that mirrors the nesting of the timing
+    blocks. Counts are attached to the innermost open phase."""
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        if trace_allocations:
+            tracemalloc.start()
+        self.timer = PreciseTimer()
+        self.root = {"phases": [], "counts": {}}
+        self.open_phases = [self.root]
+
+    def start_phase(self, name):
+        phase = {"name": name, "phases": [], "counts": {}}
+        self.open_phases[-1]["phases"].append(phase)
+        self.open_phases.append(phase)
+        return (phase, PreciseTimer(), _get_rss_in_kb(),
+                self._get_traced_memory())
+
+    def finish_phase(self, token):
+        phase, timer, start_rss, start_traced = token
+        assert self.open_phases[-1] is phase
+        self.open_phases.pop()
+        phase["cpu_time"] = timer.elapsed_cpu_time()
+        phase["wall_time"] = timer.elapsed_wall_time()
+        rss = _get_rss_in_kb()
+        if rss is not None and start_rss is not None:
+            phase["rss_kb"] = rss
+            phase["rss_delta_kb"] = rss - start_rss
+        traced = self._get_traced_memory()
+        if traced is not None:
+            phase["traced_memory_delta_kb"] = (traced[0] - start_traced[0]) // 1024
+            phase["traced_memory_peak_kb"] = traced[1] // 1024
+
+    def add_count(self, name, value):
+        self.open_phases[-1]["counts"][name] = value
+
+    def _get_traced_memory(self):
+        if self.trace_allocations:
+            return tracemalloc.get_traced_memory()
+        return None
+
+    def get_report(self):
+        report = {
+            "cpu_time": self.timer.elapsed_cpu_time(),
+            "wall_time": self.timer.elapsed_wall_time(),
+            "counts": self.root["counts"],
+            "phases": self.root["phases"],
+        }
+        rss = _get_rss_in_kb()
+        if rss is not None:
+            report["rss_kb"] = rss
+        return report
+
+    def write_report(self, filename):
+        with open(filename, "w") as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+            report_file.write("\n")
+
+
+_profiler = None
+
+
+def enable_profiling(trace_allocations=False):
+    global _profiler
+    _profiler = Profiler(trace_allocations)
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    if _profiler is not None and _profiler.trace_allocations:
+        tracemalloc.stop()
+    _profiler = None
+
+
+def add_count(name, value):
+    """Record an item count for the current phase if profiling is
+    enabled."""
+    if _profiler is not None:
+        _profiler.add_count(name, value)
 
 
 @contextlib.contextmanager
 def timing(text, block=False):
     timer = Timer()
+    if _profiler is not None:
+        token = _profiler.start_phase(text)
     if block:
         print("%s..." % text)
     else:
         print("%s..." % text, end=' ')
     sys.stdout.flush()
-    yield
+    try:
+        yield
+    finally:
+        # Keep the phases of the profiler nested correctly if the
+        # phase raises an exception that is caught outside of it.
+        if _profiler is not None:
+            _profiler.finish_phase(token)
     if block:
         print("%s: %s" % (text, timer))
     else:
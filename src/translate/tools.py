@@ -1,3 +1,6 @@
+import multiprocessing
+
+
 def cartesian_product(sequences):
     # TODO: Rename this. It's not good that we have two functions
     # called "product" and "cartesian_product", of which "product"
@@ -17,6 +20,21 @@ def cartesian_product(sequences):
                 yield item + sequence
 
 
+def get_num_processes(num_processes, description):
+    """Return the number of worker processes to use for the given
+    requested number, where 0 means one process per CPU."""
+    if num_processes == 0:
+        num_processes = multiprocessing.cpu_count()
+    if (num_processes > 1 and
+            "fork" not in multiprocessing.get_all_start_methods()):
+        # Without fork, the workers would have to unpickle the task,
+        # whose conditions cache hash values of the parent process.
+        print("Parallel %s is not supported on this platform; "
+              "using a single process." % description)
+        num_processes = 1
+    return num_processes
+
+
 def get_peak_memory_in_kb():
     try:
         # This will only work on Linux systems.
@@ -1,6 +1,8 @@
 #! /usr/bin/env python3
 
 
+import gzip
+import multiprocessing
 import os
 import sys
 import traceback
@@ -13,8 +15,6 @@ if not python_version_supported():
 
 
 from collections import defaultdict
-from copy import deepcopy
-from itertools import product
 
 import axiom_rules
 import fact_groups
@@ -23,6 +23,7 @@ import normalize
 import options
 import pddl
 import pddl_parser
+import relevance_analysis
 import sas_tasks
 import signal
 import simplify
@@ -51,6 +52,10 @@ TRANSLATE_OUT_OF_TIME = 21
 simplified_effect_condition_counter = 0
 added_implied_precondition_counter = 0
 
+# When translating operators in parallel, each worker process
+# translates this many chunks of actions on average.
+CHUNKS_PER_TRANSLATION_PROCESS = 8
+
 
 def strips_to_sas_dictionary(groups, assert_partial):
     dictionary = {}
@@ -64,6 +69,21 @@ def strips_to_sas_dictionary(groups, assert_partial):
 
 
 def translate_strips_conditions_aux(conditions, dictionary, ranges):
+    condition = get_possible_values(conditions, dictionary, ranges)
+    if condition is None:
+        return None
+    return multiply_out(condition)
+
+
+def number_of_values(var_vals_pair):
+    var, vals = var_vals_pair
+    return len(vals)
+
+
+def get_possible_values(conditions, dictionary, ranges):
+    # Return a dictionary that maps the variables of the translated
+    # conditions to the sets of their possible values, or None if the
+    # conditions are contradictory.
     condition = {}
     for fact in conditions:
         if fact.negated:
@@ -87,10 +107,6 @@ def translate_strips_conditions_aux(conditions, dictionary, ranges):
                 return None
             condition[var] = {val}
 
-    def number_of_values(var_vals_pair):
-        var, vals = var_vals_pair
-        return len(vals)
-
     for fact in conditions:
         if fact.negated:
             ## Note: here we use a different solution than in Sec. 10.6.4
@@ -136,25 +152,51 @@ def translate_strips_conditions_aux(conditions, dictionary, ranges):
                 candidates = sorted(new_condition.items(), key=number_of_values)
                 var, vals = candidates[0]
                 condition[var] = vals
-
-        def multiply_out(condition):  # destroys the input
-            sorted_conds = sorted(condition.items(), key=number_of_values)
-            flat_conds = [{}]
-            for var, vals in sorted_conds:
-                if len(vals) == 1:
-                    for cond in flat_conds:
-                        cond[var] = vals.pop()  # destroys the input here
-                else:
-                    new_conds = []
-                    for cond in flat_conds:
-                        for val in vals:
-                            new_cond = deepcopy(cond)
-                            new_cond[var] = val
-                            new_conds.append(new_cond)
-                    flat_conds = new_conds
-            return flat_conds
-
-    return multiply_out(condition)
+    return condition
+
+
+def multiply_out(condition):
+    # Expand a dictionary that maps variables to sets of possible values
+    # into the list of all assignments. The assignments only map
+    # variables to integers, so shallow copies suffice.
+    sorted_conds = sorted(condition.items(), key=number_of_values)
+    flat_conds = [{}]
+    for var, vals in sorted_conds:
+        if len(vals) == 1:
+            [val] = vals
+            for cond in flat_conds:
+                cond[var] = val
+        else:
+            flat_conds = [{**cond, var: val}
+                          for cond in flat_conds for val in vals]
+    return flat_conds
+
+
+def is_contradictory(literals, dictionary):
+    # Return True if the literals are contradictory in a way that
+    # translate_strips_conditions also detects for every list of
+    # literals that starts with them: two positive literals require
+    # different values of a variable, or a negative literal excludes
+    # the value that a positive literal requires.
+    # The second case relies on how get_possible_values handles a
+    # negative literal whose fact maps to several (var, val) pairs: it
+    # intersects the possible values of *every* such variable that
+    # already has a condition, and only picks a single pair for the
+    # other variables. Hence it detects a conflict on any of the pairs.
+    # If get_possible_values only ever used one pair of a negative
+    # literal, pruning here would drop valid combinations.
+    required_values = {}
+    for fact in literals:
+        if not fact.negated:
+            for var, val in dictionary.get(fact, ()):
+                if required_values.setdefault(var, val) != val:
+                    return True
+    for fact in literals:
+        if fact.negated:
+            for var, val in dictionary.get(fact.positive(), ()):
+                if required_values.get(var) == val:
+                    return True
+    return False
 
 
 def translate_strips_conditions(conditions, dictionary, ranges,
@@ -195,12 +237,31 @@ def negate_and_translate_condition(condition, dictionary, ranges, mutex_dict,
     negation = []
     if [] in condition:  # condition always satisfied
         return None  # negation unsatisfiable
-    for combination in product(*condition):
-        cond = [l.negate() for l in combination]
-        cond = translate_strips_conditions(cond, dictionary, ranges,
-                                           mutex_dict, mutex_ranges)
-        if cond is not None:
-            negation.extend(cond)
+    if not condition:  # condition never satisfied
+        return [{}]  # negation always satisfied
+    # We consider the combinations in the order of product(*condition),
+    # but skip all combinations that start with a contradictory prefix.
+    negated_condition = [[l.negate() for l in literals]
+                         for literals in condition]
+    prefix = []
+    iterators = [iter(negated_condition[0])]
+    while iterators:
+        literal = next(iterators[-1], None)
+        if literal is None:
+            iterators.pop()
+            if prefix:
+                prefix.pop()
+            continue
+        cond = prefix + [literal]
+        if len(iterators) == len(negated_condition):
+            cond = translate_strips_conditions(cond, dictionary, ranges,
+                                               mutex_dict, mutex_ranges)
+            if cond is not None:
+                negation.extend(cond)
+        elif not (is_contradictory(cond, dictionary) or
+                  is_contradictory(cond, mutex_dict)):
+            prefix.append(literal)
+            iterators.append(iter(negated_condition[len(iterators)]))
     return negation if negation else None
 
 
@@ -386,6 +447,12 @@ def translate_strips_axiom(axiom, dictionary, ranges, mutex_dict, mutex_ranges):
 
 def translate_strips_operators(actions, strips_to_sas, ranges, mutex_dict,
                                mutex_ranges, implied_facts):
+    num_processes = tools.get_num_processes(
+        options.translation_processes, "operator translation")
+    if num_processes > 1 and len(actions) > 1:
+        return translate_strips_operators_parallel(
+            actions, (strips_to_sas, ranges, mutex_dict, mutex_ranges,
+                      implied_facts), num_processes)
     result = []
     for action in actions:
         sas_ops = translate_strips_operator(action, strips_to_sas, ranges,
@@ -395,6 +462,55 @@ def translate_strips_operators(actions, strips_to_sas, ranges, mutex_dict,
     return result
 
 
+# Actions and shared arguments of translate_strips_operator in the worker
+# processes (set by the pool initializer).
+_worker_actions = None
+_worker_arguments = None
+
+def _init_translation_worker(actions, arguments):
+    global _worker_actions, _worker_arguments
+    _worker_actions = actions
+    _worker_arguments = arguments
+
+def _translate_chunk_in_worker(chunk):
+    # Return the operators and the increments of the global counters,
+    # which would otherwise get lost in the worker.
+    global simplified_effect_condition_counter
+    global added_implied_precondition_counter
+    simplified_effect_condition_counter = 0
+    added_implied_precondition_counter = 0
+    start, end = chunk
+    result = []
+    for action in _worker_actions[start:end]:
+        result.extend(translate_strips_operator(action, *_worker_arguments))
+    return (result, simplified_effect_condition_counter,
+            added_implied_precondition_counter)
+
+def translate_strips_operators_parallel(actions, arguments, num_processes):
+    # The translation of each action only reads the shared arguments, so
+    # we translate chunks of consecutive actions in worker processes and
+    # concatenate the results in the original order. The workers inherit
+    # the actions and the arguments when they are forked, so only the
+    # chunk boundaries and the resulting operators are pickled.
+    global simplified_effect_condition_counter
+    global added_implied_precondition_counter
+    print("Using %d processes for translating operators" % num_processes)
+    chunk_size = max(1, -(-len(actions) // (
+        num_processes * CHUNKS_PER_TRANSLATION_PROCESS)))
+    chunks = [(start, start + chunk_size)
+              for start in range(0, len(actions), chunk_size)]
+    context = multiprocessing.get_context("fork")
+    result = []
+    with context.Pool(num_processes, initializer=_init_translation_worker,
+                      initargs=(actions, arguments)) as pool:
+        for sas_ops, num_simplified, num_added in pool.imap(
+                _translate_chunk_in_worker, chunks):
+            result.extend(sas_ops)
+            simplified_effect_condition_counter += num_simplified
+            added_implied_precondition_counter += num_added
+    return result
+
+
 def translate_strips_axioms(axioms, strips_to_sas, ranges, mutex_dict,
                             mutex_ranges):
     result = []
@@ -522,7 +638,12 @@ def unsolvable_sas_task(msg):
 def pddl_to_sas(task):
     with timers.timing("Instantiating", block=True):
         (relaxed_reachable, atoms, actions, goal_list, axioms,
-         reachable_action_params) = instantiate.explore(task)
+         reachable_action_params) = instantiate.explore(
+             task, options.datalog_evaluation, options.model_snapshot,
+             options.relevance_pruning)
+        timers.add_count("atoms", len(atoms))
+        timers.add_count("actions", len(actions))
+        timers.add_count("axioms", len(axioms))
 
     if not relaxed_reachable:
         return unsolvable_sas_task("No relaxed solution")
@@ -666,7 +787,14 @@ def dump_statistics(sas_task):
           sum(mutex.get_encoding_size() for mutex in sas_task.mutexes))
     print("Translator operators: %d" % len(sas_task.operators))
     print("Translator axioms: %d" % len(sas_task.axioms))
-    print("Translator task size: %d" % sas_task.get_encoding_size())
+    task_size = sas_task.get_encoding_size()
+    print("Translator task size: %d" % task_size)
+    timers.add_count("variables", len(sas_task.variables.ranges))
+    timers.add_count("facts", sum(sas_task.variables.ranges))
+    timers.add_count("mutex groups", len(sas_task.mutexes))
+    timers.add_count("operators", len(sas_task.operators))
+    timers.add_count("axioms", len(sas_task.axioms))
+    timers.add_count("task size", task_size)
     try:
         peak_memory = tools.get_peak_memory_in_kb()
     except Warning as warning:
@@ -675,8 +803,24 @@ def dump_statistics(sas_task):
         print("Translator peak memory: %d KB" % peak_memory)
 
 
+def write_output(sas_task):
+    binary = options.sas_format == "binary"
+    mode = "wb" if binary else "wt"
+    if options.sas_compression == "gzip":
+        output_file = gzip.open(options.sas_file, mode, compresslevel=6)
+    else:
+        output_file = open(options.sas_file, mode)
+    with output_file:
+        if binary:
+            sas_task.output_binary(output_file)
+        else:
+            sas_task.output(output_file)
+
+
 def main():
     timer = timers.Timer()
+    if options.profile_file:
+        profiler = timers.enable_profiling(options.profile_allocations)
     with timers.timing("Parsing", True):
         task = pddl_parser.open(
             domain_filename=options.domain, task_filename=options.task)
@@ -691,12 +835,17 @@ def main():
                 if effect.literal.negated:
                     del action.effects[index]
 
+    if options.relevance_pruning:
+        with timers.timing("Pruning irrelevant actions and axioms", block=True):
+            relevance_analysis.prune_irrelevant_parts(task)
+
     sas_task = pddl_to_sas(task)
     dump_statistics(sas_task)
 
     with timers.timing("Writing output"):
-        with open(options.sas_file, "w") as output_file:
-            sas_task.output(output_file)
+        write_output(sas_task)
+    if options.profile_file:
+        profiler.write_report(options.profile_file)
     print("Done! %s" % timer)
 
 